@@ -0,0 +1,283 @@
+import asyncio
+import hmac
+import logging
+import multiprocessing
+import secrets
+import signal
+from typing import Any, Dict, List, Optional
+import aiohttp
+from aiohttp import web
+from aiogram import Bot
+from bot.config import settings
+from bot.db.database import init_db
+from bot.webhook import SECRET_HEADER, extract_user_id
+
+logger = logging.getLogger(__name__)
+
+# Путь, на который фронт пересылает обновления воркерам
+WORKER_PATH = "/update"
+
+# Сколько обновлений может ждать пересылки в очереди одного воркера
+FORWARD_QUEUE_SIZE = 1000
+
+# Паузы между повторами, пока воркер недоступен (например, перезапускается)
+FORWARD_RETRY_DELAYS = (0.2, 0.5, 1, 2, 5)
+
+# Ответ воркера на пересылку: обычно сразу после разбора, дольше - пока
+# у него заняты все слоты WEBHOOK_MAX_IN_FLIGHT; после таймаута - повтор
+FORWARD_TIMEOUT_SECONDS = 60
+
+# Long polling getUpdates на фронте
+POLL_TIMEOUT_SECONDS = 30
+
+
+def shard_for(user_id: Optional[int], workers: int) -> int:
+    """Номер воркера, который обслуживает пользователя"""
+    if user_id is None:
+        return 0
+    return user_id % workers
+
+
+def _worker_entry(index: int, workers: int, port: int, secret: str):
+    """Процесс-воркер: обычный бот в режиме webhook на локальном порту"""
+    settings.delivery_mode = "webhook"
+    settings.webhook_url = ""  # setWebhook делает только фронт
+    settings.webhook_host = "127.0.0.1"
+    settings.webhook_port = port
+    settings.webhook_path = WORKER_PATH
+    settings.webhook_secret = secret
+    settings.cluster_workers = 0
+    # Напоминания шлёт тот воркер, который обслуживает пользователя
+    settings.reminder_shard_index = index
+    settings.reminder_shard_count = workers
+    # Общий лимит Telegram делится между воркерами
+    settings.telegram_global_rate /= workers
+    if settings.metrics_port:
+        settings.metrics_port += index + 1
+
+    # Ctrl+C получает вся группа процессов; воркеры останавливает фронт через SIGTERM
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    asyncio.run(_worker_main(index))
+
+
+async def _worker_main(index: int):
+    from bot.main import main
+
+    task = asyncio.current_task()
+    asyncio.get_running_loop().add_signal_handler(signal.SIGTERM, task.cancel)
+    logger.info(f"Cluster worker {index} starting on port {settings.webhook_port}")
+    try:
+        await main()
+    except asyncio.CancelledError:
+        pass
+
+
+class ClusterFront:
+    """
+    Фронт кластера: получает обновления от Telegram и пересылает каждое
+    воркеру по user_id. Все обновления пользователя попадают в один процесс
+    в порядке получения, и воркер (WebhookServer) обрабатывает их по одному,
+    поэтому кэши состояний, сессии повторения и очередь записи оценок
+    остаются локальными для процесса.
+    """
+
+    def __init__(self, ports: List[int], secret: str):
+        self.ports = ports
+        self.secret = secret
+        self._queues = [asyncio.Queue(maxsize=FORWARD_QUEUE_SIZE) for _ in ports]
+        self._session: Optional[aiohttp.ClientSession] = None
+        self._forwarders: List[asyncio.Task] = []
+
+        # Метрики
+        self.forwarded = [0] * len(ports)
+        self.dropped = 0
+
+    async def start(self):
+        self._session = aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=FORWARD_TIMEOUT_SECONDS))
+        self._forwarders = [
+            asyncio.create_task(self._forward(index)) for index in range(len(self.ports))
+        ]
+
+    async def stop(self, timeout: float = 30):
+        """Дослать обновления из очередей и закрыть сессию"""
+        try:
+            await asyncio.wait_for(
+                asyncio.gather(*(queue.join() for queue in self._queues)),
+                timeout
+            )
+        except asyncio.TimeoutError:
+            logger.warning("Cluster front: some updates were not forwarded before shutdown")
+        for task in self._forwarders:
+            task.cancel()
+        await asyncio.gather(*self._forwarders, return_exceptions=True)
+        await self._session.close()
+
+    async def route(self, update: Dict[str, Any]):
+        index = shard_for(extract_user_id(update), len(self.ports))
+        await self._queues[index].put(update)
+
+    async def _forward(self, index: int):
+        """Последовательная пересылка одному воркеру (сохраняет порядок обновлений)"""
+        url = f"http://127.0.0.1:{self.ports[index]}{WORKER_PATH}"
+        headers = {SECRET_HEADER: self.secret}
+        queue = self._queues[index]
+        while True:
+            update = await queue.get()
+            try:
+                await self._post(url, headers, update)
+                self.forwarded[index] += 1
+            finally:
+                queue.task_done()
+
+    async def _post(self, url: str, headers: Dict[str, str], update: Dict[str, Any]):
+        attempt = 0
+        while True:
+            try:
+                async with self._session.post(url, json=update, headers=headers) as response:
+                    if response.status == 200:
+                        return
+                    logger.error(f"Worker {url} answered {response.status}, dropping update {update.get('update_id')}")
+                    self.dropped += 1
+                    return
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                delay = FORWARD_RETRY_DELAYS[min(attempt, len(FORWARD_RETRY_DELAYS) - 1)]
+                attempt += 1
+                logger.debug(f"Worker {url} unavailable ({e!r}), retrying in {delay}s")
+                await asyncio.sleep(delay)
+
+    async def poll(self, bot: Bot, allowed_updates: List[str]):
+        """Long polling: сырые обновления без разбора в модели aiogram"""
+        await bot.delete_webhook()
+        url = f"https://api.telegram.org/bot{settings.bot_token}/getUpdates"
+        timeout = aiohttp.ClientTimeout(total=POLL_TIMEOUT_SECONDS + 10)
+        offset = None
+        attempt = 0
+        while True:
+            try:
+                async with self._session.post(url, timeout=timeout, json={
+                    "offset": offset,
+                    "timeout": POLL_TIMEOUT_SECONDS,
+                    "allowed_updates": allowed_updates
+                }) as response:
+                    payload = await response.json()
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                delay = FORWARD_RETRY_DELAYS[min(attempt, len(FORWARD_RETRY_DELAYS) - 1)]
+                attempt += 1
+                logger.warning(f"getUpdates failed ({e}), retrying in {delay}s")
+                await asyncio.sleep(delay)
+                continue
+
+            if not payload.get("ok"):
+                logger.error(f"getUpdates error: {payload.get('description')}")
+                await asyncio.sleep(FORWARD_RETRY_DELAYS[-1])
+                continue
+
+            attempt = 0
+            for update in payload["result"]:
+                await self.route(update)
+                offset = update["update_id"] + 1
+
+    async def handle_webhook(self, request: web.Request) -> web.Response:
+        """Публичный webhook фронта: проверить секрет и переслать воркеру"""
+        if settings.webhook_secret:
+            token = request.headers.get(SECRET_HEADER, "")
+            if not hmac.compare_digest(token, settings.webhook_secret):
+                return web.Response(status=401)
+        try:
+            update = await request.json()
+        except ValueError:
+            return web.Response()
+        await self.route(update)
+        return web.Response()
+
+    async def serve_webhook(self, bot: Bot, allowed_updates: List[str]):
+        app = web.Application()
+        app.router.add_post(settings.webhook_path, self.handle_webhook)
+        runner = web.AppRunner(app)
+        await runner.setup()
+        try:
+            await web.TCPSite(runner, settings.webhook_host, settings.webhook_port).start()
+            if settings.webhook_url:
+                await bot.set_webhook(
+                    url=settings.webhook_url.rstrip("/") + settings.webhook_path,
+                    secret_token=settings.webhook_secret or None,
+                    allowed_updates=allowed_updates
+                )
+            await asyncio.Event().wait()
+        finally:
+            await runner.cleanup()
+
+    def metrics(self) -> Dict[str, Any]:
+        return {
+            "queued": [queue.qsize() for queue in self._queues],
+            "forwarded": list(self.forwarded),
+            "dropped": self.dropped,
+        }
+
+
+async def _supervise(processes: List[multiprocessing.Process], spawn):
+    """Перезапускать упавшие воркеры"""
+    while True:
+        await asyncio.sleep(1)
+        for index, process in enumerate(processes):
+            if not process.is_alive():
+                logger.error(f"Cluster worker {index} exited with {process.exitcode}, restarting")
+                processes[index] = spawn(index)
+
+
+async def _run_front(processes: List[multiprocessing.Process], spawn, ports: List[int], secret: str):
+    from bot.main import create_dispatcher
+
+    allowed_updates = create_dispatcher().resolve_used_update_types()
+    bot = Bot(token=settings.bot_token)
+    front = ClusterFront(ports, secret)
+    await front.start()
+    supervisor = asyncio.create_task(_supervise(processes, spawn))
+    try:
+        if settings.delivery_mode == "webhook":
+            await front.serve_webhook(bot, allowed_updates)
+        else:
+            await front.poll(bot, allowed_updates)
+    finally:
+        supervisor.cancel()
+        await front.stop()
+        logger.info(f"Cluster front metrics: {front.metrics()}")
+        await bot.session.close()
+
+
+def run_cluster(workers: int):
+    """
+    Запустить фронт и workers процессов-обработчиков.
+    Все процессы работают с одним файлом SQLite: WAL и busy_timeout
+    позволяют писать из нескольких процессов, миграции применяет фронт
+    до старта воркеров.
+    """
+    asyncio.run(init_db())
+
+    secret = secrets.token_urlsafe(32)
+    ports = [settings.cluster_base_port + index for index in range(workers)]
+    context = multiprocessing.get_context("spawn")
+
+    def spawn(index: int) -> multiprocessing.Process:
+        process = context.Process(
+            target=_worker_entry,
+            args=(index, workers, ports[index], secret),
+            name=f"flipcard-worker-{index}"
+        )
+        process.start()
+        return process
+
+    processes = [spawn(index) for index in range(workers)]
+    logger.info(f"Cluster started: {workers} workers on ports {ports[0]}-{ports[-1]}")
+    try:
+        asyncio.run(_run_front(processes, spawn, ports, secret))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        # SIGTERM: воркер дописывает очередь оценок и закрывает пул
+        for process in processes:
+            process.terminate()
+        for process in processes:
+            process.join(timeout=30)
+            if process.is_alive():
+                process.kill()
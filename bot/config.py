@@ -7,6 +7,95 @@ class Settings(BaseSettings):
     openai_api_key: str = Field(..., env="OPENAI_API_KEY")
     database_path: str = Field(default="data/bot.db", env="DATABASE_PATH")
 
+    # Пул соединений SQLite
+    db_pool_size: int = Field(default=4, env="DB_POOL_SIZE")
+    db_busy_timeout_ms: int = Field(default=5000, env="DB_BUSY_TIMEOUT_MS")
+    db_mmap_size: int = Field(default=256 * 1024 * 1024, env="DB_MMAP_SIZE")
+    db_cache_size_kib: int = Field(default=16 * 1024, env="DB_CACHE_SIZE_KIB")
+
+    # Общий кэш карточек (память + таблица card_cache)
+    card_cache_size: int = Field(default=5000, env="CARD_CACHE_SIZE")
+    card_cache_ttl_seconds: int = Field(default=6 * 60 * 60, env="CARD_CACHE_TTL_SECONDS")
+    card_cache_db_ttl_days: int = Field(default=90, env="CARD_CACHE_DB_TTL_DAYS")
+    ai_singleflight_max_waiters: int = Field(default=500, env="AI_SINGLEFLIGHT_MAX_WAITERS")
+
+    # Очередь запросов к OpenAI: минутные лимиты, параллельность, таймаут и повторы
+    openai_rpm_limit: int = Field(default=500, env="OPENAI_RPM_LIMIT")
+    openai_tpm_limit: int = Field(default=200000, env="OPENAI_TPM_LIMIT")
+    openai_max_concurrency: int = Field(default=8, env="OPENAI_MAX_CONCURRENCY")
+    openai_timeout_seconds: float = Field(default=30.0, env="OPENAI_TIMEOUT_SECONDS")
+    openai_max_retries: int = Field(default=4, env="OPENAI_MAX_RETRIES")
+    # Другой адрес API (совместимый сервер или mock для нагрузочных прогонов)
+    openai_base_url: str = Field(default="", env="OPENAI_BASE_URL")
+
+    # Кэш отрисованных карточек (HTML по id слова, виду и версии)
+    render_cache_size: int = Field(default=20000, env="RENDER_CACHE_SIZE")
+    render_cache_ttl_seconds: int = Field(default=60 * 60, env="RENDER_CACHE_TTL_SECONDS")
+
+    # Массовый импорт слов
+    bulk_import_max_terms: int = Field(default=200, env="BULK_IMPORT_MAX_TERMS")
+    bulk_import_batch_size: int = Field(default=10, env="BULK_IMPORT_BATCH_SIZE")
+    bulk_import_concurrency: int = Field(default=3, env="BULK_IMPORT_CONCURRENCY")
+
+    # Индекс переводов для вариантов Quiz (сколько пользователей держать в памяти)
+    distractor_index_max_users: int = Field(default=10000, env="DISTRACTOR_INDEX_MAX_USERS")
+
+    # Хранилище состояний (сессии повторения, черновики карточек)
+    fsm_state_ttl_seconds: int = Field(default=2 * 24 * 60 * 60, env="FSM_STATE_TTL_SECONDS")
+    fsm_cache_max_entries: int = Field(default=10000, env="FSM_CACHE_MAX_ENTRIES")
+    fsm_cache_max_bytes: int = Field(default=32 * 1024 * 1024, env="FSM_CACHE_MAX_BYTES")
+
+    # Фоновая запись оценок: группа коммитится раз в N мс или по M операций
+    review_writer_flush_ms: int = Field(default=50, env="REVIEW_WRITER_FLUSH_MS")
+    review_writer_batch_size: int = Field(default=100, env="REVIEW_WRITER_BATCH_SIZE")
+    review_writer_queue_size: int = Field(default=10000, env="REVIEW_WRITER_QUEUE_SIZE")
+
+    # Пакетный пересчёт расписания: записей в одной транзакции
+    srs_batch_chunk_size: int = Field(default=5000, env="SRS_BATCH_CHUNK_SIZE")
+
+    # Получение обновлений: "polling" или "webhook"
+    delivery_mode: str = Field(default="polling", env="DELIVERY_MODE")
+    # Публичный https-адрес бота; пустой - setWebhook не вызывается (webhook настроен снаружи)
+    webhook_url: str = Field(default="", env="WEBHOOK_URL")
+    webhook_path: str = Field(default="/webhook", env="WEBHOOK_PATH")
+    webhook_secret: str = Field(default="", env="WEBHOOK_SECRET")
+    webhook_host: str = Field(default="0.0.0.0", env="WEBHOOK_HOST")
+    webhook_port: int = Field(default=8080, env="WEBHOOK_PORT")
+    webhook_max_in_flight: int = Field(default=100, env="WEBHOOK_MAX_IN_FLIGHT")
+
+    # Кластер: число процессов-обработчиков (0 или 1 - один процесс) и их локальные порты
+    cluster_workers: int = Field(default=0, env="CLUSTER_WORKERS")
+    cluster_base_port: int = Field(default=8100, env="CLUSTER_BASE_PORT")
+
+    # HTTP /metrics в формате Prometheus (0 - выключено); воркеры кластера берут следующие порты
+    metrics_host: str = Field(default="127.0.0.1", env="METRICS_HOST")
+    metrics_port: int = Field(default=0, env="METRICS_PORT")
+
+    # Администраторы (id через запятую) и профилирование: /profile, SIGUSR1
+    admin_ids: str = Field(default="", env="ADMIN_IDS")
+    profile_dir: str = Field(default="data/profiles", env="PROFILE_DIR")
+    profile_slow_callback_ms: int = Field(default=100, env="PROFILE_SLOW_CALLBACK_MS")
+    profile_signal_seconds: int = Field(default=30, env="PROFILE_SIGNAL_SECONDS")
+
+    # Исходящие запросы к Telegram: общий лимит и лимит на чат, сообщений в секунду
+    telegram_throttle_enabled: bool = Field(default=True, env="TELEGRAM_THROTTLE_ENABLED")
+    telegram_global_rate: float = Field(default=30, env="TELEGRAM_GLOBAL_RATE")
+    telegram_chat_rate: float = Field(default=1, env="TELEGRAM_CHAT_RATE")
+    telegram_chat_burst: int = Field(default=3, env="TELEGRAM_CHAT_BURST")
+    telegram_max_retries: int = Field(default=3, env="TELEGRAM_MAX_RETRIES")
+
+    # Напоминания о повторении; тихие часы - по времени сервера (start == end - без тихих часов)
+    reminders_enabled: bool = Field(default=True, env="REMINDERS_ENABLED")
+    reminder_interval_hours: float = Field(default=24, env="REMINDER_INTERVAL_HOURS")
+    reminder_quiet_start: int = Field(default=22, env="REMINDER_QUIET_START")
+    reminder_quiet_end: int = Field(default=9, env="REMINDER_QUIET_END")
+    reminder_idle_minutes: int = Field(default=30, env="REMINDER_IDLE_MINUTES")
+    reminder_batch_size: int = Field(default=100, env="REMINDER_BATCH_SIZE")
+    reminder_send_per_second: float = Field(default=20, env="REMINDER_SEND_PER_SECOND")
+    # Воркер кластера напоминает только своим пользователям (выставляет bot.cluster)
+    reminder_shard_index: int = Field(default=0, env="REMINDER_SHARD_INDEX")
+    reminder_shard_count: int = Field(default=1, env="REMINDER_SHARD_COUNT")
+
     model_config = SettingsConfigDict(
         env_file=".env",
         env_file_encoding="utf-8",
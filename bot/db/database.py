@@ -1,59 +1,221 @@
+import asyncio
+import logging
+import re
+import time
 import aiosqlite
 import json
+from contextlib import asynccontextmanager
 from datetime import datetime
-from typing import Optional, List, Dict, Any
+from typing import Optional, List, Dict, Any, AsyncIterator
 from bot.config import settings
+from bot.db.migrations import run_migrations
+from bot.services import metrics
 
+logger = logging.getLogger(__name__)
 
-async def get_db() -> aiosqlite.Connection:
-    """Получить соединение с БД"""
+_checkout_wait_seconds = metrics.histogram(
+    "flipcard_db_checkout_wait_seconds",
+    "Ожидание свободного соединения в пуле",
+    buckets=metrics.DB_BUCKETS
+)
+_checkout_hold_seconds = metrics.histogram(
+    "flipcard_db_checkout_hold_seconds",
+    "Время удержания соединения (все запросы одного get_db)",
+    buckets=metrics.DB_BUCKETS
+)
+_query_seconds = metrics.histogram(
+    "flipcard_db_query_seconds",
+    "Время execute/executemany по виду запроса",
+    ("query",),
+    metrics.DB_BUCKETS
+)
+
+_QUERY_TABLE_RE = re.compile(r"\b(?:FROM|INTO|UPDATE|TABLE)\s+([A-Za-z_]\w*)", re.IGNORECASE)
+
+# Текст SQL -> метка "ГЛАГОЛ таблица"; ограничено, т.к. часть запросов собирается динамически
+_query_labels: Dict[str, str] = {}
+QUERY_LABELS_MAX = 1000
+
+
+def _query_label(sql: str) -> str:
+    label = _query_labels.get(sql)
+    if label is None:
+        verb = sql.split(None, 1)[0].upper() if sql.strip() else "?"
+        match = _QUERY_TABLE_RE.search(sql)
+        label = f"{verb} {match.group(1)}" if match else verb
+        if len(_query_labels) < QUERY_LABELS_MAX:
+            _query_labels[sql] = label
+    return label
+
+
+def _instrument(db: aiosqlite.Connection):
+    """Замер времени каждого execute/executemany соединения"""
+    execute, executemany = db.execute, db.executemany
+
+    async def timed_execute(sql: str, parameters=None):
+        started = time.perf_counter()
+        try:
+            return await execute(sql, parameters)
+        finally:
+            _query_seconds.observe(time.perf_counter() - started, _query_label(sql))
+
+    async def timed_executemany(sql: str, parameters):
+        started = time.perf_counter()
+        try:
+            return await executemany(sql, parameters)
+        finally:
+            _query_seconds.observe(time.perf_counter() - started, _query_label(sql))
+
+    db.execute = timed_execute
+    db.executemany = timed_executemany
+
+
+async def _open_connection() -> aiosqlite.Connection:
+    """Открыть соединение и применить PRAGMA (один раз на соединение)"""
     db = await aiosqlite.connect(settings.database_path)
     db.row_factory = aiosqlite.Row
+    await db.execute(f"PRAGMA busy_timeout = {int(settings.db_busy_timeout_ms)}")
+    await db.execute("PRAGMA journal_mode = WAL")
+    await db.execute("PRAGMA synchronous = NORMAL")
+    await db.execute(f"PRAGMA mmap_size = {int(settings.db_mmap_size)}")
+    await db.execute(f"PRAGMA cache_size = -{int(settings.db_cache_size_kib)}")
+    await db.execute("PRAGMA temp_store = MEMORY")
+    # round() Python внутри SQL: ROUND() SQLite иначе округляет половинки (1.45 -> 1.5)
+    await db.create_function("py_round", 2, round, deterministic=True)
+    _instrument(db)
     return db
 
 
-async def init_db():
-    """Инициализация БД: создание таблиц"""
-    db = await get_db()
-    
-    await db.execute("""
-        CREATE TABLE IF NOT EXISTS words (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            user_id INTEGER NOT NULL,
-            term TEXT NOT NULL,
-            pos TEXT,
-            ipa TEXT,
-            reading_ru TEXT,
-            translations_ru TEXT,
-            definition_en TEXT,
-            examples TEXT,
-            frequency INTEGER DEFAULT 1,
-            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-            UNIQUE(user_id, term)
-        )
-    """)
-    
-    # Миграция: добавляем поле frequency если его нет
+class ConnectionPool:
+    """Пул долгоживущих соединений с SQLite"""
+
+    def __init__(self, size: int):
+        self.size = max(1, size)
+        self._idle: asyncio.Queue = asyncio.Queue()
+        self._connections: List[aiosqlite.Connection] = []
+        self._closed = False
+
+        # Метрики
+        self.in_use = 0
+        self.waiting = 0
+        self.checkouts = 0
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+        self.hold_total = 0.0
+        self.hold_max = 0.0
+
+    async def open(self):
+        """Открыть все соединения пула"""
+        for _ in range(self.size):
+            db = await _open_connection()
+            self._connections.append(db)
+            self._idle.put_nowait(db)
+
+    async def close(self):
+        """Закрыть все соединения пула"""
+        self._closed = True
+        for db in self._connections:
+            try:
+                await db.close()
+            except Exception as e:
+                logger.warning(f"Error closing connection: {e}")
+        self._connections.clear()
+
+    @asynccontextmanager
+    async def acquire(self) -> AsyncIterator[aiosqlite.Connection]:
+        """Взять соединение из пула и вернуть его после использования"""
+        if self._closed:
+            raise RuntimeError("Connection pool is closed")
+
+        started = time.perf_counter()
+        self.waiting += 1
+        try:
+            db = await self._idle.get()
+        finally:
+            self.waiting -= 1
+
+        checked_out = time.perf_counter()
+        wait = checked_out - started
+        self.checkouts += 1
+        self.wait_total += wait
+        self.wait_max = max(self.wait_max, wait)
+        _checkout_wait_seconds.observe(wait)
+        self.in_use += 1
+
+        try:
+            yield db
+        finally:
+            # Незакоммиченная транзакция не должна утечь к следующему пользователю
+            if db.in_transaction:
+                try:
+                    await db.rollback()
+                except Exception as e:
+                    logger.warning(f"Rollback on release failed: {e}")
+            hold = time.perf_counter() - checked_out
+            self.hold_total += hold
+            self.hold_max = max(self.hold_max, hold)
+            _checkout_hold_seconds.observe(hold)
+            self.in_use -= 1
+            self._idle.put_nowait(db)
+
+    def metrics(self) -> Dict[str, Any]:
+        """Метрики пула: ожидание, занятость, время удержания соединения"""
+        checkouts = self.checkouts or 1
+        return {
+            "size": self.size,
+            "in_use": self.in_use,
+            "waiting": self.waiting,
+            "checkouts": self.checkouts,
+            "wait_avg_ms": self.wait_total / checkouts * 1000,
+            "wait_max_ms": self.wait_max * 1000,
+            "checkout_avg_ms": self.hold_total / checkouts * 1000,
+            "checkout_max_ms": self.hold_max * 1000,
+        }
+
+
+_pool: Optional[ConnectionPool] = None
+
+
+async def open_pool():
+    """Открыть пул соединений (вызывается при старте бота)"""
+    global _pool
+    if _pool is not None:
+        return
+    pool = ConnectionPool(settings.db_pool_size)
+    await pool.open()
+    _pool = pool
+
+
+async def close_pool():
+    """Закрыть пул соединений (вызывается при остановке бота)"""
+    global _pool
+    if _pool is None:
+        return
+    pool, _pool = _pool, None
+    await pool.close()
+
+
+def get_pool_metrics() -> Dict[str, Any]:
+    """Метрики пула соединений (пустой словарь, если пул не открыт)"""
+    return _pool.metrics() if _pool is not None else {}
+
+
+@asynccontextmanager
+async def get_db() -> AsyncIterator[aiosqlite.Connection]:
+    """Получить соединение с БД из пула (или временное, если пул не открыт)"""
+    if _pool is not None:
+        async with _pool.acquire() as db:
+            yield db
+        return
+
+    db = await _open_connection()
     try:
-        await db.execute("ALTER TABLE words ADD COLUMN frequency INTEGER DEFAULT 1")
-        await db.commit()
-    except aiosqlite.OperationalError:
-        # Поле уже существует, игнорируем
-        pass
-    
-    await db.execute("""
-        CREATE TABLE IF NOT EXISTS reviews (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            word_id INTEGER NOT NULL,
-            user_id INTEGER NOT NULL,
-            next_review_at TIMESTAMP,
-            interval_days REAL DEFAULT 1,
-            ease REAL DEFAULT 2.5,
-            last_result TEXT,
-            FOREIGN KEY (word_id) REFERENCES words(id) ON DELETE CASCADE
-        )
-    """)
-    
-    await db.commit()
-    await db.close()
+        yield db
+    finally:
+        await db.close()
 
+
+async def init_db():
+    """Инициализация БД: применение миграций схемы (ничего не делает, если схема актуальна)"""
+    async with get_db() as db:
+        await run_migrations(db)
@@ -0,0 +1,209 @@
+import random
+from collections import OrderedDict
+from typing import Dict, List, Optional, Set, Tuple
+from bot.config import settings
+from bot.db.database import get_db
+
+
+class _SampleSet:
+    """Множество word_id с удалением за O(1) и случайной выборкой за O(k)"""
+
+    def __init__(self):
+        self.items: List[int] = []
+        self.positions: Dict[int, int] = {}
+
+    def add(self, word_id: int):
+        if word_id in self.positions:
+            return
+        self.positions[word_id] = len(self.items)
+        self.items.append(word_id)
+
+    def remove(self, word_id: int):
+        index = self.positions.pop(word_id, None)
+        if index is None:
+            return
+        last = self.items.pop()
+        if index < len(self.items):
+            self.items[index] = last
+            self.positions[last] = index
+
+    def __len__(self) -> int:
+        return len(self.items)
+
+
+class _UserPool:
+    """Компактный пул переводов одного пользователя: word_id -> (первый перевод, часть речи)"""
+
+    def __init__(self):
+        self.entries: Dict[int, Tuple[str, Optional[str]]] = {}
+        # Все слова пользователя, в том числе без перевода (их нет в entries)
+        self.word_ids: Set[int] = set()
+        self.all = _SampleSet()
+        self.by_pos: Dict[str, _SampleSet] = {}
+
+    def put(self, word_id: int, translation: Optional[str], pos: Optional[str]):
+        self.discard(word_id)
+        self.word_ids.add(word_id)
+        if not translation:
+            return
+        pos = _normalize_pos(pos)
+        self.entries[word_id] = (translation, pos)
+        self.all.add(word_id)
+        if pos:
+            self.by_pos.setdefault(pos, _SampleSet()).add(word_id)
+
+    def discard(self, word_id: int):
+        self.word_ids.discard(word_id)
+        entry = self.entries.pop(word_id, None)
+        if entry is None:
+            return
+        self.all.remove(word_id)
+        pos = entry[1]
+        if pos and pos in self.by_pos:
+            self.by_pos[pos].remove(word_id)
+            if not self.by_pos[pos]:
+                del self.by_pos[pos]
+
+    def _sample_from(self, sample_set: _SampleSet, k: int, chosen: List[str], excluded: set):
+        """Добавить в chosen до k уникальных переводов из sample_set"""
+        items = sample_set.items
+        if not items:
+            return
+
+        if len(items) <= 4 * k:
+            # Маленький набор: дешевле перемешать целиком
+            candidates = random.sample(items, len(items))
+        else:
+            # Большой набор: случайные индексы с отбраковкой, O(k) в среднем
+            candidates = (items[random.randrange(len(items))] for _ in range(8 * k))
+
+        for word_id in candidates:
+            if len(chosen) >= k:
+                return
+            if word_id in excluded:
+                continue
+            translation = self.entries[word_id][0]
+            if translation in chosen or translation in excluded:
+                continue
+            chosen.append(translation)
+
+    def sample(
+        self,
+        k: int,
+        exclude_word_id: Optional[int] = None,
+        exclude_translation: Optional[str] = None,
+        pos: Optional[str] = None
+    ) -> List[str]:
+        excluded = {exclude_word_id, exclude_translation}
+        chosen: List[str] = []
+
+        pos = _normalize_pos(pos)
+        if pos and pos in self.by_pos:
+            self._sample_from(self.by_pos[pos], k, chosen, excluded)
+        if len(chosen) < k:
+            self._sample_from(self.all, k, chosen, excluded)
+        return chosen
+
+
+def _normalize_pos(pos: Optional[str]) -> Optional[str]:
+    return pos.strip().lower() if pos else None
+
+
+# Пулы загружаются лениво и вытесняются по LRU
+_pools: "OrderedDict[int, _UserPool]" = OrderedDict()
+# word_id -> user_id для всех слов загруженных пулов, включая слова без перевода
+# (update_word знает только word_id, а перевод может появиться при обновлении)
+_owners: Dict[int, int] = {}
+
+
+async def _load_pool(user_id: int) -> _UserPool:
+    """Загрузить пул пользователя: только id, часть речи и первый перевод"""
+    async with get_db() as db:
+        cursor = await db.execute("""
+            SELECT id, pos, json_extract(translations_ru, '$[0]') AS translation
+            FROM words
+            WHERE user_id = ?
+        """, (user_id,))
+        rows = await cursor.fetchall()
+
+    pool = _UserPool()
+    for row in rows:
+        pool.put(row["id"], row["translation"], row["pos"])
+    return pool
+
+
+def _evict_if_needed():
+    while len(_pools) > settings.distractor_index_max_users:
+        _, pool = _pools.popitem(last=False)
+        for word_id in pool.word_ids:
+            _owners.pop(word_id, None)
+
+
+async def sample_distractors(
+    user_id: int,
+    k: int,
+    exclude_word_id: Optional[int] = None,
+    exclude_translation: Optional[str] = None,
+    pos: Optional[str] = None
+) -> List[str]:
+    """
+    Выбрать до k разных переводов из словаря пользователя (для Quiz).
+    Переводы, совпадающие с правильным ответом, не попадают в выборку;
+    при указании pos сначала берутся слова той же части речи.
+    """
+    pool = _pools.get(user_id)
+    if pool is None:
+        pool = await _load_pool(user_id)
+        _pools[user_id] = pool
+        _owners.update((word_id, user_id) for word_id in pool.word_ids)
+        _evict_if_needed()
+    else:
+        _pools.move_to_end(user_id)
+
+    return pool.sample(k, exclude_word_id, exclude_translation, pos)
+
+
+def on_word_saved(user_id: int, word_id: int, translations_ru: Optional[List[str]], pos: Optional[str]):
+    """Слово добавлено или перегенерировано"""
+    pool = _pools.get(user_id)
+    if pool is None:
+        return
+    pool.put(word_id, translations_ru[0] if translations_ru else None, pos)
+    _owners[word_id] = user_id
+
+
+def on_word_updated(word_id: int, translations_ru: Optional[List[str]], pos: Optional[str]):
+    """Слово обновлено (update_word знает только word_id)"""
+    user_id = _owners.get(word_id)
+    if user_id is None or user_id not in _pools:
+        return
+    translation, old_pos = _pools[user_id].entries.get(word_id, (None, None))
+    if translations_ru is not None:
+        translation = translations_ru[0] if translations_ru else None
+    if pos is None:
+        pos = old_pos
+    _pools[user_id].put(word_id, translation, pos)
+
+
+def on_word_deleted(user_id: int, word_id: int):
+    """Слово удалено"""
+    _owners.pop(word_id, None)
+    pool = _pools.get(user_id)
+    if pool is not None:
+        pool.discard(word_id)
+
+
+def invalidate_user(user_id: int):
+    """Сбросить пул пользователя (например, после массового импорта)"""
+    pool = _pools.pop(user_id, None)
+    if pool is not None:
+        for word_id in pool.word_ids:
+            _owners.pop(word_id, None)
+
+
+def get_index_stats() -> Dict[str, int]:
+    """Размер индекса: число загруженных пользователей и переводов"""
+    return {
+        "users": len(_pools),
+        "entries": sum(len(pool.entries) for pool in _pools.values()),
+    }
@@ -0,0 +1,152 @@
+import json
+import logging
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Dict, Optional
+from aiogram.fsm.state import State
+from aiogram.fsm.storage.base import BaseStorage, StateType, StorageKey
+from bot.db.database import get_db
+
+logger = logging.getLogger(__name__)
+
+# Как часто удалять из таблицы просроченные записи
+PURGE_INTERVAL_SECONDS = 10 * 60
+
+
+@dataclass
+class _Record:
+    state: Optional[str]
+    data: str  # JSON
+    expires_at: float
+
+    @property
+    def size(self) -> int:
+        return len(self.data) + len(self.state or "")
+
+
+class SQLiteStorage(BaseStorage):
+    """
+    FSM-хранилище aiogram в таблице fsm_state той же SQLite БД.
+    Перед БД стоит write-through кэш в памяти с TTL и LRU-вытеснением
+    по числу записей и суммарному размеру данных.
+    """
+
+    def __init__(self, ttl_seconds: int, max_entries: int, max_bytes: int):
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._cache: "OrderedDict[str, _Record]" = OrderedDict()
+        self._cache_bytes = 0
+        self._last_purge = 0.0
+
+        # Метрики
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @staticmethod
+    def _make_key(key: StorageKey) -> str:
+        parts = [str(key.bot_id), str(key.chat_id), str(key.user_id)]
+        if key.thread_id:
+            parts.append(f"t{key.thread_id}")
+        if key.business_connection_id:
+            parts.append(f"b{key.business_connection_id}")
+        parts.append(key.destiny)
+        return ":".join(parts)
+
+    def _cache_put(self, key: str, record: _Record):
+        self._cache_drop(key)
+        self._cache[key] = record
+        self._cache_bytes += record.size
+        while self._cache and (len(self._cache) > self.max_entries or self._cache_bytes > self.max_bytes):
+            _, evicted = self._cache.popitem(last=False)
+            self._cache_bytes -= evicted.size
+            self.evictions += 1
+
+    def _cache_drop(self, key: str):
+        record = self._cache.pop(key, None)
+        if record is not None:
+            self._cache_bytes -= record.size
+
+    async def _load(self, key: str) -> _Record:
+        """Получить запись из кэша или из БД"""
+        now = time.time()
+        record = self._cache.get(key)
+        if record is not None and record.expires_at > now:
+            self._cache.move_to_end(key)
+            self.hits += 1
+            return record
+
+        self.misses += 1
+        async with get_db() as db:
+            cursor = await db.execute("""
+                SELECT state, data, expires_at FROM fsm_state
+                WHERE key = ? AND expires_at > ?
+            """, (key, now))
+            row = await cursor.fetchone()
+
+        if row:
+            record = _Record(state=row["state"], data=row["data"], expires_at=row["expires_at"])
+        else:
+            record = _Record(state=None, data="{}", expires_at=now + self.ttl_seconds)
+        self._cache_put(key, record)
+        return record
+
+    async def _save(self, key: str, state: Optional[str], data: str):
+        """Записать состояние в БД и в кэш (пустое состояние удаляется)"""
+        now = time.time()
+        record = _Record(state=state, data=data, expires_at=now + self.ttl_seconds)
+
+        async with get_db() as db:
+            if state is None and data == "{}":
+                await db.execute("DELETE FROM fsm_state WHERE key = ?", (key,))
+            else:
+                await db.execute("""
+                    INSERT INTO fsm_state (key, state, data, expires_at)
+                    VALUES (?, ?, ?, ?)
+                    ON CONFLICT(key) DO UPDATE SET
+                        state = excluded.state,
+                        data = excluded.data,
+                        expires_at = excluded.expires_at
+                """, (key, state, data, record.expires_at))
+
+            if now - self._last_purge > PURGE_INTERVAL_SECONDS:
+                self._last_purge = now
+                await db.execute("DELETE FROM fsm_state WHERE expires_at <= ?", (now,))
+            await db.commit()
+
+        self._cache_put(key, record)
+
+    async def set_state(self, key: StorageKey, state: StateType = None) -> None:
+        storage_key = self._make_key(key)
+        record = await self._load(storage_key)
+        state = state.state if isinstance(state, State) else state
+        await self._save(storage_key, state, record.data)
+
+    async def get_state(self, key: StorageKey) -> Optional[str]:
+        record = await self._load(self._make_key(key))
+        return record.state
+
+    async def set_data(self, key: StorageKey, data: Dict[str, Any]) -> None:
+        storage_key = self._make_key(key)
+        record = await self._load(storage_key)
+        await self._save(storage_key, record.state, json.dumps(data, ensure_ascii=False))
+
+    async def get_data(self, key: StorageKey) -> Dict[str, Any]:
+        record = await self._load(self._make_key(key))
+        return json.loads(record.data)
+
+    async def close(self) -> None:
+        self._cache.clear()
+        self._cache_bytes = 0
+
+    def metrics(self) -> Dict[str, Any]:
+        """Метрики кэша состояний: размер в записях и байтах, попадания, вытеснения"""
+        return {
+            "entries": len(self._cache),
+            "bytes": self._cache_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+        }
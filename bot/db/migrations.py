@@ -0,0 +1,192 @@
+import logging
+import aiosqlite
+from typing import Awaitable, Callable, List, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+async def _migration_1_base_schema(db: aiosqlite.Connection):
+    """Базовая схема: words, reviews, card_cache"""
+    await db.execute("""
+        CREATE TABLE IF NOT EXISTS words (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id INTEGER NOT NULL,
+            term TEXT NOT NULL,
+            pos TEXT,
+            ipa TEXT,
+            reading_ru TEXT,
+            translations_ru TEXT,
+            definition_en TEXT,
+            examples TEXT,
+            frequency INTEGER DEFAULT 1,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            UNIQUE(user_id, term)
+        )
+    """)
+
+    # Старые БД могли быть созданы без поля frequency
+    cursor = await db.execute("PRAGMA table_info(words)")
+    columns = {row["name"] for row in await cursor.fetchall()}
+    if "frequency" not in columns:
+        await db.execute("ALTER TABLE words ADD COLUMN frequency INTEGER DEFAULT 1")
+
+    await db.execute("""
+        CREATE TABLE IF NOT EXISTS reviews (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            word_id INTEGER NOT NULL,
+            user_id INTEGER NOT NULL,
+            next_review_at TIMESTAMP,
+            interval_days REAL DEFAULT 1,
+            ease REAL DEFAULT 2.5,
+            last_result TEXT,
+            FOREIGN KEY (word_id) REFERENCES words(id) ON DELETE CASCADE
+        )
+    """)
+
+    # Общий для всех пользователей кэш сгенерированных карточек
+    await db.execute("""
+        CREATE TABLE IF NOT EXISTS card_cache (
+            term TEXT PRIMARY KEY,
+            card TEXT NOT NULL,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+
+
+async def _migration_2_indexes(db: aiosqlite.Connection):
+    """Индексы для выборок повторений и списка слов"""
+    # Повторения удалённых слов (внешние ключи в SQLite выключены по умолчанию)
+    await db.execute("DELETE FROM reviews WHERE word_id NOT IN (SELECT id FROM words)")
+    # Дубликаты записей повторения для одного слова - оставляем последнюю
+    await db.execute("""
+        DELETE FROM reviews
+        WHERE id NOT IN (SELECT MAX(id) FROM reviews GROUP BY word_id)
+    """)
+
+    await db.execute("CREATE UNIQUE INDEX IF NOT EXISTS idx_reviews_word ON reviews(word_id)")
+    await db.execute("""
+        CREATE INDEX IF NOT EXISTS idx_reviews_user_due
+        ON reviews(user_id, next_review_at, word_id)
+    """)
+    await db.execute("CREATE INDEX IF NOT EXISTS idx_words_user_created ON words(user_id, created_at)")
+
+
+async def _migration_3_fsm_state(db: aiosqlite.Connection):
+    """Таблица FSM-состояний (сессии повторения, черновики карточек)"""
+    await db.execute("""
+        CREATE TABLE IF NOT EXISTS fsm_state (
+            key TEXT PRIMARY KEY,
+            state TEXT,
+            data TEXT NOT NULL,
+            expires_at REAL NOT NULL
+        )
+    """)
+    await db.execute("CREATE INDEX IF NOT EXISTS idx_fsm_state_expires ON fsm_state(expires_at)")
+
+
+async def _migration_4_review_log(db: aiosqlite.Connection):
+    """Журнал повторений и дневные счётчики для статистики"""
+    await db.execute("""
+        CREATE TABLE IF NOT EXISTS review_events (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id INTEGER NOT NULL,
+            word_id INTEGER NOT NULL,
+            result TEXT NOT NULL,
+            interval_days REAL,
+            ease REAL,
+            reviewed_at TIMESTAMP NOT NULL
+        )
+    """)
+    await db.execute("""
+        CREATE INDEX IF NOT EXISTS idx_review_events_user_time
+        ON review_events(user_id, reviewed_at)
+    """)
+
+    # Одна строка на пользователя и день; streak - серия дней подряд на этот день
+    await db.execute("""
+        CREATE TABLE IF NOT EXISTS review_daily (
+            user_id INTEGER NOT NULL,
+            day TEXT NOT NULL,
+            reviewed INTEGER NOT NULL DEFAULT 0,
+            know INTEGER NOT NULL DEFAULT 0,
+            hard INTEGER NOT NULL DEFAULT 0,
+            dontknow INTEGER NOT NULL DEFAULT 0,
+            streak INTEGER NOT NULL DEFAULT 1,
+            PRIMARY KEY (user_id, day)
+        ) WITHOUT ROWID
+    """)
+
+
+async def _migration_5_word_version(db: aiosqlite.Connection):
+    """Версия содержимого слова (ключ кэша отрисованных карточек)"""
+    cursor = await db.execute("PRAGMA table_info(words)")
+    columns = {row["name"] for row in await cursor.fetchall()}
+    if "version" not in columns:
+        await db.execute("ALTER TABLE words ADD COLUMN version INTEGER NOT NULL DEFAULT 1")
+
+
+async def _migration_6_media_cache(db: aiosqlite.Connection):
+    """file_id загруженных в Telegram аудио и картинок по исходному url"""
+    await db.execute("""
+        CREATE TABLE IF NOT EXISTS media_cache (
+            kind TEXT NOT NULL,
+            url TEXT NOT NULL,
+            file_id TEXT NOT NULL,
+            created_at TIMESTAMP NOT NULL,
+            PRIMARY KEY (kind, url)
+        ) WITHOUT ROWID
+    """)
+
+
+async def _migration_7_reminders(db: aiosqlite.Connection):
+    """Напоминания о повторении: время последнего и отключение пользователем"""
+    await db.execute("""
+        CREATE TABLE IF NOT EXISTS reminders (
+            user_id INTEGER PRIMARY KEY,
+            sent_at TIMESTAMP,
+            enabled INTEGER NOT NULL DEFAULT 1
+        )
+    """)
+
+
+# (версия, описание, функция). Новые миграции добавляются только в конец.
+MIGRATIONS: List[Tuple[int, str, Callable[[aiosqlite.Connection], Awaitable[None]]]] = [
+    (1, "base schema", _migration_1_base_schema),
+    (2, "reviews/words indexes", _migration_2_indexes),
+    (3, "fsm state table", _migration_3_fsm_state),
+    (4, "review log and daily counters", _migration_4_review_log),
+    (5, "word content version", _migration_5_word_version),
+    (6, "telegram media file_id cache", _migration_6_media_cache),
+    (7, "review reminders", _migration_7_reminders),
+]
+
+SCHEMA_VERSION = MIGRATIONS[-1][0]
+
+
+async def get_schema_version(db: aiosqlite.Connection) -> int:
+    cursor = await db.execute("PRAGMA user_version")
+    row = await cursor.fetchone()
+    return row[0]
+
+
+async def run_migrations(db: aiosqlite.Connection):
+    """Применить недостающие миграции; каждая выполняется в своей транзакции"""
+    current = await get_schema_version(db)
+    if current >= SCHEMA_VERSION:
+        return
+
+    for version, description, migrate in MIGRATIONS:
+        if version <= current:
+            continue
+
+        logger.info(f"Applying migration {version}: {description}")
+        await db.execute("BEGIN IMMEDIATE")
+        try:
+            await migrate(db)
+            # user_version меняется в той же транзакции, что и схема
+            await db.execute(f"PRAGMA user_version = {int(version)}")
+            await db.commit()
+        except Exception:
+            await db.rollback()
+            raise
+        current = version
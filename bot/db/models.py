@@ -4,6 +4,9 @@ from datetime import datetime, timedelta
 from typing import Optional, List, Dict, Any
 from dataclasses import dataclass
 from bot.db.database import get_db
+from bot.db import distractor_index
+from bot.db.cache import TTLLRUCache
+from bot.services import render, reminders
 
 
 @dataclass
@@ -19,12 +22,14 @@ class Word:
     examples: List[Dict[str, str]]
     frequency: int = 1
     created_at: datetime = None
+    version: int = 1
 
     @classmethod
     def from_row(cls, row) -> "Word":
         """Создать Word из строки БД"""
         # sqlite3.Row не имеет метода .get(), используем проверку через in
-        frequency = row["frequency"] if "frequency" in row.keys() else 1
+        keys = row.keys()
+        frequency = row["frequency"] if "frequency" in keys else 1
         return cls(
             id=row["id"],
             user_id=row["user_id"],
@@ -36,10 +41,20 @@ class Word:
             definition_en=row["definition_en"],
             examples=json.loads(row["examples"] or "[]"),
             frequency=frequency,
-            created_at=datetime.fromisoformat(row["created_at"]) if row["created_at"] else datetime.now()
+            created_at=datetime.fromisoformat(row["created_at"]) if row["created_at"] else datetime.now(),
+            version=row["version"] if "version" in keys else 1
         )
 
 
+@dataclass
+class WordListItem:
+    """Лёгкая проекция слова для списка: без JSON-полей, только первый перевод"""
+    id: int
+    term: str
+    translation: Optional[str]
+    created_at: str
+
+
 @dataclass
 class Review:
     id: int
@@ -64,6 +79,10 @@ class Review:
         )
 
 
+# Кэш количества слов пользователя (сбрасывается при добавлении/удалении)
+_word_counts = TTLLRUCache(max_size=50000, ttl_seconds=10 * 60)
+
+
 async def add_word(
     user_id: int,
     term: str,
@@ -78,52 +97,49 @@ async def add_word(
     Добавить слово в БД или увеличить счётчик если уже существует.
     Возвращает (word_id, is_new) где is_new=True если слово новое, False если уже было.
     """
-    db = await get_db()
-    
-    try:
-        # Пытаемся вставить новое слово
-        cursor = await db.execute("""
-            INSERT INTO words (user_id, term, pos, ipa, reading_ru, translations_ru, definition_en, examples, frequency)
-            VALUES (?, ?, ?, ?, ?, ?, ?, ?, 1)
-        """, (
-            user_id,
-            term,
-            pos,
-            ipa,
-            reading_ru,
-            json.dumps(translations_ru or [], ensure_ascii=False),
-            definition_en,
-            json.dumps(examples or [], ensure_ascii=False)
-        ))
-        word_id = cursor.lastrowid
-        await db.commit()
-        return (word_id, True)
-    except aiosqlite.IntegrityError:
-        # Слово уже существует - увеличиваем счётчик
-        cursor = await db.execute("""
-            UPDATE words 
-            SET frequency = frequency + 1
-            WHERE user_id = ? AND term = ?
-        """, (user_id, term))
-        
-        # Получаем ID слова
-        cursor = await db.execute("""
-            SELECT id FROM words WHERE user_id = ? AND term = ?
-        """, (user_id, term))
-        row = await cursor.fetchone()
-        word_id = row["id"]
-        
-        await db.commit()
-        return (word_id, False)
-    finally:
-        await db.close()
+    async with get_db() as db:
+        try:
+            # Пытаемся вставить новое слово
+            cursor = await db.execute("""
+                INSERT INTO words (user_id, term, pos, ipa, reading_ru, translations_ru, definition_en, examples, frequency)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, 1)
+            """, (
+                user_id,
+                term,
+                pos,
+                ipa,
+                reading_ru,
+                json.dumps(translations_ru or [], ensure_ascii=False),
+                definition_en,
+                json.dumps(examples or [], ensure_ascii=False)
+            ))
+            word_id = cursor.lastrowid
+            await db.commit()
+            _word_counts.pop(user_id)
+            distractor_index.on_word_saved(user_id, word_id, translations_ru, pos)
+            return (word_id, True)
+        except aiosqlite.IntegrityError:
+            # Слово уже существует - увеличиваем счётчик
+            cursor = await db.execute("""
+                UPDATE words 
+                SET frequency = frequency + 1, version = version + 1
+                WHERE user_id = ? AND term = ?
+            """, (user_id, term))
+            
+            # Получаем ID слова
+            cursor = await db.execute("""
+                SELECT id FROM words WHERE user_id = ? AND term = ?
+            """, (user_id, term))
+            row = await cursor.fetchone()
+            word_id = row["id"]
+            
+            await db.commit()
+            return (word_id, False)
 
 
 async def get_word(user_id: int, term: str) -> Optional[Word]:
     """Получить слово по user_id и term"""
-    db = await get_db()
-    
-    try:
+    async with get_db() as db:
         cursor = await db.execute("""
             SELECT * FROM words WHERE user_id = ? AND term = ?
         """, (user_id, term))
@@ -132,8 +148,6 @@ async def get_word(user_id: int, term: str) -> Optional[Word]:
         if row:
             return Word.from_row(row)
         return None
-    finally:
-        await db.close()
 
 
 async def word_exists(user_id: int, term: str) -> bool:
@@ -152,8 +166,6 @@ async def update_word(
     examples: Optional[List[Dict[str, str]]] = None
 ):
     """Обновить данные слова"""
-    db = await get_db()
-    
     updates = []
     values = []
     
@@ -177,52 +189,54 @@ async def update_word(
         values.append(json.dumps(examples, ensure_ascii=False))
     
     if not updates:
-        await db.close()
         return
     
+    updates.append("version = version + 1")
     values.append(word_id)
     query = f"UPDATE words SET {', '.join(updates)} WHERE id = ?"
     
-    try:
+    async with get_db() as db:
         await db.execute(query, values)
         await db.commit()
-    finally:
-        await db.close()
+    
+    distractor_index.on_word_updated(word_id, translations_ru, pos)
+    render.invalidate_word(word_id)
 
 
 async def get_word_by_id(word_id: int) -> Optional[Word]:
     """Получить слово по ID"""
-    db = await get_db()
-    
-    try:
+    async with get_db() as db:
         cursor = await db.execute("SELECT * FROM words WHERE id = ?", (word_id,))
         row = await cursor.fetchone()
         
         if row:
             return Word.from_row(row)
         return None
-    finally:
-        await db.close()
+
+
+async def get_word_version(word_id: int) -> Optional[tuple[int, int]]:
+    """(user_id, version) слова без чтения JSON-полей; None, если слова нет"""
+    async with get_db() as db:
+        cursor = await db.execute("SELECT user_id, version FROM words WHERE id = ?", (word_id,))
+        row = await cursor.fetchone()
+        
+        if row:
+            return (row["user_id"], row["version"])
+        return None
 
 
 async def get_user_words(user_id: int) -> List[Word]:
     """Получить все слова пользователя"""
-    db = await get_db()
-    
-    try:
+    async with get_db() as db:
         cursor = await db.execute("SELECT * FROM words WHERE user_id = ? ORDER BY created_at DESC", (user_id,))
         rows = await cursor.fetchall()
         
         return [Word.from_row(row) for row in rows]
-    finally:
-        await db.close()
 
 
 async def get_random_user_words(user_id: int, limit: int, exclude_word_id: Optional[int] = None) -> List[Word]:
-    """Получить случайные слова пользователя (для Quiz)"""
-    db = await get_db()
-    
-    try:
+    """Получить случайные слова пользователя (для Quiz лучше distractor_index.sample_distractors)"""
+    async with get_db() as db:
         if exclude_word_id:
             cursor = await db.execute("""
                 SELECT * FROM words 
@@ -240,44 +254,175 @@ async def get_random_user_words(user_id: int, limit: int, exclude_word_id: Optio
         
         rows = await cursor.fetchall()
         return [Word.from_row(row) for row in rows]
-    finally:
-        await db.close()
 
 
 async def delete_word(word_id: int, user_id: int) -> bool:
     """Удалить слово (проверяет, что оно принадлежит пользователю)"""
-    db = await get_db()
-    
-    try:
+    async with get_db() as db:
         cursor = await db.execute("""
             DELETE FROM words 
             WHERE id = ? AND user_id = ?
         """, (word_id, user_id))
         
         deleted = cursor.rowcount > 0
+        if deleted:
+            # Внешние ключи выключены, поэтому повторение удаляем явно
+            await db.execute("DELETE FROM reviews WHERE word_id = ?", (word_id,))
         await db.commit()
+        
+        if deleted:
+            _word_counts.pop(user_id)
+            distractor_index.on_word_deleted(user_id, word_id)
+            render.invalidate_word(word_id)
         return deleted
-    finally:
-        await db.close()
+
+
+async def apply_word_learned(db: aiosqlite.Connection, word_id: int, user_id: int, now: datetime):
+    """Отметить слово как изученное на соединении вызывающего кода (без commit)"""
+    # Устанавливаем следующее повторение через 365 дней
+    next_review = now + timedelta(days=365)
+    
+    await db.execute("""
+        UPDATE reviews
+        SET next_review_at = ?, interval_days = 365, ease = 2.5, last_result = 'know'
+        WHERE word_id = ? AND user_id = ?
+    """, (next_review.isoformat(), word_id, user_id))
 
 
 async def mark_word_as_learned(word_id: int, user_id: int):
     """Отметить слово как изученное (устанавливает большое время до следующего повторения)"""
-    from datetime import datetime, timedelta
+    async with get_db() as db:
+        await apply_word_learned(db, word_id, user_id, datetime.now())
+        await db.commit()
+
+
+async def add_words_bulk(user_id: int, cards: List[Dict[str, Any]]) -> tuple[int, int]:
+    """
+    Добавить много слов одной транзакцией (массовый импорт).
+    Новые слова получают запись о повторении, у существующих увеличивается счётчик.
+    Возвращает (добавлено новых, уже было).
+    """
+    # Убираем дубликаты внутри самого списка
+    cards_by_term = {}
+    for card_data in cards:
+        cards_by_term.setdefault(card_data["term"], card_data)
+    terms = list(cards_by_term)
     
-    db = await get_db()
+    if not terms:
+        return (0, 0)
     
-    try:
-        # Устанавливаем следующее повторение через 365 дней
-        next_review = datetime.now() + timedelta(days=365)
+    async with get_db() as db:
+        existing = set()
+        for i in range(0, len(terms), 500):
+            chunk = terms[i:i + 500]
+            placeholders = ", ".join("?" * len(chunk))
+            cursor = await db.execute(
+                f"SELECT term FROM words WHERE user_id = ? AND term IN ({placeholders})",
+                (user_id, *chunk)
+            )
+            existing.update(row["term"] for row in await cursor.fetchall())
         
-        await db.execute("""
-            UPDATE reviews
-            SET next_review_at = ?, interval_days = 365, ease = 2.5, last_result = 'know'
-            WHERE word_id = ? AND user_id = ?
-        """, (next_review.isoformat(), word_id, user_id))
+        new_terms = [term for term in terms if term not in existing]
+        
+        await db.executemany("""
+            INSERT INTO words (user_id, term, pos, ipa, reading_ru, translations_ru, definition_en, examples, frequency)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, 1)
+        """, [
+            (
+                user_id,
+                term,
+                cards_by_term[term].get("pos"),
+                cards_by_term[term].get("ipa"),
+                cards_by_term[term].get("reading_ru"),
+                json.dumps(cards_by_term[term].get("translations_ru") or [], ensure_ascii=False),
+                cards_by_term[term].get("definition_en"),
+                json.dumps(cards_by_term[term].get("examples") or [], ensure_ascii=False)
+            )
+            for term in new_terms
+        ])
+        
+        await db.executemany("""
+            UPDATE words
+            SET frequency = frequency + 1, version = version + 1
+            WHERE user_id = ? AND term = ?
+        """, [(user_id, term) for term in existing])
+        
+        # Первое повторение через 1 день (как в create_review)
+        next_review = (datetime.now() + timedelta(days=1)).isoformat()
+        await db.executemany("""
+            INSERT INTO reviews (word_id, user_id, next_review_at, interval_days, ease)
+            SELECT id, user_id, ?, 1.0, 2.5 FROM words WHERE user_id = ? AND term = ?
+        """, [(next_review, user_id, term) for term in new_terms])
         
         await db.commit()
-    finally:
-        await db.close()
+    
+    if new_terms:
+        _word_counts.pop(user_id)
+        distractor_index.invalidate_user(user_id)
+        reminders.note_due(user_id, datetime.fromisoformat(next_review))
+    return (len(new_terms), len(existing))
+
 
+async def count_user_words(user_id: int) -> int:
+    """Количество слов пользователя (кэшируется до изменения словаря)"""
+    count = _word_counts.get(user_id)
+    if count is not None:
+        return count
+    
+    async with get_db() as db:
+        cursor = await db.execute("SELECT COUNT(*) as count FROM words WHERE user_id = ?", (user_id,))
+        count = (await cursor.fetchone())["count"]
+    
+    _word_counts.set(user_id, count)
+    return count
+
+
+async def get_words_page(
+    user_id: int,
+    limit: int,
+    after: Optional[tuple[str, int]] = None,
+    before: Optional[tuple[str, int]] = None
+) -> List[WordListItem]:
+    """
+    Страница списка слов (новые сверху) по курсору (created_at, id).
+    after - слова старше курсора (следующая страница),
+    before - слова новее курсора (предыдущая страница).
+    Стоимость не зависит от номера страницы: поиск идёт по индексу (user_id, created_at).
+    """
+    columns = "id, term, json_extract(translations_ru, '$[0]') AS translation, created_at"
+    
+    async with get_db() as db:
+        if before is not None:
+            cursor = await db.execute(f"""
+                SELECT {columns} FROM words
+                WHERE user_id = ? AND (created_at, id) > (?, ?)
+                ORDER BY created_at ASC, id ASC
+                LIMIT ?
+            """, (user_id, before[0], before[1], limit))
+            rows = list(reversed(await cursor.fetchall()))
+        elif after is not None:
+            cursor = await db.execute(f"""
+                SELECT {columns} FROM words
+                WHERE user_id = ? AND (created_at, id) < (?, ?)
+                ORDER BY created_at DESC, id DESC
+                LIMIT ?
+            """, (user_id, after[0], after[1], limit))
+            rows = await cursor.fetchall()
+        else:
+            cursor = await db.execute(f"""
+                SELECT {columns} FROM words
+                WHERE user_id = ?
+                ORDER BY created_at DESC, id DESC
+                LIMIT ?
+            """, (user_id, limit))
+            rows = await cursor.fetchall()
+    
+    return [
+        WordListItem(
+            id=row["id"],
+            term=row["term"],
+            translation=row["translation"],
+            created_at=row["created_at"]
+        )
+        for row in rows
+    ]
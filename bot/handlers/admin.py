@@ -0,0 +1,66 @@
+import asyncio
+import html
+import logging
+from typing import Set
+from aiogram import Router, F
+from aiogram.types import Message
+from aiogram.filters import Command, CommandObject
+from bot.config import settings
+from bot.services import profiler
+
+logger = logging.getLogger(__name__)
+
+router = Router()
+
+# Лимит длины сообщения Telegram
+MAX_REPORT_CHARS = 3800
+
+_tasks: Set[asyncio.Task] = set()
+
+
+def get_admin_ids() -> Set[int]:
+    return {int(part) for part in settings.admin_ids.replace(" ", "").split(",") if part}
+
+
+@router.message(Command("profile"), F.from_user.id.func(lambda user_id: user_id in get_admin_ids()))
+async def cmd_profile(message: Message, command: CommandObject):
+    """
+    /profile [секунды] [N updates] [cprofile] - профилирование процесса (только для админов).
+    Примеры: /profile 30, /profile 200 updates, /profile 20 cprofile
+    """
+    args = (command.args or "").lower().split()
+    mode = profiler.MODE_CPROFILE if "cprofile" in args else profiler.MODE_SAMPLING
+    seconds = 30
+    max_updates = None
+    numbers = [int(arg) for arg in args if arg.isdigit()]
+    if numbers and "updates" in args:
+        max_updates = numbers[0]
+        seconds = profiler.MAX_SECONDS
+    elif numbers:
+        seconds = numbers[0]
+
+    if profiler.active is not None:
+        await message.answer("Профилирование уже идёт.")
+        return
+
+    limit = f"{max_updates} обновлений (не дольше {seconds} с)" if max_updates else f"{seconds} с"
+    await message.answer(f"⏱ Профилирую ({mode}): {limit}...")
+
+    # Отчёт придёт отдельным сообщением; handler не держит обработку обновления
+    task = asyncio.create_task(_profile_and_report(message, mode, seconds, max_updates))
+    _tasks.add(task)
+    task.add_done_callback(_tasks.discard)
+
+
+async def _profile_and_report(message: Message, mode: str, seconds: int, max_updates):
+    try:
+        report = await profiler.profile(mode, seconds, max_updates)
+    except Exception as e:
+        logger.error(f"Profiling failed: {e}", exc_info=True)
+        await message.answer(f"Ошибка профилирования: {html.escape(str(e))}")
+        return
+
+    logger.info(f"Profile report:\n{report}")
+    if len(report) > MAX_REPORT_CHARS:
+        report = report[:MAX_REPORT_CHARS] + "\n..."
+    await message.answer(f"<pre>{html.escape(report)}</pre>")
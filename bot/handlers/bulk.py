@@ -0,0 +1,149 @@
+import csv
+import io
+import logging
+import re
+import time
+from typing import List
+from aiogram import Router, F
+from aiogram.types import Message
+from aiogram.filters import Command, CommandObject
+from bot.config import settings
+from bot.services.card_cache import get_word_cards, normalize_term
+from bot.db.models import add_words_bulk
+from bot.keyboards.inline import get_main_reply_keyboard
+
+logger = logging.getLogger(__name__)
+router = Router()
+
+# Максимальный размер импортируемого файла
+MAX_FILE_SIZE = 512 * 1024
+
+# Не чаще одного редактирования сообщения с прогрессом в N секунд
+PROGRESS_EDIT_INTERVAL = 1.5
+
+IMPORT_HELP = """<b>📥 Массовый импорт</b>
+
+Отправь список слов — каждое с новой строки (или через запятую), либо файл <b>.txt</b> / <b>.csv</b> (слово в первой колонке).
+
+Например:
+<code>/import embarrassed, get over, reluctant</code>"""
+
+
+def parse_terms_text(text: str) -> List[str]:
+    """Разбить вставленный список на слова (строки, запятые, точки с запятой)"""
+    parts = re.split(r"[\n,;\t]+", text)
+    return [part.strip() for part in parts if part.strip()]
+
+
+def parse_terms_csv(text: str) -> List[str]:
+    """Взять слова из первой колонки CSV"""
+    terms = []
+    for i, row in enumerate(csv.reader(io.StringIO(text))):
+        if not row or not row[0].strip():
+            continue
+        term = row[0].strip()
+        # Пропускаем заголовок
+        if i == 0 and term.lower() in ("term", "word", "words", "слово"):
+            continue
+        terms.append(term)
+    return terms
+
+
+async def run_import(message: Message, terms: List[str]):
+    """Сгенерировать карточки и добавить все слова одной транзакцией"""
+    user_id = message.from_user.id
+
+    terms = [term for term in terms if len(term) <= 100]
+    if not terms:
+        await message.answer(
+            "Не нашёл слов для импорта.",
+            reply_markup=get_main_reply_keyboard()
+        )
+        return
+
+    skipped = 0
+    if len(terms) > settings.bulk_import_max_terms:
+        skipped = len(terms) - settings.bulk_import_max_terms
+        terms = terms[:settings.bulk_import_max_terms]
+
+    progress_msg = await message.answer(f"📥 Импорт: 0/{len(terms)}...")
+    last_edit = time.monotonic()
+
+    async def on_progress(done: int, total: int):
+        nonlocal last_edit
+        now = time.monotonic()
+        if done < total and now - last_edit < PROGRESS_EDIT_INTERVAL:
+            return
+        last_edit = now
+        try:
+            await progress_msg.edit_text(f"📥 Импорт: генерирую карточки {done}/{total}...")
+        except Exception as e:
+            logger.debug(f"Could not update import progress: {e}")
+
+    try:
+        cards = await get_word_cards(terms, on_progress=on_progress)
+
+        await progress_msg.edit_text(f"📥 Импорт: сохраняю {len(cards)} слов...")
+        added, existing = await add_words_bulk(user_id, list(cards.values()))
+
+        failed = len(set(normalize_term(term) for term in terms)) - len(cards)
+        lines = [
+            "✅ Импорт завершён!",
+            "",
+            f"<b>Добавлено:</b> {added}",
+        ]
+        if existing:
+            lines.append(f"<b>Уже было (счётчик увеличен):</b> {existing}")
+        if failed > 0:
+            lines.append(f"<b>Не удалось сгенерировать:</b> {failed}")
+        if skipped:
+            lines.append(f"<b>Пропущено (лимит {settings.bulk_import_max_terms}):</b> {skipped}")
+
+        await progress_msg.edit_text("\n".join(lines))
+
+    except Exception as e:
+        logger.error(f"Bulk import error: {e}", exc_info=True)
+        await progress_msg.edit_text(
+            "Произошла ошибка при импорте. Попробуй позже."
+        )
+
+
+@router.message(Command("import"))
+async def cmd_import(message: Message, command: CommandObject):
+    """Обработка команды /import"""
+    if not command.args:
+        await message.answer(IMPORT_HELP)
+        return
+
+    await run_import(message, parse_terms_text(command.args))
+
+
+@router.message(F.text.contains("\n") & ~F.text.startswith("/"))
+async def handle_pasted_list(message: Message):
+    """Список слов, вставленный одним сообщением (по слову на строку)"""
+    await run_import(message, parse_terms_text(message.text))
+
+
+@router.message(F.document)
+async def handle_import_document(message: Message):
+    """Импорт слов из .txt или .csv файла"""
+    document = message.document
+    file_name = (document.file_name or "").lower()
+
+    if not file_name.endswith((".txt", ".csv")):
+        await message.answer("Поддерживаются только файлы .txt и .csv.")
+        return
+
+    if document.file_size and document.file_size > MAX_FILE_SIZE:
+        await message.answer("Файл слишком большой (максимум 512 КБ).")
+        return
+
+    buffer = await message.bot.download(document)
+    text = buffer.read().decode("utf-8-sig", errors="ignore")
+
+    if file_name.endswith(".csv"):
+        terms = parse_terms_csv(text)
+    else:
+        terms = parse_terms_text(text)
+
+    await run_import(message, terms)
@@ -1,6 +1,7 @@
 from aiogram import Router
 from aiogram.types import Message
-from aiogram.filters import Command
+from aiogram.filters import Command, CommandObject
+from bot.services.reminders import get_reminders_enabled, set_reminders_enabled
 
 router = Router()
 
@@ -18,8 +19,29 @@ async def cmd_start(message: Message):
 <b>Команды:</b>
 /review — начать повторение слов
 /stats — статистика изучения
+/history — история повторений за 30 дней
+/import — добавить сразу много слов (списком или файлом)
+/reminders — включить или выключить напоминания о повторении
 
 Начни с отправки слова! 📚"""
     
     await message.answer(text)
 
+
+@router.message(Command("reminders"))
+async def cmd_reminders(message: Message, command: CommandObject):
+    """/reminders on|off; без аргумента - переключить"""
+    user_id = message.from_user.id
+    arg = (command.args or "").strip().lower()
+    if arg in ("on", "вкл"):
+        enabled = True
+    elif arg in ("off", "выкл"):
+        enabled = False
+    else:
+        enabled = not await get_reminders_enabled(user_id)
+    
+    await set_reminders_enabled(user_id, enabled)
+    if enabled:
+        await message.answer("🔔 Напоминания включены: напишу, когда появятся слова для повторения.")
+    else:
+        await message.answer("🔕 Напоминания выключены. Включить снова: /reminders on")
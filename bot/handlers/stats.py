@@ -1,16 +1,21 @@
 from aiogram import Router
 from aiogram.types import Message
 from aiogram.filters import Command
-from bot.services.srs import get_review_stats
+from bot.services.srs import get_review_stats, get_review_history
+from bot.services.review_writer import wait_for_user_writes
 
 router = Router()
 
+# Столбики для мини-графика истории
+_BARS = "▁▂▃▄▅▆▇█"
+
 
 @router.message(Command("stats"))
 async def cmd_stats(message: Message):
     """Обработка команды /stats"""
     user_id = message.from_user.id
     
+    await wait_for_user_writes(user_id)
     stats = await get_review_stats(user_id)
     
     text = f"""<b>📊 Статистика</b>
@@ -18,8 +23,43 @@ async def cmd_stats(message: Message):
 <b>Всего слов:</b> {stats['total_words']}
 <b>На повторение сегодня:</b> {stats['due_today']}
 <b>Повторено сегодня:</b> {stats['reviewed_today']}
+<b>🔥 Серия:</b> {stats['streak']} дн. подряд
 
-Используй /review для повторения слов."""
+Используй /review для повторения слов, /history — история за 30 дней."""
     
     await message.answer(text)
 
+
+@router.message(Command("history"))
+async def cmd_history(message: Message):
+    """Обработка команды /history: повторения за последние 30 дней"""
+    user_id = message.from_user.id
+    
+    await wait_for_user_writes(user_id)
+    history = await get_review_history(user_id, days=30)
+    
+    total = sum(day["reviewed"] for day in history)
+    active_days = sum(1 for day in history if day["reviewed"])
+    know = sum(day["know"] for day in history)
+    peak = max(day["reviewed"] for day in history)
+    
+    if peak:
+        chart = "".join(
+            _BARS[min(len(_BARS) - 1, day["reviewed"] * len(_BARS) // (peak + 1))] if day["reviewed"] else "·"
+            for day in history
+        )
+    else:
+        chart = "·" * len(history)
+    
+    accuracy = f"{know * 100 // total}%" if total else "—"
+    
+    text = f"""<b>📅 История за 30 дней</b>
+
+<code>{chart}</code>
+
+<b>Повторений:</b> {total}
+<b>Активных дней:</b> {active_days}
+<b>Лучший день:</b> {peak}
+<b>Ответов «Знаю»:</b> {accuracy}"""
+    
+    await message.answer(text)
@@ -1,11 +1,14 @@
+import asyncio
 import logging
-import httpx
-import tempfile
-import os
+import time
+from typing import Optional
 from aiogram import Router, F
-from aiogram.types import Message, CallbackQuery, InputFile
+from aiogram.types import Message, CallbackQuery
 from aiogram.filters import Command
-from bot.services.ai import generate_word_card
+from aiogram.fsm.context import FSMContext
+from bot.services.card_cache import get_word_card
+from bot.services.media import answer_photo, send_voice_in_background
+from bot.services.render import render_card, VIEW_PREVIEW
 from bot.services.srs import create_review
 from bot.db.models import add_word, word_exists, get_word, update_word
 from bot.keyboards.inline import (
@@ -17,49 +20,46 @@ from bot.keyboards.inline import (
 logger = logging.getLogger(__name__)
 router = Router()
 
-# Хранилище временных карточек (в продакшене лучше Redis)
-_temp_cards = {}
+# Не чаще одного промежуточного редактирования карточки в N секунд (лимиты Telegram)
+PARTIAL_EDIT_INTERVAL = 1.0
 
 
-def format_word_card(card_data: dict) -> str:
-    """Форматирует карточку для отображения"""
-    lines = [
-        f"<b>{card_data['term']}</b>",
-        ""
-    ]
-    
-    if card_data.get('pos'):
-        lines.append(f"<i>{card_data['pos']}</i>")
-    
-    if card_data.get('ipa') or card_data.get('reading_ru'):
-        pronunciation = []
-        if card_data.get('ipa'):
-            pronunciation.append(card_data['ipa'])
-        if card_data.get('reading_ru'):
-            pronunciation.append(f"<i>{card_data['reading_ru']}</i>")
-        lines.append(" / ".join(pronunciation))
-    
-    lines.append("")
-    
-    if card_data.get('translations_ru'):
-        translations = ", ".join(card_data['translations_ru'])
-        lines.append(f"<b>Перевод:</b> {translations}")
-    
-    if card_data.get('definition_en'):
-        lines.append(f"<b>Определение:</b> {card_data['definition_en']}")
-    
-    if card_data.get('examples'):
-        lines.append("")
-        lines.append("<b>Примеры:</b>")
-        for i, example in enumerate(card_data['examples'][:2], 1):
-            lines.append(f"{i}. {example.get('en', '')}")
-            lines.append(f"   {example.get('ru', '')}")
-    
-    return "\n".join(lines)
+class ProgressiveCard:
+    """Показывает поля карточки в сообщении загрузки по мере генерации"""
+
+    def __init__(self, message: Message, term: str):
+        self.message = message
+        self.term = term
+        self.last_edit = 0.0
+        self._task: Optional[asyncio.Task] = None
+
+    async def on_partial(self, fields: dict):
+        # Вызывается внутри чтения потока: только ставим редактирование в фон
+        if not fields.get("translations_ru"):
+            return  # Пока нечего показать
+        if self._task and not self._task.done():
+            return
+        now = time.monotonic()
+        if now - self.last_edit < PARTIAL_EDIT_INTERVAL:
+            return
+        self.last_edit = now
+        text = render_card({"term": self.term, **fields}, VIEW_PREVIEW) + "\n\n⏳ <i>Дописываю карточку...</i>"
+        self._task = asyncio.create_task(self._edit(text))
+
+    async def _edit(self, text: str):
+        try:
+            await self.message.edit_text(text)
+        except Exception as e:
+            logger.debug(f"Could not show partial card: {e}")
+
+    async def finish(self):
+        """Дождаться промежуточного редактирования, чтобы оно не перезаписало итоговое"""
+        if self._task:
+            await self._task
 
 
 @router.message(F.text & ~F.text.startswith("/"))
-async def handle_word_input(message: Message):
+async def handle_word_input(message: Message, state: FSMContext):
     """Обработка ввода слова/фразы"""
     user_id = message.from_user.id
     text = message.text.strip()
@@ -80,20 +80,25 @@ async def handle_word_input(message: Message):
     loading_msg = await message.answer("Ищу слово в словаре...")
     
     try:
-        # Генерируем карточку через Dictionary API
-        card_data = await generate_word_card(text)
+        # Берём карточку из общего кэша или генерируем через ИИ (поля показываются по мере готовности)
+        progress = ProgressiveCard(loading_msg, text)
+        try:
+            card_data = await get_word_card(text, on_partial=progress.on_partial)
+        finally:
+            await progress.finish()
         
-        # Сохраняем во временное хранилище
-        _temp_cards[user_id] = card_data
+        # Сохраняем черновик карточки в хранилище состояний
+        await state.update_data(temp_card=card_data)
         
         # Форматируем текст карточки
-        card_text = format_word_card(card_data)
+        card_text = render_card(card_data, VIEW_PREVIEW)
         
         # Отправляем изображение, если есть
         if card_data.get('image_url'):
             try:
-                await message.answer_photo(
-                    photo=card_data['image_url'],
+                await answer_photo(
+                    message,
+                    card_data['image_url'],
                     caption=card_text,
                     reply_markup=get_word_preview_keyboard()
                 )
@@ -112,40 +117,9 @@ async def handle_word_input(message: Message):
                 reply_markup=get_word_preview_keyboard()
             )
         
-        # Отправляем аудио произношение как голосовое сообщение, если есть
+        # Произношение отправляется в фоне, чтобы не задерживать карточку
         if card_data.get('audio_url'):
-            try:
-                # Скачиваем аудио файл
-                async with httpx.AsyncClient(timeout=10.0) as client:
-                    audio_response = await client.get(card_data['audio_url'])
-                    audio_response.raise_for_status()
-                    
-                    # Сохраняем во временный файл
-                    with tempfile.NamedTemporaryFile(delete=False, suffix='.mp3') as tmp_file:
-                        tmp_file.write(audio_response.content)
-                        tmp_path = tmp_file.name
-                    
-                    try:
-                        # Отправляем как голосовое сообщение
-                        with open(tmp_path, 'rb') as audio_file:
-                            await message.answer_voice(
-                                voice=InputFile(audio_file, filename="pronunciation.mp3"),
-                                caption="🔊 Произношение"
-                            )
-                    finally:
-                        # Удаляем временный файл
-                        if os.path.exists(tmp_path):
-                            os.unlink(tmp_path)
-            except Exception as e:
-                logger.warning(f"Could not send audio as voice message: {e}")
-                # Fallback: пробуем отправить по URL (может не работать для voice)
-                try:
-                    await message.answer_voice(
-                        voice=card_data['audio_url'],
-                        caption="🔊 Произношение"
-                    )
-                except Exception as e2:
-                    logger.warning(f"Could not send audio by URL: {e2}")
+            send_voice_in_background(message.bot, message.chat.id, card_data['audio_url'], caption="🔊 Произношение")
         
     except ValueError as e:
         logger.error(f"Dictionary API error: {e}")
@@ -162,16 +136,15 @@ async def handle_word_input(message: Message):
 
 
 @router.callback_query(F.data == "word_add")
-async def handle_word_add(callback: CallbackQuery):
+async def handle_word_add(callback: CallbackQuery, state: FSMContext):
     """Обработка кнопки 'Добавить'"""
     user_id = callback.from_user.id
     
-    if user_id not in _temp_cards:
+    card_data = (await state.get_data()).get("temp_card")
+    if not card_data:
         await callback.answer("Карточка не найдена. Начни заново.", show_alert=True)
         return
     
-    card_data = _temp_cards[user_id]
-    
     try:
         # Сохраняем в БД (или увеличиваем счётчик если уже есть)
         word_id, is_new = await add_word(
@@ -193,8 +166,8 @@ async def handle_word_add(callback: CallbackQuery):
         if is_new:
             await create_review(word_id, user_id)
         
-        # Удаляем из временного хранилища
-        del _temp_cards[user_id]
+        # Удаляем черновик
+        await state.update_data(temp_card=None)
         
         # Обновляем сообщение
         if is_new:
@@ -219,30 +192,31 @@ async def handle_word_add(callback: CallbackQuery):
 
 
 @router.callback_query(F.data == "word_more_examples")
-async def handle_more_examples(callback: CallbackQuery):
+async def handle_more_examples(callback: CallbackQuery, state: FSMContext):
     """Обработка кнопки 'Ещё примеры' - регенерируем карточку"""
-    user_id = callback.from_user.id
-    
-    if user_id not in _temp_cards:
+    temp_card = (await state.get_data()).get("temp_card")
+    if not temp_card:
         await callback.answer("Карточка не найдена.", show_alert=True)
         return
     
-    term = _temp_cards[user_id]['term']
+    term = temp_card['term']
     
     await callback.message.edit_text("Ищу новые данные...")
     
     try:
-        card_data = await generate_word_card(term)
-        _temp_cards[user_id] = card_data
+        # Пользователь явно просит новые примеры - кэш не используем
+        card_data = await get_word_card(term, bypass_cache=True)
+        await state.update_data(temp_card=card_data)
         
-        card_text = format_word_card(card_data)
+        card_text = render_card(card_data, VIEW_PREVIEW)
         
         # Обновляем сообщение с новыми данными
         # Если есть изображение, отправляем новое сообщение с фото
         if card_data.get('image_url'):
             try:
-                await callback.message.answer_photo(
-                    photo=card_data['image_url'],
+                await answer_photo(
+                    callback.message,
+                    card_data['image_url'],
                     caption=card_text,
                     reply_markup=get_word_preview_keyboard()
                 )
@@ -259,40 +233,11 @@ async def handle_more_examples(callback: CallbackQuery):
                 reply_markup=get_word_preview_keyboard()
             )
         
-        # Отправляем аудио как голосовое сообщение, если есть
+        # Отправляем аудио как голосовое сообщение в фоне, если есть
         if card_data.get('audio_url'):
-            try:
-                # Скачиваем аудио файл
-                async with httpx.AsyncClient(timeout=10.0) as client:
-                    audio_response = await client.get(card_data['audio_url'])
-                    audio_response.raise_for_status()
-                    
-                    # Сохраняем во временный файл
-                    with tempfile.NamedTemporaryFile(delete=False, suffix='.mp3') as tmp_file:
-                        tmp_file.write(audio_response.content)
-                        tmp_path = tmp_file.name
-                    
-                    try:
-                        # Отправляем как голосовое сообщение
-                        with open(tmp_path, 'rb') as audio_file:
-                            await callback.message.answer_voice(
-                                voice=InputFile(audio_file, filename="pronunciation.mp3"),
-                                caption="🔊 Произношение"
-                            )
-                    finally:
-                        # Удаляем временный файл
-                        if os.path.exists(tmp_path):
-                            os.unlink(tmp_path)
-            except Exception as e:
-                logger.warning(f"Could not send audio as voice message: {e}")
-                # Fallback: пробуем отправить по URL
-                try:
-                    await callback.message.answer_voice(
-                        voice=card_data['audio_url'],
-                        caption="🔊 Произношение"
-                    )
-                except Exception as e2:
-                    logger.warning(f"Could not send audio by URL: {e2}")
+            send_voice_in_background(
+                callback.bot, callback.message.chat.id, card_data['audio_url'], caption="🔊 Произношение"
+            )
         
         await callback.answer("Новые данные готовы!")
         
@@ -302,11 +247,9 @@ async def handle_more_examples(callback: CallbackQuery):
 
 
 @router.callback_query(F.data == "word_cancel")
-async def handle_word_cancel(callback: CallbackQuery):
+async def handle_word_cancel(callback: CallbackQuery, state: FSMContext):
     """Обработка кнопки 'Отмена'"""
-    user_id = callback.from_user.id
-    if user_id in _temp_cards:
-        del _temp_cards[user_id]
+    await state.update_data(temp_card=None)
     
     await callback.message.edit_text(
         "Отменено.",
@@ -335,7 +278,7 @@ async def handle_word_update(callback: CallbackQuery):
 
 
 @router.callback_query(F.data.in_(["test_start", "test_later"]))
-async def handle_test_offer(callback: CallbackQuery):
+async def handle_test_offer(callback: CallbackQuery, state: FSMContext):
     """Обработка предложения теста после добавления"""
     if callback.data == "test_start":
         # Импортируем review handler для прямого вызова
@@ -345,7 +288,7 @@ async def handle_test_offer(callback: CallbackQuery):
         # В aiogram 3.x можно вызвать handler напрямую через message
         await callback.message.edit_text("Начинаем повторение...")
         # Вызываем review handler
-        await cmd_review(callback.message)
+        await cmd_review(callback.message, state)
     else:
         await callback.message.edit_text(
             "Хорошо, повторим позже.",
@@ -1,10 +1,21 @@
 import logging
+import re
+from typing import Optional
 from aiogram import Router, F
-from aiogram.types import Message, CallbackQuery
+from aiogram.types import Message, CallbackQuery, InlineKeyboardMarkup
 from aiogram.filters import Command
-from bot.db.models import get_user_words, get_word_by_id, delete_word, mark_word_as_learned
-from bot.services.ai import generate_word_card
-from bot.db.models import update_word
+from bot.db.models import (
+    get_word_by_id,
+    get_word_version,
+    delete_word,
+    update_word,
+    count_user_words,
+    get_words_page,
+    WordListItem
+)
+from bot.services.card_cache import get_word_card
+from bot.services.render import render_card, get_cached_render, VIEW_DETAIL
+from bot.services.review_writer import enqueue_word_learned
 from bot.keyboards.inline import (
     get_main_reply_keyboard,
     get_words_list_keyboard,
@@ -15,49 +26,8 @@ from bot.keyboards.inline import (
 logger = logging.getLogger(__name__)
 router = Router()
 
-# Хранилище текущих страниц для каждого пользователя
-_words_pages = {}
-
-
-def format_word_detail(word) -> str:
-    """Форматирует детальную карточку слова"""
-    lines = [
-        f"<b>{word.term}</b>",
-        ""
-    ]
-    
-    if word.pos:
-        lines.append(f"<i>{word.pos}</i>")
-    
-    if word.ipa or word.reading_ru:
-        pronunciation = []
-        if word.ipa:
-            pronunciation.append(word.ipa)
-        if word.reading_ru:
-            pronunciation.append(f"<i>{word.reading_ru}</i>")
-        lines.append(" / ".join(pronunciation))
-    
-    lines.append("")
-    
-    if word.translations_ru:
-        translations = ", ".join(word.translations_ru)
-        lines.append(f"<b>Перевод:</b> {translations}")
-    
-    if word.definition_en:
-        lines.append(f"<b>Определение:</b> {word.definition_en}")
-    
-    if word.examples:
-        lines.append("")
-        lines.append("<b>Примеры:</b>")
-        for i, example in enumerate(word.examples[:2], 1):
-            lines.append(f"{i}. {example.get('en', '')}")
-            lines.append(f"   {example.get('ru', '')}")
-    
-    if word.frequency > 1:
-        lines.append("")
-        lines.append(f"📊 Частота: {word.frequency} раз(а)")
-    
-    return "\n".join(lines)
+# Слов на странице списка
+WORDS_PER_PAGE = 10
 
 
 @router.message(Command("words"))
@@ -72,65 +42,100 @@ async def handle_words_button(message: Message):
     await show_words_list(message)
 
 
-async def show_words_list(message: Message, page: int = 0):
-    """Показать список слов с пагинацией"""
+def encode_cursor(direction: str, page: int, item: WordListItem) -> str:
+    """
+    callback_data для перехода на страницу page: words_{next|prev}_{page}_{created_at}_{id}.
+    created_at ('YYYY-MM-DD HH:MM:SS') сжимается до цифр, чтобы уложиться в 64 байта.
+    """
+    digits = re.sub(r"\D", "", item.created_at or "")
+    return f"words_{direction}_{page}_{digits}_{item.id}"
+
+
+def decode_cursor(data: str) -> tuple[str, int, tuple[str, int]]:
+    """Разобрать callback_data из encode_cursor: (направление, страница, (created_at, id))"""
+    _, direction, page, digits, word_id = data.split("_")
+    created_at = f"{digits[0:4]}-{digits[4:6]}-{digits[6:8]} {digits[8:10]}:{digits[10:12]}:{digits[12:14]}"
+    if len(digits) > 14:
+        created_at += f".{digits[14:]}"
+    return direction, int(page), (created_at, int(word_id))
+
+
+async def render_words_page(
+    user_id: int,
+    page: int = 0,
+    after: Optional[tuple[str, int]] = None,
+    before: Optional[tuple[str, int]] = None
+) -> Optional[tuple[str, InlineKeyboardMarkup]]:
+    """Текст и клавиатура страницы списка слов (None, если слов нет)"""
+    total = await count_user_words(user_id)
+    if not total:
+        return None
+    
+    words = await get_words_page(user_id, WORDS_PER_PAGE, after=after, before=before)
+    if not words:
+        # Курсор устарел (слова удалены) - начинаем с первой страницы
+        page = 0
+        words = await get_words_page(user_id, WORDS_PER_PAGE)
+    
+    total_pages = (total + WORDS_PER_PAGE - 1) // WORDS_PER_PAGE
+    prev_data = encode_cursor("prev", page - 1, words[0]) if page > 0 else None
+    next_data = encode_cursor("next", page + 1, words[-1]) if page < total_pages - 1 else None
+    
+    text = f"<b>📖 Мои слова ({total}):</b>\n\nВыбери слово для просмотра:"
+    if total_pages > 1:
+        text += f"\n\nСтраница {page + 1}/{total_pages}"
+    
+    return text, get_words_list_keyboard(words, prev_data=prev_data, next_data=next_data)
+
+
+async def show_words_list(message: Message):
+    """Показать первую страницу списка слов"""
     user_id = message.from_user.id
     
-    words = await get_user_words(user_id)
+    rendered = await render_words_page(user_id)
     
-    if not words:
+    if not rendered:
         await message.answer(
             "У тебя пока нет слов. Отправь слово на английском, чтобы добавить!",
             reply_markup=get_main_reply_keyboard()
         )
         return
     
-    # Сохраняем слова для этого пользователя
-    _words_pages[user_id] = words
-    
-    text = f"<b>📖 Мои слова ({len(words)}):</b>\n\nВыбери слово для просмотра:"
-    
-    await message.answer(
-        text,
-        reply_markup=get_words_list_keyboard(words, page=page)
-    )
+    text, keyboard = rendered
+    await message.answer(text, reply_markup=keyboard)
 
 
-@router.callback_query(F.data.startswith("words_page_"))
+@router.callback_query(F.data.startswith("words_next_") | F.data.startswith("words_prev_"))
 async def handle_words_page(callback: CallbackQuery):
     """Обработка пагинации списка слов"""
     user_id = callback.from_user.id
-    page = int(callback.data.split("_")[-1])
+    direction, page, cursor = decode_cursor(callback.data)
     
-    words = _words_pages.get(user_id, [])
-    if not words:
-        words = await get_user_words(user_id)
-        _words_pages[user_id] = words
+    if direction == "next":
+        rendered = await render_words_page(user_id, page, after=cursor)
+    else:
+        rendered = await render_words_page(user_id, page, before=cursor)
     
-    text = f"<b>📖 Мои слова ({len(words)}):</b>\n\nВыбери слово для просмотра:"
+    if not rendered:
+        await callback.answer("Слов больше нет.", show_alert=True)
+        return
     
-    await callback.message.edit_text(
-        text,
-        reply_markup=get_words_list_keyboard(words, page=page)
-    )
+    text, keyboard = rendered
+    await callback.message.edit_text(text, reply_markup=keyboard)
     await callback.answer()
 
 
 @router.callback_query(F.data == "words_list")
 async def handle_words_list_back(callback: CallbackQuery):
     """Вернуться к списку слов"""
-    user_id = callback.from_user.id
-    words = _words_pages.get(user_id, [])
-    if not words:
-        words = await get_user_words(user_id)
-        _words_pages[user_id] = words
+    rendered = await render_words_page(callback.from_user.id)
     
-    text = f"<b>📖 Мои слова ({len(words)}):</b>\n\nВыбери слово для просмотра:"
+    if not rendered:
+        await callback.answer("Слов больше нет.", show_alert=True)
+        return
     
-    await callback.message.edit_text(
-        text,
-        reply_markup=get_words_list_keyboard(words, page=0)
-    )
+    text, keyboard = rendered
+    await callback.message.edit_text(text, reply_markup=keyboard)
     await callback.answer()
 
 
@@ -151,13 +156,20 @@ async def handle_word_view(callback: CallbackQuery):
     user_id = callback.from_user.id
     word_id = int(callback.data.split("_")[-1])
     
-    word = await get_word_by_id(word_id)
+    # Сначала только владелец и версия: готовый HTML из кэша не требует читать JSON-поля
+    meta = await get_word_version(word_id)
     
-    if not word or word.user_id != user_id:
+    if not meta or meta[0] != user_id:
         await callback.answer("Слово не найдено.", show_alert=True)
         return
     
-    text = format_word_detail(word)
+    text = get_cached_render(word_id, meta[1], VIEW_DETAIL)
+    if text is None:
+        word = await get_word_by_id(word_id)
+        if not word:
+            await callback.answer("Слово не найдено.", show_alert=True)
+            return
+        text = render_card(word, VIEW_DETAIL)
     
     await callback.message.edit_text(
         text,
@@ -180,10 +192,6 @@ async def handle_word_delete(callback: CallbackQuery):
         if deleted:
             await callback.message.edit_text("✅ Слово удалено.")
             await callback.answer("Слово удалено")
-            
-            # Обновляем кэш
-            if user_id in _words_pages:
-                _words_pages[user_id] = await get_user_words(user_id)
         else:
             await callback.answer("Ошибка при удалении.", show_alert=True)
     else:
@@ -213,7 +221,7 @@ async def handle_word_learned(callback: CallbackQuery):
         await callback.answer("Слово не найдено.", show_alert=True)
         return
     
-    await mark_word_as_learned(word_id, user_id)
+    await enqueue_word_learned(word_id, user_id)
     
     await callback.message.edit_text(
         f"✅ Слово <b>{word.term}</b> отмечено как изученное!\n\nСледующее повторение через год.",
@@ -238,7 +246,7 @@ async def handle_word_regen(callback: CallbackQuery):
     
     try:
         # Генерируем новую карточку
-        card_data = await generate_word_card(word.term)
+        card_data = await get_word_card(word.term, bypass_cache=True)
         
         # Обновляем слово
         await update_word(
@@ -253,7 +261,7 @@ async def handle_word_regen(callback: CallbackQuery):
         
         # Получаем обновлённое слово
         updated_word = await get_word_by_id(word_id)
-        text = format_word_detail(updated_word)
+        text = render_card(updated_word, VIEW_DETAIL)
         
         await callback.message.edit_text(
             text,
@@ -94,17 +94,16 @@ def get_main_reply_keyboard() -> ReplyKeyboardMarkup:
     )
 
 
-def get_words_list_keyboard(words: list, page: int = 0, per_page: int = 10) -> InlineKeyboardMarkup:
-    """Клавиатура со списком слов (пагинация)"""
-    total_pages = (len(words) + per_page - 1) // per_page
-    start_idx = page * per_page
-    end_idx = start_idx + per_page
-    page_words = words[start_idx:end_idx]
-    
+def get_words_list_keyboard(
+    words: list,
+    prev_data: Optional[str] = None,
+    next_data: Optional[str] = None
+) -> InlineKeyboardMarkup:
+    """Клавиатура со страницей списка слов (words - WordListItem, навигация по курсорам)"""
     buttons = []
-    for word in page_words:
+    for word in words:
         # Формируем текст кнопки: слово + краткий перевод
-        translations = ", ".join(word.translations_ru[:1]) if word.translations_ru else "—"
+        translations = word.translation or "—"
         button_text = f"{word.term} — {translations}"
         if len(button_text) > 40:
             button_text = button_text[:37] + "..."
@@ -115,10 +114,10 @@ def get_words_list_keyboard(words: list, page: int = 0, per_page: int = 10) -> I
     
     # Навигация
     nav_buttons = []
-    if page > 0:
-        nav_buttons.append(InlineKeyboardButton(text="◀️ Назад", callback_data=f"words_page_{page-1}"))
-    if page < total_pages - 1:
-        nav_buttons.append(InlineKeyboardButton(text="Вперёд ▶️", callback_data=f"words_page_{page+1}"))
+    if prev_data:
+        nav_buttons.append(InlineKeyboardButton(text="◀️ Назад", callback_data=prev_data))
+    if next_data:
+        nav_buttons.append(InlineKeyboardButton(text="Вперёд ▶️", callback_data=next_data))
     
     if nav_buttons:
         buttons.append(nav_buttons)
@@ -1,11 +1,25 @@
 import asyncio
 import logging
+import signal
+from typing import Optional
 from aiogram import Bot, Dispatcher
+from aiogram.fsm.storage.base import BaseStorage
 from aiogram.client.default import DefaultBotProperties
 from aiogram.enums import ParseMode
 from bot.config import settings
-from bot.db.database import init_db
-from bot.handlers import start, word, review, stats
+from bot.db.database import init_db, open_pool, close_pool, get_pool_metrics
+from bot.db.distractor_index import get_index_stats
+from bot.db.fsm_storage import SQLiteStorage
+from bot.handlers import start, admin, bulk, words_list, word, review, stats
+from bot.middlewares.metrics import UpdateMetricsMiddleware, HandlerMetricsMiddleware
+from bot.middlewares.throttling import OutboundThrottleMiddleware
+from bot.services import media, metrics, profiler
+from bot.services.ai_scheduler import scheduler
+from bot.services.card_cache import get_cache_stats
+from bot.services.render import get_render_stats
+from bot.services.reminders import reminder_scheduler
+from bot.services.review_writer import writer as review_writer
+from bot.webhook import WebhookServer, serve_webhook
 
 logging.basicConfig(
     level=logging.INFO,
@@ -14,29 +28,127 @@ logging.basicConfig(
 logger = logging.getLogger(__name__)
 
 
+def create_dispatcher(storage: Optional[BaseStorage] = None) -> Dispatcher:
+    """Диспетчер со всеми handlers (роутер можно подключить только к одному диспетчеру)"""
+    dp = Dispatcher(storage=storage)
+    
+    # Регистрация handlers
+    dp.include_router(start.router)
+    dp.include_router(admin.router)
+    dp.include_router(bulk.router)  # до word: перехватывает списки слов и файлы
+    dp.include_router(words_list.router)  # до word: кнопка "📖 Мои слова"
+    dp.include_router(word.router)
+    dp.include_router(review.router)
+    dp.include_router(stats.router)
+
+    # Метрики: outer - всё обновление, inner (наследуется роутерами) - конкретный handler
+    dp.update.outer_middleware(UpdateMetricsMiddleware())
+    dp.message.middleware(HandlerMetricsMiddleware())
+    dp.callback_query.middleware(HandlerMetricsMiddleware())
+    return dp
+
+
+def register_metrics_collectors(storage: SQLiteStorage):
+    """Счётчики и размеры кэшей, которые модули уже считают, - в /metrics"""
+    metrics.register_collector("db_pool", get_pool_metrics)
+    metrics.register_collector(
+        "card_cache",
+        lambda: {key: value for key, value in get_cache_stats().items() if key != "openai"}
+    )
+    metrics.register_collector("openai", scheduler.metrics)
+    metrics.register_collector("render_cache", get_render_stats)
+    metrics.register_collector("distractor_index", get_index_stats)
+    metrics.register_collector("fsm_storage", storage.metrics)
+    metrics.register_collector("review_writer", review_writer.metrics)
+    metrics.register_collector("media", media.get_media_stats)
+    metrics.register_collector("reminders", reminder_scheduler.metrics)
+
+
 async def main():
     """Точка входа в приложение"""
-    # Инициализация БД
+    # Инициализация БД (пул соединений живёт всё время работы бота)
+    await open_pool()
     await init_db()
     logger.info("Database initialized")
+    review_writer.start()
     
     # Инициализация бота
     bot = Bot(
         token=settings.bot_token,
         default=DefaultBotProperties(parse_mode=ParseMode.HTML)
     )
-    dp = Dispatcher()
-    
-    # Регистрация handlers
-    dp.include_router(start.router)
-    dp.include_router(word.router)
-    dp.include_router(review.router)
-    dp.include_router(stats.router)
+    # Лимиты Telegram: очередь на чат, общий token bucket, повтор после 429
+    throttler = None
+    if settings.telegram_throttle_enabled:
+        throttler = OutboundThrottleMiddleware(
+            global_rate=settings.telegram_global_rate,
+            chat_rate=settings.telegram_chat_rate,
+            chat_burst=settings.telegram_chat_burst,
+            max_retries=settings.telegram_max_retries
+        )
+        bot.session.middleware(throttler)
+    # Состояния пользователей хранятся в той же SQLite БД и переживают рестарт
+    storage = SQLiteStorage(
+        ttl_seconds=settings.fsm_state_ttl_seconds,
+        max_entries=settings.fsm_cache_max_entries,
+        max_bytes=settings.fsm_cache_max_bytes
+    )
+    dp = create_dispatcher(storage)
     
-    logger.info("Bot started")
-    await dp.start_polling(bot)
+    webhook_server = None
+    metrics_runner = None
+    register_metrics_collectors(storage)
+    if throttler is not None:
+        metrics.register_collector("telegram_outbound", throttler.metrics)
+    try:
+        # kill -USR1 <pid>: профиль на PROFILE_SIGNAL_SECONDS, отчёт в лог
+        asyncio.get_running_loop().add_signal_handler(signal.SIGUSR1, profiler.start_from_signal)
+    except (NotImplementedError, AttributeError):
+        pass
+    logger.info(f"Bot started ({settings.delivery_mode})")
+    try:
+        if settings.metrics_port:
+            metrics_runner = await metrics.start_metrics_server(settings.metrics_host, settings.metrics_port)
+        if settings.reminders_enabled:
+            await reminder_scheduler.start(bot)
+        if settings.delivery_mode == "webhook":
+            webhook_server = WebhookServer(
+                dp,
+                bot,
+                secret=settings.webhook_secret or None,
+                max_in_flight=settings.webhook_max_in_flight
+            )
+            metrics.register_collector("webhook", webhook_server.metrics)
+            await serve_webhook(webhook_server)
+        else:
+            await bot.delete_webhook()
+            await dp.start_polling(bot)
+    finally:
+        if metrics_runner is not None:
+            await metrics_runner.cleanup()
+        await reminder_scheduler.stop()
+        logger.info(f"Reminder metrics: {reminder_scheduler.metrics()}")
+        if throttler is not None:
+            logger.info(f"Telegram outbound metrics: {throttler.metrics()}")
+        if webhook_server is not None:
+            logger.info(f"Webhook metrics: {webhook_server.metrics()}")
+        # Фоновые отправки аудио пишут file_id в БД - дожидаемся их до закрытия пула
+        await media.close()
+        logger.info(f"Media stats: {media.get_media_stats()}")
+        # Дописываем оценки из очереди до закрытия пула
+        await review_writer.stop()
+        logger.info(f"Review writer metrics: {review_writer.metrics()}")
+        logger.info(f"DB pool metrics: {get_pool_metrics()}")
+        logger.info(f"Card cache stats: {get_cache_stats()}")
+        logger.info(f"FSM storage metrics: {storage.metrics()}")
+        await storage.close()
+        await close_pool()
 
 
 if __name__ == "__main__":
-    asyncio.run(main())
+    if settings.cluster_workers > 1:
+        from bot.cluster import run_cluster
+        run_cluster(settings.cluster_workers)
+    else:
+        asyncio.run(main())
 
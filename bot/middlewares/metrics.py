@@ -0,0 +1,68 @@
+import time
+from typing import Any, Awaitable, Callable, Dict
+from aiogram import BaseMiddleware
+from aiogram.types import TelegramObject, Update
+from bot.services import metrics, profiler
+
+_update_seconds = metrics.histogram(
+    "flipcard_update_seconds",
+    "Полное время обработки обновления (фильтры, FSM, handler)",
+    ("type",)
+)
+_update_errors = metrics.counter(
+    "flipcard_update_errors_total",
+    "Обновления, обработка которых завершилась исключением",
+    ("type", "error")
+)
+_handler_seconds = metrics.histogram(
+    "flipcard_handler_seconds",
+    "Время выполнения handler",
+    ("handler",)
+)
+_handler_errors = metrics.counter(
+    "flipcard_handler_errors_total",
+    "Исключения в handlers",
+    ("handler", "error")
+)
+
+
+class UpdateMetricsMiddleware(BaseMiddleware):
+    """Outer middleware диспетчера: время и ошибки по типу обновления (и счётчик для профилировщика)"""
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: Update,
+        data: Dict[str, Any]
+    ) -> Any:
+        update_type = event.event_type
+        if profiler.active is not None:
+            profiler.active.count_update()
+        started = time.perf_counter()
+        try:
+            return await handler(event, data)
+        except Exception as e:
+            _update_errors.inc(update_type, type(e).__name__)
+            raise
+        finally:
+            _update_seconds.observe(time.perf_counter() - started, update_type)
+
+
+class HandlerMetricsMiddleware(BaseMiddleware):
+    """Inner middleware: время и ошибки конкретного handler (имя функции)"""
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any]
+    ) -> Any:
+        name = data["handler"].callback.__name__
+        started = time.perf_counter()
+        try:
+            return await handler(event, data)
+        except Exception as e:
+            _handler_errors.inc(name, type(e).__name__)
+            raise
+        finally:
+            _handler_seconds.observe(time.perf_counter() - started, name)
@@ -0,0 +1,264 @@
+import asyncio
+import logging
+import time
+from collections import deque
+from typing import Any, Deque, Dict, List, Optional, Tuple
+from aiogram import Bot
+from aiogram.client.session.middlewares.base import BaseRequestMiddleware, NextRequestMiddlewareType
+from aiogram.exceptions import TelegramRetryAfter
+from aiogram.methods import EditMessageCaption, EditMessageReplyMarkup, EditMessageText, TelegramMethod
+from bot.services import metrics
+
+logger = logging.getLogger(__name__)
+
+# Правки, которые полностью заменяют предыдущую правку того же вида
+_COALESCED_EDITS = (EditMessageText, EditMessageReplyMarkup, EditMessageCaption)
+
+# Раз в столько постановок в очередь удаляются состояния давно молчащих чатов
+PRUNE_EVERY = 1000
+
+_queue_wait_seconds = metrics.histogram(
+    "flipcard_telegram_queue_wait_seconds",
+    "Ожидание исходящего запроса к Telegram в очереди ограничителя",
+    ("method",)
+)
+_retry_after_total = metrics.counter(
+    "flipcard_telegram_retry_after_total",
+    "Ответы 429 (retry_after) от Telegram",
+    ("method",)
+)
+
+
+class TokenBucket:
+    """rate токенов в секунду, не больше burst про запас"""
+
+    def __init__(self, rate: float, burst: float):
+        self.rate = rate
+        self.burst = max(1.0, burst)
+        self.tokens = self.burst
+        self.updated_at = time.monotonic()
+
+    def _refill(self, now: float):
+        self.tokens = min(self.burst, self.tokens + (now - self.updated_at) * self.rate)
+        self.updated_at = now
+
+    def delay(self) -> float:
+        """Через сколько секунд будет доступен токен (0 - сейчас)"""
+        now = time.monotonic()
+        self._refill(now)
+        return 0.0 if self.tokens >= 1 else (1 - self.tokens) / self.rate
+
+    def take(self):
+        self._refill(time.monotonic())
+        self.tokens -= 1
+
+    def idle(self) -> bool:
+        """Бакет полный: состояние можно забыть без потери точности"""
+        self._refill(time.monotonic())
+        return self.tokens >= self.burst
+
+
+class _Request:
+    __slots__ = ("make_request", "bot", "method", "futures", "edit_key", "enqueued_at")
+
+    def __init__(self, make_request, bot: Bot, method: TelegramMethod, future: asyncio.Future, edit_key):
+        self.make_request = make_request
+        self.bot = bot
+        self.method = method
+        self.futures: List[asyncio.Future] = [future]
+        self.edit_key = edit_key
+        self.enqueued_at = time.monotonic()
+
+
+class _Chat:
+    __slots__ = ("queue", "bucket", "paused_until", "worker", "edits")
+
+    def __init__(self, rate: float, burst: float):
+        self.queue: Deque[_Request] = deque()
+        self.bucket = TokenBucket(rate, burst)
+        self.paused_until = 0.0
+        self.worker: Optional[asyncio.Task] = None
+        # Правки в очереди (ещё не отправленные): ключ -> запрос
+        self.edits: Dict[Tuple, _Request] = {}
+
+
+class OutboundThrottleMiddleware(BaseRequestMiddleware):
+    """
+    Ограничитель исходящих запросов сессии Bot: общий token bucket
+    (global_rate в секунду) и очередь FIFO на каждый чат со своим лимитом
+    (chat_rate в секунду, chat_burst подряд). Запросы без chat_id
+    (answerCallbackQuery, getUpdates) идут сразу.
+    Новая правка сообщения заменяет ещё не отправленную правку того же вида:
+    вызывающие обе получают результат последней. На 429 чат ставится
+    на паузу retry_after секунд и запрос повторяется до max_retries раз.
+    """
+
+    def __init__(self, global_rate: float, chat_rate: float, chat_burst: int, max_retries: int):
+        self.chat_rate = chat_rate
+        self.chat_burst = chat_burst
+        self.max_retries = max_retries
+        self._global = TokenBucket(global_rate, global_rate)
+        # Общий лимит раздаётся по очереди: спит только владелец блокировки
+        self._global_lock = asyncio.Lock()
+        self._chats: Dict[int, _Chat] = {}
+        self._enqueued = 0
+
+        # Метрики
+        self.queued = 0
+        self.max_queue = 0
+        self.sent = 0
+        self.coalesced = 0
+        self.retries = 0
+        self.failures = 0
+        self.cancelled = 0
+
+    async def __call__(
+        self,
+        make_request: NextRequestMiddlewareType,
+        bot: Bot,
+        method: TelegramMethod,
+    ) -> Any:
+        chat_id = getattr(method, "chat_id", None)
+        if chat_id is None:
+            return await self._direct(make_request, bot, method)
+
+        future = asyncio.get_running_loop().create_future()
+        self._enqueue(chat_id, _Request(make_request, bot, method, future, self._edit_key(method)))
+        return await future
+
+    @staticmethod
+    def _edit_key(method: TelegramMethod) -> Optional[Tuple]:
+        if isinstance(method, _COALESCED_EDITS) and method.message_id is not None:
+            return (type(method), method.message_id)
+        return None
+
+    def _enqueue(self, chat_id: int, request: _Request):
+        chat = self._chats.get(chat_id)
+        if chat is None:
+            chat = self._chats[chat_id] = _Chat(self.chat_rate, self.chat_burst)
+
+        previous = chat.edits.get(request.edit_key) if request.edit_key is not None else None
+        if previous is not None:
+            # Новая правка занимает место старой в очереди, чтобы не обогнать
+            # запросы, поставленные между ними; ждущие обеих получат её результат
+            previous.method = request.method
+            previous.make_request = request.make_request
+            previous.futures.extend(request.futures)
+            self.coalesced += 1
+        else:
+            if request.edit_key is not None:
+                chat.edits[request.edit_key] = request
+            chat.queue.append(request)
+            self.queued += 1
+            self.max_queue = max(self.max_queue, len(chat.queue))
+        if chat.worker is None:
+            chat.worker = asyncio.create_task(self._drain(chat_id, chat))
+
+        self._enqueued += 1
+        if self._enqueued % PRUNE_EVERY == 0:
+            self._prune()
+
+    def _prune(self):
+        idle = [
+            chat_id for chat_id, chat in self._chats.items()
+            if chat.worker is None and not chat.queue and chat.bucket.idle()
+        ]
+        for chat_id in idle:
+            del self._chats[chat_id]
+
+    async def _acquire_global(self):
+        async with self._global_lock:
+            delay = self._global.delay()
+            while delay > 0:
+                await asyncio.sleep(delay)
+                delay = self._global.delay()
+            self._global.take()
+
+    async def _drain(self, chat_id: int, chat: _Chat):
+        """Отправлять запросы чата по одному с его лимитом"""
+        request = None
+        try:
+            while chat.queue:
+                delay = max(chat.paused_until - time.monotonic(), chat.bucket.delay())
+                if delay > 0:
+                    await asyncio.sleep(delay)
+                    continue
+
+                request = chat.queue.popleft()
+                self.queued -= 1
+                if request.edit_key is not None and chat.edits.get(request.edit_key) is request:
+                    del chat.edits[request.edit_key]
+                if all(future.done() for future in request.futures):
+                    # Все вызывающие отменили ожидание - отправлять незачем
+                    self.cancelled += 1
+                    continue
+
+                chat.bucket.take()
+                await self._acquire_global()
+                _queue_wait_seconds.observe(time.monotonic() - request.enqueued_at, type(request.method).__name__)
+                await self._send(chat, request)
+                request = None
+        except asyncio.CancelledError:
+            pending = list(chat.queue) + ([request] if request is not None else [])
+            for item in pending:
+                for future in item.futures:
+                    future.cancel()
+            raise
+        finally:
+            chat.worker = None
+
+    async def _send(self, chat: _Chat, request: _Request):
+        method_name = type(request.method).__name__
+        for attempt in range(self.max_retries + 1):
+            try:
+                result = await request.make_request(request.bot, request.method)
+            except TelegramRetryAfter as e:
+                _retry_after_total.inc(method_name)
+                self.retries += 1
+                if attempt == self.max_retries:
+                    self._fail(request, e)
+                    return
+                logger.warning(f"Telegram flood control for chat {request.method.chat_id}: retry in {e.retry_after}s")
+                chat.paused_until = time.monotonic() + e.retry_after
+                await asyncio.sleep(e.retry_after)
+                await self._acquire_global()
+            except Exception as e:
+                self._fail(request, e)
+                return
+            else:
+                self.sent += 1
+                for future in request.futures:
+                    if not future.done():
+                        future.set_result(result)
+                return
+
+    def _fail(self, request: _Request, error: Exception):
+        self.failures += 1
+        for future in request.futures:
+            if not future.done():
+                future.set_exception(error)
+
+    async def _direct(self, make_request: NextRequestMiddlewareType, bot: Bot, method: TelegramMethod) -> Any:
+        """Запрос вне очередей; на 429 - пауза и повтор"""
+        for attempt in range(self.max_retries + 1):
+            try:
+                return await make_request(bot, method)
+            except TelegramRetryAfter as e:
+                _retry_after_total.inc(type(method).__name__)
+                self.retries += 1
+                if attempt == self.max_retries:
+                    raise
+                await asyncio.sleep(e.retry_after)
+
+    def metrics(self) -> Dict[str, Any]:
+        return {
+            "queued": self.queued,
+            "max_queue": self.max_queue,
+            "chats": len(self._chats),
+            "active_chats": sum(1 for chat in self._chats.values() if chat.worker is not None),
+            "sent": self.sent,
+            "coalesced": self.coalesced,
+            "retries": self.retries,
+            "failures": self.failures,
+            "cancelled": self.cancelled,
+        }
@@ -1,18 +1,218 @@
 import json
-from typing import Dict, Any, Optional
+import time
+from dataclasses import dataclass
+from typing import Dict, Any, Optional, List, Callable, Awaitable
 from openai import AsyncOpenAI
 from bot.config import settings
+from bot.services import metrics
+from bot.services.ai_scheduler import scheduler, PRIORITY_INTERACTIVE, PRIORITY_BULK
+
+_client: Optional[AsyncOpenAI] = None
+
+# Оценка ответа в токенах (до получения usage): одна карточка ~ 300 токенов
+CARD_COMPLETION_TOKENS = 300
+
+SYSTEM_PROMPT = "You are a helpful English vocabulary assistant. Always return valid JSON only."
+
+_request_seconds = metrics.histogram(
+    "flipcard_openai_request_seconds",
+    "Время одной попытки запроса к OpenAI (без ожидания в очереди)",
+    ("mode",)
+)
+_request_errors = metrics.counter(
+    "flipcard_openai_request_errors_total",
+    "Ошибки попыток запроса к OpenAI",
+    ("error",)
+)
+_tokens = metrics.counter(
+    "flipcard_openai_tokens_total",
+    "Токены по данным usage",
+    ("type",)
+)
+_generation_seconds = metrics.histogram(
+    "flipcard_ai_generation_seconds",
+    "Время генерации карточек с учётом очереди и повторов",
+    ("kind",)
+)
+_generation_errors = metrics.counter(
+    "flipcard_ai_generation_errors_total",
+    "Неудачные генерации карточек",
+    ("kind",)
+)
 
 
 def get_client() -> AsyncOpenAI:
-    """Получить клиент OpenAI"""
-    return AsyncOpenAI(api_key=settings.openai_api_key)
+    """Получить клиент OpenAI (один на процесс; повторы делает ai_scheduler)"""
+    global _client
+    if _client is None:
+        _client = AsyncOpenAI(
+            api_key=settings.openai_api_key,
+            base_url=settings.openai_base_url or None,
+            max_retries=0
+        )
+    return _client
+
+
+def estimate_tokens(messages: List[Dict[str, str]], completion_tokens: int) -> int:
+    """Грубая оценка запроса для TPM-бюджета: ~4 символа на токен"""
+    prompt_chars = sum(len(message["content"]) for message in messages)
+    return prompt_chars // 4 + completion_tokens
+
+
+class PartialJSONObject:
+    """
+    Инкрементальный разбор JSON-объекта из потока токенов.
+    fields содержит поля верхнего уровня, значения которых уже пришли целиком;
+    разбор продолжается с места, где остановился в прошлый раз.
+    """
+
+    def __init__(self):
+        self.buffer = ""
+        self.fields: Dict[str, Any] = {}
+        self._pos = 0
+        self._started = False
+
+    def _skip_whitespace(self, pos: int) -> int:
+        while pos < len(self.buffer) and self.buffer[pos] in " \t\r\n":
+            pos += 1
+        return pos
+
+    def feed(self, chunk: str) -> bool:
+        """Добавить кусок ответа; True, если завершилось хотя бы одно новое поле"""
+        self.buffer += chunk
+        added = False
+        while True:
+            pos = self._skip_whitespace(self._pos)
+            if pos >= len(self.buffer):
+                return added
+
+            char = self.buffer[pos]
+            if not self._started:
+                if char != "{":
+                    return added
+                self._started = True
+                self._pos = pos + 1
+                continue
+            if char == ",":
+                self._pos = pos + 1
+                continue
+            if char != '"':
+                # "}" или мусор - дальше полей нет
+                return added
+
+            try:
+                key, pos = _decoder.raw_decode(self.buffer, pos)
+                pos = self._skip_whitespace(pos)
+                if pos >= len(self.buffer) or self.buffer[pos] != ":":
+                    return added
+                value, end = _decoder.raw_decode(self.buffer, self._skip_whitespace(pos + 1))
+            except ValueError:
+                # Значение ещё не пришло целиком
+                return added
+
+            # Число в самом конце буфера может продолжиться в следующем куске
+            if end == len(self.buffer) and isinstance(value, (int, float)):
+                return added
 
+            self.fields[key] = value
+            self._pos = end
+            added = True
 
-async def generate_word_card(term: str) -> Dict[str, Any]:
+
+_decoder = json.JSONDecoder()
+
+
+@dataclass
+class _Completion:
+    content: str
+    usage: Any
+
+
+async def _complete_json(
+    messages: List[Dict[str, str]],
+    priority: int,
+    completion_tokens: int,
+    on_partial: Optional[Callable[[Dict[str, Any]], Awaitable[None]]] = None
+) -> str:
+    """
+    Запрос к модели через общую очередь; возвращает текст ответа.
+    С on_partial ответ читается потоком, и on_partial(поля) вызывается
+    каждый раз, когда завершается новое поле JSON (вызов должен быть быстрым:
+    он выполняется внутри чтения потока).
+    """
+    client = get_client()
+
+    async def call(timeout: float) -> _Completion:
+        response = await client.chat.completions.create(
+            model="gpt-4o-mini",
+            messages=messages,
+            response_format={"type": "json_object"},
+            temperature=0.7,
+            timeout=timeout
+        )
+        return _Completion(response.choices[0].message.content, response.usage)
+
+    async def call_streaming(timeout: float) -> _Completion:
+        stream = await client.chat.completions.create(
+            model="gpt-4o-mini",
+            messages=messages,
+            response_format={"type": "json_object"},
+            temperature=0.7,
+            timeout=timeout,
+            stream=True,
+            stream_options={"include_usage": True}
+        )
+        parser = PartialJSONObject()
+        usage = None
+        async for chunk in stream:
+            if chunk.usage is not None:
+                usage = chunk.usage
+            if chunk.choices and chunk.choices[0].delta.content:
+                if parser.feed(chunk.choices[0].delta.content):
+                    await on_partial(dict(parser.fields))
+        return _Completion(parser.buffer, usage)
+
+    mode = "stream" if on_partial else "plain"
+
+    async def timed_call(timeout: float) -> _Completion:
+        started = time.perf_counter()
+        try:
+            return await (call_streaming if on_partial else call)(timeout)
+        except Exception as e:
+            _request_errors.inc(type(e).__name__)
+            raise
+        finally:
+            _request_seconds.observe(time.perf_counter() - started, mode)
+
+    completion = await scheduler.run(
+        timed_call,
+        priority=priority,
+        estimated_tokens=estimate_tokens(messages, completion_tokens)
+    )
+    if completion.usage is not None:
+        _tokens.inc("prompt", amount=completion.usage.prompt_tokens or 0)
+        _tokens.inc("completion", amount=completion.usage.completion_tokens or 0)
+    return completion.content
+
+
+def validate_card(card_data: Dict[str, Any]):
+    """Проверить, что в карточке есть обязательные поля"""
+    required_fields = ["term", "translations_ru", "definition_en", "examples"]
+    for field in required_fields:
+        if field not in card_data:
+            raise ValueError(f"Missing required field: {field}")
+
+
+async def generate_word_card(
+    term: str,
+    priority: int = PRIORITY_INTERACTIVE,
+    on_partial: Optional[Callable[[Dict[str, Any]], Awaitable[None]]] = None
+) -> Dict[str, Any]:
     """
     Генерирует карточку слова через OpenAI.
     Возвращает структурированный JSON с полями карточки.
+    priority - приоритет в очереди запросов (см. ai_scheduler).
+    on_partial - получать готовые поля карточки по мере генерации (потоковый режим).
     """
     prompt = f"""Generate a vocabulary card for the English word/phrase: "{term}"
 
@@ -37,31 +237,87 @@ Requirements:
 - For phrasal verbs, include the full phrase in "term"
 - Return ONLY the JSON, no additional text"""
 
+    started = time.perf_counter()
     try:
-        client = get_client()
-        response = await client.chat.completions.create(
-            model="gpt-4o-mini",
-            messages=[
-                {"role": "system", "content": "You are a helpful English vocabulary assistant. Always return valid JSON only."},
-                {"role": "user", "content": prompt}
-            ],
-            response_format={"type": "json_object"},
-            temperature=0.7
-        )
+        content = await _complete_json([
+            {"role": "system", "content": SYSTEM_PROMPT},
+            {"role": "user", "content": prompt}
+        ], priority, CARD_COMPLETION_TOKENS, on_partial)
         
-        content = response.choices[0].message.content
         card_data = json.loads(content)
         
-        # Валидация обязательных полей
-        required_fields = ["term", "translations_ru", "definition_en", "examples"]
-        for field in required_fields:
-            if field not in card_data:
-                raise ValueError(f"Missing required field: {field}")
+        validate_card(card_data)
         
         return card_data
         
     except json.JSONDecodeError as e:
+        _generation_errors.inc("card")
         raise ValueError(f"Failed to parse AI response as JSON: {e}")
     except Exception as e:
+        _generation_errors.inc("card")
         raise ValueError(f"AI generation failed: {e}")
+    finally:
+        _generation_seconds.observe(time.perf_counter() - started, "card")
+
+
+async def generate_word_cards(terms: List[str], priority: int = PRIORITY_BULK) -> List[Dict[str, Any]]:
+    """
+    Генерирует карточки для нескольких слов одним запросом к OpenAI.
+    Возвращает только валидные карточки (порядок как в terms, пропуски возможны).
+    """
+    terms_list = "\n".join(f"- {term}" for term in terms)
+    prompt = f"""Generate vocabulary cards for each of the following English words/phrases:
+{terms_list}
 
+Return ONLY a valid JSON object with the following structure:
+{{
+  "cards": [
+    {{
+      "term": "the word/phrase exactly as given",
+      "pos": "part of speech (noun/verb/adjective/adverb/phrasal verb/etc.)",
+      "ipa": "IPA pronunciation in format /ɪmˈbærəst/",
+      "reading_ru": "simplified pronunciation in Russian letters (e.g., им-БЭ-рэст)",
+      "translations_ru": ["translation 1", "translation 2", "translation 3"],
+      "definition_en": "simple English definition in one sentence",
+      "examples": [
+        {{"en": "English example sentence 1", "ru": "Russian translation 1"}},
+        {{"en": "English example sentence 2", "ru": "Russian translation 2"}}
+      ]
+    }}
+  ]
+}}
+
+Requirements:
+- Return exactly one card per word/phrase, in the same order
+- Provide 1-3 Russian translations
+- Provide exactly 2 examples with both English and Russian
+- Keep definitions simple and clear
+- For phrasal verbs, include the full phrase in "term"
+- Return ONLY the JSON, no additional text"""
+
+    started = time.perf_counter()
+    try:
+        content = await _complete_json([
+            {"role": "system", "content": SYSTEM_PROMPT},
+            {"role": "user", "content": prompt}
+        ], priority, CARD_COMPLETION_TOKENS * len(terms))
+        
+        cards = json.loads(content).get("cards", [])
+        
+    except json.JSONDecodeError as e:
+        _generation_errors.inc("batch")
+        raise ValueError(f"Failed to parse AI response as JSON: {e}")
+    except Exception as e:
+        _generation_errors.inc("batch")
+        raise ValueError(f"AI generation failed: {e}")
+    finally:
+        _generation_seconds.observe(time.perf_counter() - started, "batch")
+    
+    valid_cards = []
+    for card_data in cards:
+        try:
+            validate_card(card_data)
+        except ValueError:
+            continue
+        valid_cards.append(card_data)
+    return valid_cards
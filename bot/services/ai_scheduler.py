@@ -0,0 +1,284 @@
+import asyncio
+import heapq
+import itertools
+import logging
+import random
+import time
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+import openai
+from bot.config import settings
+
+logger = logging.getLogger(__name__)
+
+# Приоритеты запросов (меньше - раньше)
+PRIORITY_INTERACTIVE = 0  # пользователь ждёт карточку нового слова
+PRIORITY_REGENERATE = 1   # перегенерация существующей карточки
+PRIORITY_BULK = 2         # массовый импорт, прогрев кэша
+
+PRIORITY_NAMES = {
+    PRIORITY_INTERACTIVE: "interactive",
+    PRIORITY_REGENERATE: "regenerate",
+    PRIORITY_BULK: "bulk",
+}
+
+# Ошибки, после которых запрос имеет смысл повторить
+RETRYABLE_ERRORS = (
+    openai.RateLimitError,
+    openai.APITimeoutError,
+    openai.APIConnectionError,
+    openai.InternalServerError,
+)
+
+# Backoff между повторами: base * 2^attempt со случайным разбросом, не больше cap
+BACKOFF_BASE_SECONDS = 0.5
+BACKOFF_CAP_SECONDS = 20.0
+
+
+class _TokenBucket:
+    """Бюджет на минуту, пополняется равномерно; может уходить в минус после факта"""
+
+    def __init__(self, per_minute: int):
+        self.capacity = float(per_minute)
+        self.rate = per_minute / 60.0
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+
+    def _refill(self, now: float):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def delay(self, amount: float, now: float) -> float:
+        """Сколько секунд ждать, пока в бюджете появится amount"""
+        self._refill(now)
+        # Запрос дороже всего бюджета пропускаем при полном бюджете
+        amount = min(amount, self.capacity)
+        if self.tokens >= amount:
+            return 0.0
+        return (amount - self.tokens) / self.rate
+
+    def take(self, amount: float, now: float):
+        self._refill(now)
+        self.tokens -= amount
+
+
+@dataclass(order=True)
+class _Ticket:
+    priority: int
+    seq: int
+    tokens: float = field(compare=False)
+    enqueued_at: float = field(compare=False)
+    granted: asyncio.Future = field(compare=False)
+
+
+class AIScheduler:
+    """
+    Очередь запросов к OpenAI с приоритетами.
+    Запрос выполняется, когда есть свободный слот (semaphore на число
+    одновременных запросов) и хватает минутного бюджета запросов (RPM)
+    и токенов (TPM). Ошибки 429/5xx/таймауты повторяются с backoff,
+    Retry-After из ответа приостанавливает всю очередь.
+    """
+
+    def __init__(self, rpm: int, tpm: int, max_concurrency: int, timeout: float, max_retries: int):
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.max_concurrency = max_concurrency
+        self._requests = _TokenBucket(rpm)
+        self._tokens = _TokenBucket(tpm)
+        self._queue: List[_Ticket] = []
+        self._seq = itertools.count()
+        self._in_flight = 0
+        self._paused_until = 0.0
+        self._wakeup = asyncio.Event()
+        self._pump_task: Optional[asyncio.Task] = None
+
+        # Метрики
+        self.started = 0
+        self.completed = 0
+        self.failed = 0
+        self.retries = 0
+        self.rate_limited = 0
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+        self._wait_total = {priority: 0.0 for priority in PRIORITY_NAMES}
+        self._wait_max = {priority: 0.0 for priority in PRIORITY_NAMES}
+        self._wait_count = {priority: 0 for priority in PRIORITY_NAMES}
+
+    def _ensure_pump(self):
+        if self._pump_task is None or self._pump_task.done():
+            self._pump_task = asyncio.create_task(self._pump())
+
+    async def _pump(self):
+        """Выдавать слоты по приоритету, пока очередь не опустеет"""
+        while self._queue:
+            self._wakeup.clear()
+            now = time.monotonic()
+
+            if self._in_flight >= self.max_concurrency:
+                await self._wakeup.wait()
+                continue
+
+            ticket = self._queue[0]
+            if ticket.granted.done():
+                # Ожидающий отменён
+                heapq.heappop(self._queue)
+                continue
+
+            delay = max(
+                self._paused_until - now,
+                self._requests.delay(1, now),
+                self._tokens.delay(ticket.tokens, now)
+            )
+            if delay > 0:
+                # Новый запрос с более высоким приоритетом или освободившийся слот будят раньше
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), delay)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            heapq.heappop(self._queue)
+            self._requests.take(1, now)
+            self._tokens.take(ticket.tokens, now)
+            self._in_flight += 1
+            self._record_wait(ticket.priority, now - ticket.enqueued_at)
+            ticket.granted.set_result(None)
+
+    def _record_wait(self, priority: int, waited: float):
+        self._wait_total[priority] += waited
+        self._wait_count[priority] += 1
+        self._wait_max[priority] = max(self._wait_max[priority], waited)
+
+    async def _acquire(self, priority: int, tokens: float):
+        ticket = _Ticket(
+            priority=priority,
+            seq=next(self._seq),
+            tokens=tokens,
+            enqueued_at=time.monotonic(),
+            granted=asyncio.get_running_loop().create_future()
+        )
+        heapq.heappush(self._queue, ticket)
+        self._wakeup.set()
+        self._ensure_pump()
+        try:
+            await ticket.granted
+        except asyncio.CancelledError:
+            # Слот успели выдать, но ожидающего отменили - возвращаем слот
+            if ticket.granted.done() and not ticket.granted.cancelled():
+                self._release()
+            raise
+
+    def _release(self):
+        self._in_flight -= 1
+        self._wakeup.set()
+
+    @staticmethod
+    def _retry_after(error: Exception) -> Optional[float]:
+        """Пауза из заголовков Retry-After / retry-after-ms, если есть"""
+        response = getattr(error, "response", None)
+        if response is None:
+            return None
+        headers = response.headers
+        for header, divisor in (("retry-after-ms", 1000), ("retry-after", 1)):
+            value = headers.get(header)
+            if value:
+                try:
+                    return float(value) / divisor
+                except ValueError:
+                    continue
+        return None
+
+    def _backoff(self, attempt: int) -> float:
+        return random.uniform(0.5, 1.0) * min(BACKOFF_CAP_SECONDS, BACKOFF_BASE_SECONDS * 2 ** attempt)
+
+    async def run(
+        self,
+        call: Callable[[float], Awaitable[Any]],
+        priority: int = PRIORITY_INTERACTIVE,
+        estimated_tokens: int = 1000
+    ) -> Any:
+        """
+        Выполнить call(timeout) по очереди с учётом бюджета.
+        Каждая попытка заново проходит очередь, поэтому повторы тоже
+        укладываются в RPM/TPM. Фактический расход токенов из response.usage
+        списывается вместо оценки.
+        """
+        attempt = 0
+        while True:
+            await self._acquire(priority, estimated_tokens)
+            self.started += 1
+            try:
+                response = await call(self.timeout)
+            except RETRYABLE_ERRORS as e:
+                error = e
+            except Exception:
+                self.failed += 1
+                raise
+            else:
+                error = None
+            finally:
+                self._release()
+
+            if error is None:
+                break
+
+            if isinstance(error, openai.RateLimitError):
+                self.rate_limited += 1
+            if attempt >= self.max_retries:
+                self.failed += 1
+                raise error
+
+            delay = self._backoff(attempt)
+            retry_after = self._retry_after(error)
+            if retry_after is not None:
+                delay = max(delay, retry_after)
+                # Квота исчерпана для всех: притормаживаем всю очередь
+                self._paused_until = max(self._paused_until, time.monotonic() + retry_after)
+            attempt += 1
+            self.retries += 1
+            logger.warning(f"OpenAI request failed ({type(error).__name__}), retry {attempt} in {delay:.1f}s")
+            await asyncio.sleep(delay)
+
+        self.completed += 1
+        usage = getattr(response, "usage", None)
+        if usage is not None:
+            self.prompt_tokens += usage.prompt_tokens or 0
+            self.completion_tokens += usage.completion_tokens or 0
+            # Поправка бюджета на разницу между оценкой и фактом
+            self._tokens.take((usage.total_tokens or 0) - estimated_tokens, time.monotonic())
+        return response
+
+    def metrics(self) -> Dict[str, Any]:
+        """Глубина очереди по приоритетам, ожидание и расход токенов"""
+        depth = {name: 0 for name in PRIORITY_NAMES.values()}
+        for ticket in self._queue:
+            if not ticket.granted.done():
+                depth[PRIORITY_NAMES[ticket.priority]] += 1
+        return {
+            "queue_depth": depth,
+            "in_flight": self._in_flight,
+            "started": self.started,
+            "completed": self.completed,
+            "failed": self.failed,
+            "retries": self.retries,
+            "rate_limited": self.rate_limited,
+            "prompt_tokens": self.prompt_tokens,
+            "completion_tokens": self.completion_tokens,
+            "wait_avg_ms": {
+                PRIORITY_NAMES[p]: round(self._wait_total[p] / self._wait_count[p] * 1000, 1) if self._wait_count[p] else 0.0
+                for p in PRIORITY_NAMES
+            },
+            "wait_max_ms": {
+                PRIORITY_NAMES[p]: round(self._wait_max[p] * 1000, 1) for p in PRIORITY_NAMES
+            },
+        }
+
+
+scheduler = AIScheduler(
+    rpm=settings.openai_rpm_limit,
+    tpm=settings.openai_tpm_limit,
+    max_concurrency=settings.openai_max_concurrency,
+    timeout=settings.openai_timeout_seconds,
+    max_retries=settings.openai_max_retries
+)
@@ -0,0 +1,252 @@
+import asyncio
+import copy
+import json
+import logging
+from datetime import datetime, timedelta
+from typing import Dict, Any, Optional, List, Set, Callable, Awaitable
+from bot.config import settings
+from bot.db.database import get_db
+from bot.db.cache import TTLLRUCache
+from bot.services.ai import generate_word_card, generate_word_cards
+from bot.services.ai_scheduler import scheduler, PRIORITY_INTERACTIVE, PRIORITY_REGENERATE, PRIORITY_BULK
+from bot.services.singleflight import SingleFlight
+
+logger = logging.getLogger(__name__)
+
+
+def normalize_term(term: str) -> str:
+    """Нормализовать слово/фразу для ключа кэша"""
+    return " ".join(term.strip().lower().split())
+
+
+_memory = TTLLRUCache(settings.card_cache_size, settings.card_cache_ttl_seconds)
+
+# Одновременные генерации одного и того же слова превращаются в один вызов OpenAI
+_generations = SingleFlight(settings.ai_singleflight_max_waiters)
+
+# Счётчики попаданий/промахов
+_stats = {
+    "memory_hits": 0,
+    "db_hits": 0,
+    "misses": 0,
+    "bypasses": 0,
+}
+
+
+async def _load_from_db(key: str) -> Optional[Dict[str, Any]]:
+    """Прочитать карточку из постоянного кэша"""
+    min_created = datetime.now() - timedelta(days=settings.card_cache_db_ttl_days)
+    async with get_db() as db:
+        cursor = await db.execute("""
+            SELECT card FROM card_cache
+            WHERE term = ? AND created_at >= ?
+        """, (key, min_created.isoformat()))
+        row = await cursor.fetchone()
+    if not row:
+        return None
+    return json.loads(row["card"])
+
+
+async def _save_to_db(key: str, card_data: Dict[str, Any]):
+    """Сохранить карточку в постоянный кэш"""
+    async with get_db() as db:
+        await db.execute("""
+            INSERT INTO card_cache (term, card, created_at)
+            VALUES (?, ?, ?)
+            ON CONFLICT(term) DO UPDATE SET card = excluded.card, created_at = excluded.created_at
+        """, (key, json.dumps(card_data, ensure_ascii=False), datetime.now().isoformat()))
+        await db.commit()
+
+
+async def get_word_card(
+    term: str,
+    bypass_cache: bool = False,
+    on_partial: Optional[Callable[[Dict[str, Any]], Awaitable[None]]] = None
+) -> Dict[str, Any]:
+    """
+    Получить карточку слова: память -> SQLite -> OpenAI.
+    bypass_cache=True всегда генерирует новую карточку (она заменяет старую в кэше).
+    on_partial получает готовые поля, если карточка генерируется
+    (ожидающие ту же генерацию получают только итог).
+    """
+    key = normalize_term(term)
+
+    if bypass_cache:
+        _stats["bypasses"] += 1
+    else:
+        card_data = _memory.get(key)
+        if card_data is not None:
+            _stats["memory_hits"] += 1
+            return copy.deepcopy(card_data)
+
+        try:
+            card_data = await _load_from_db(key)
+        except Exception as e:
+            logger.warning(f"Card cache read failed for '{key}': {e}")
+            card_data = None
+        if card_data is not None:
+            _stats["db_hits"] += 1
+            _memory.set(key, card_data)
+            return copy.deepcopy(card_data)
+
+        _stats["misses"] += 1
+
+    priority = PRIORITY_REGENERATE if bypass_cache else PRIORITY_INTERACTIVE
+    # Перегенерация не присоединяется к обычной генерации (та может отдать
+    # карточку, начатую до запроса): у неё свой ключ
+    flight_key = ("regen", key) if bypass_cache else key
+    card_data = await _generations.do(flight_key, lambda: _generate_and_store(term, key, priority, on_partial))
+    return copy.deepcopy(card_data)
+
+
+async def _generate_and_store(
+    term: str,
+    key: str,
+    priority: int,
+    on_partial: Optional[Callable[[Dict[str, Any]], Awaitable[None]]] = None
+) -> Dict[str, Any]:
+    """Сгенерировать карточку и положить её в оба уровня кэша"""
+    card_data = await generate_word_card(term, priority=priority, on_partial=on_partial)
+
+    _memory.set(key, card_data)
+    try:
+        await _save_to_db(key, card_data)
+    except Exception as e:
+        logger.warning(f"Card cache write failed for '{key}': {e}")
+
+    return card_data
+
+
+async def get_cached_terms() -> Set[str]:
+    """Ключи всех ещё не устаревших карточек в постоянном кэше"""
+    min_created = datetime.now() - timedelta(days=settings.card_cache_db_ttl_days)
+    async with get_db() as db:
+        cursor = await db.execute(
+            "SELECT term FROM card_cache WHERE created_at >= ?",
+            (min_created.isoformat(),)
+        )
+        rows = await cursor.fetchall()
+    return {row["term"] for row in rows}
+
+
+async def warm_word_card(term: str) -> Dict[str, Any]:
+    """
+    Сгенерировать карточку для прогрева кэша (без проверки кэша).
+    Идёт тем же путём, что и обычный запрос, но с низким приоритетом,
+    поэтому не задерживает пользователей бота. У прогрева свой ключ
+    single-flight: пользователь, запросивший то же слово, не присоединяется
+    к генерации с низким приоритетом, а запускает свою. Если пользовательская
+    генерация уже идёт, прогрев ждёт её вместо второго запроса.
+    """
+    key = normalize_term(term)
+    if _generations.running(key):
+        return await _generations.do(key, lambda: _generate_and_store(term, key, PRIORITY_INTERACTIVE))
+    return await _generations.do(("warm", key), lambda: _generate_and_store(term, key, PRIORITY_BULK))
+
+
+async def _save_many_to_db(cards: Dict[str, Dict[str, Any]]):
+    """Сохранить несколько карточек в постоянный кэш одной транзакцией"""
+    now = datetime.now().isoformat()
+    async with get_db() as db:
+        await db.executemany("""
+            INSERT INTO card_cache (term, card, created_at)
+            VALUES (?, ?, ?)
+            ON CONFLICT(term) DO UPDATE SET card = excluded.card, created_at = excluded.created_at
+        """, [
+            (key, json.dumps(card_data, ensure_ascii=False), now)
+            for key, card_data in cards.items()
+        ])
+        await db.commit()
+
+
+async def get_word_cards(
+    terms: List[str],
+    on_progress: Optional[Callable[[int, int], Awaitable[None]]] = None
+) -> Dict[str, Dict[str, Any]]:
+    """
+    Получить карточки для списка слов (для массового импорта).
+    Промахи кэша генерируются пачками по несколько слов на запрос
+    с ограниченным числом одновременных запросов.
+    Возвращает {нормализованный term: карточка}; слова без карточки пропускаются.
+    on_progress(done, total) вызывается после каждой пачки.
+    """
+    keys = list(dict.fromkeys(normalize_term(term) for term in terms if term.strip()))
+    result: Dict[str, Dict[str, Any]] = {}
+
+    missing = []
+    for key in keys:
+        card_data = _memory.get(key)
+        if card_data is None:
+            try:
+                card_data = await _load_from_db(key)
+            except Exception as e:
+                logger.warning(f"Card cache read failed for '{key}': {e}")
+            if card_data is not None:
+                _stats["db_hits"] += 1
+                _memory.set(key, card_data)
+        else:
+            _stats["memory_hits"] += 1
+
+        if card_data is not None:
+            result[key] = copy.deepcopy(card_data)
+        else:
+            _stats["misses"] += 1
+            missing.append(key)
+
+    total = len(keys)
+    done = total - len(missing)
+    if on_progress:
+        await on_progress(done, total)
+
+    batch_size = max(1, settings.bulk_import_batch_size)
+    batches = [missing[i:i + batch_size] for i in range(0, len(missing), batch_size)]
+    semaphore = asyncio.Semaphore(settings.bulk_import_concurrency)
+
+    async def run_batch(batch: List[str]):
+        nonlocal done
+        async with semaphore:
+            try:
+                cards = await generate_word_cards(batch)
+            except ValueError as e:
+                logger.warning(f"Batch generation failed for {len(batch)} terms: {e}")
+                cards = []
+
+        # Сопоставляем ответы с запрошенными словами: по term, иначе по позиции
+        generated: Dict[str, Dict[str, Any]] = {}
+        for i, card_data in enumerate(cards):
+            key = normalize_term(card_data.get("term", ""))
+            if key not in batch and i < len(batch) and len(cards) == len(batch):
+                key = batch[i]
+            if key in batch:
+                generated[key] = card_data
+
+        for key, card_data in generated.items():
+            _memory.set(key, card_data)
+            result[key] = copy.deepcopy(card_data)
+        if generated:
+            try:
+                await _save_many_to_db(generated)
+            except Exception as e:
+                logger.warning(f"Card cache write failed for batch: {e}")
+
+        done += len(batch)
+        if on_progress:
+            await on_progress(done, total)
+
+    await asyncio.gather(*(run_batch(batch) for batch in batches))
+
+    return result
+
+
+def get_cache_stats() -> Dict[str, Any]:
+    """Статистика кэша: попадания, промахи и сэкономленные вызовы API"""
+    hits = _stats["memory_hits"] + _stats["db_hits"]
+    lookups = hits + _stats["misses"]
+    return {
+        **_stats,
+        "memory_size": len(_memory),
+        "api_calls_saved": hits + _generations.coalesced,
+        "hit_rate": hits / lookups if lookups else 0.0,
+        "generations": _generations.metrics(),
+        "openai": scheduler.metrics(),
+    }
@@ -0,0 +1,198 @@
+import asyncio
+import logging
+from datetime import datetime
+from typing import Any, Dict, Optional, Set
+import httpx
+from aiogram import Bot
+from aiogram.exceptions import TelegramBadRequest
+from aiogram.types import BufferedInputFile, Message
+from bot.db.cache import TTLLRUCache
+from bot.db.database import get_db
+from bot.services.singleflight import SingleFlight
+
+logger = logging.getLogger(__name__)
+
+# Максимальный размер скачиваемого файла (лимит загрузки Bot API - 50 МБ)
+MAX_MEDIA_BYTES = 20 * 1024 * 1024
+
+DOWNLOAD_TIMEOUT_SECONDS = 10.0
+
+# (вид, url) -> file_id уже загруженного в Telegram файла
+_file_ids = TTLLRUCache(max_size=20000, ttl_seconds=24 * 60 * 60)
+_downloads = SingleFlight(max_waiters=100)
+_client: Optional[httpx.AsyncClient] = None
+_background: Set[asyncio.Task] = set()
+
+_stats = {
+    "file_id_hits": 0,
+    "uploads": 0,
+    "downloaded_bytes": 0,
+    "failures": 0,
+}
+
+
+def _get_client() -> httpx.AsyncClient:
+    """Один HTTP-клиент на процесс (пул соединений переиспользуется)"""
+    global _client
+    if _client is None:
+        _client = httpx.AsyncClient(timeout=DOWNLOAD_TIMEOUT_SECONDS, follow_redirects=True)
+    return _client
+
+
+async def get_file_id(kind: str, url: str) -> Optional[str]:
+    """file_id для url из памяти или из таблицы media_cache"""
+    file_id = _file_ids.get((kind, url))
+    if file_id is not None:
+        return file_id
+
+    async with get_db() as db:
+        cursor = await db.execute(
+            "SELECT file_id FROM media_cache WHERE kind = ? AND url = ?",
+            (kind, url)
+        )
+        row = await cursor.fetchone()
+    if row is None:
+        return None
+
+    _file_ids.set((kind, url), row["file_id"])
+    return row["file_id"]
+
+
+async def remember_file_id(kind: str, url: str, file_id: str):
+    _file_ids.set((kind, url), file_id)
+    async with get_db() as db:
+        await db.execute("""
+            INSERT INTO media_cache (kind, url, file_id, created_at)
+            VALUES (?, ?, ?, ?)
+            ON CONFLICT(kind, url) DO UPDATE SET file_id = excluded.file_id, created_at = excluded.created_at
+        """, (kind, url, file_id, datetime.now().isoformat()))
+        await db.commit()
+
+
+async def forget_file_id(kind: str, url: str):
+    _file_ids.pop((kind, url))
+    async with get_db() as db:
+        await db.execute("DELETE FROM media_cache WHERE kind = ? AND url = ?", (kind, url))
+        await db.commit()
+
+
+async def _download(url: str) -> bytes:
+    """Скачать файл целиком в память (без временных файлов)"""
+    async with _get_client().stream("GET", url) as response:
+        response.raise_for_status()
+        chunks = []
+        size = 0
+        async for chunk in response.aiter_bytes():
+            size += len(chunk)
+            if size > MAX_MEDIA_BYTES:
+                raise ValueError(f"Media file is too large: {url}")
+            chunks.append(chunk)
+    _stats["downloaded_bytes"] += size
+    return b"".join(chunks)
+
+
+async def send_voice(bot: Bot, chat_id: int, url: str, caption: Optional[str] = None):
+    """
+    Отправить голосовое сообщение по url.
+    Первый раз файл скачивается в память и загружается в Telegram,
+    дальше отправляется только сохранённый file_id.
+    """
+    file_id = await get_file_id("voice", url)
+    if file_id is not None:
+        try:
+            await bot.send_voice(chat_id, voice=file_id, caption=caption)
+            _stats["file_id_hits"] += 1
+            return
+        except TelegramBadRequest as e:
+            # Telegram не принял file_id (wrong file identifier) - загружаем заново.
+            # Прочие ошибки (сеть, 429, бот заблокирован) не значат, что file_id плох
+            logger.warning(f"Cached voice file_id rejected for {url}: {e}")
+            await forget_file_id("voice", url)
+
+    data = await _downloads.do(url, lambda: _download(url))
+    sent = await bot.send_voice(
+        chat_id,
+        voice=BufferedInputFile(data, filename="pronunciation.mp3"),
+        caption=caption
+    )
+    _stats["uploads"] += 1
+
+    media = sent.voice or sent.audio or sent.document
+    if media is not None:
+        try:
+            await remember_file_id("voice", url, media.file_id)
+        except Exception as e:
+            # Голосовое уже отправлено: ошибка кэша не должна вызвать повторную отправку
+            logger.warning(f"Could not store voice file_id for {url}: {e}")
+
+
+async def _send_voice_safely(bot: Bot, chat_id: int, url: str, caption: Optional[str]):
+    try:
+        await send_voice(bot, chat_id, url, caption)
+        return
+    except Exception as e:
+        logger.warning(f"Could not upload voice {url}: {e}")
+
+    # Fallback: пусть Telegram сам скачает файл по URL
+    try:
+        await bot.send_voice(chat_id, voice=url, caption=caption)
+    except Exception as e:
+        _stats["failures"] += 1
+        logger.warning(f"Could not send voice by URL {url}: {e}")
+
+
+def send_voice_in_background(bot: Bot, chat_id: int, url: str, caption: Optional[str] = None):
+    """Отправить голосовое в фоне, не задерживая ответ с карточкой"""
+    task = asyncio.create_task(_send_voice_safely(bot, chat_id, url, caption))
+    _background.add(task)
+    task.add_done_callback(_background.discard)
+
+
+async def answer_photo(message: Message, url: str, **kwargs) -> Message:
+    """
+    Ответить фото по url: сохранённым file_id, если он есть, иначе самим url
+    (Telegram скачает файл сам); file_id отправленного фото запоминается.
+    """
+    file_id = await get_file_id("photo", url)
+    if file_id is not None:
+        try:
+            sent = await message.answer_photo(photo=file_id, **kwargs)
+            _stats["file_id_hits"] += 1
+            return sent
+        except TelegramBadRequest as e:
+            logger.warning(f"Cached photo file_id rejected for {url}: {e}")
+            await forget_file_id("photo", url)
+
+    sent = await message.answer_photo(photo=url, **kwargs)
+    await remember_photo(url, sent)
+    return sent
+
+
+async def remember_photo(url: str, sent: Message):
+    """Сохранить file_id фото из отправленного сообщения"""
+    if not sent.photo or sent.photo[-1].file_id == _file_ids.get(("photo", url)):
+        return
+    try:
+        # Самый большой размер - последний
+        await remember_file_id("photo", url, sent.photo[-1].file_id)
+    except Exception as e:
+        # Фото уже отправлено, без кэша просто загрузим его ещё раз в следующий раз
+        logger.warning(f"Could not store photo file_id for {url}: {e}")
+
+
+async def close():
+    """Дождаться фоновых отправок и закрыть HTTP-клиент"""
+    global _client
+    if _background:
+        await asyncio.gather(*_background, return_exceptions=True)
+    if _client is not None:
+        await _client.aclose()
+        _client = None
+
+
+def get_media_stats() -> Dict[str, Any]:
+    return {
+        **_stats,
+        "memory_size": len(_file_ids),
+        "pending": len(_background),
+    }
@@ -0,0 +1,159 @@
+import logging
+import math
+from bisect import bisect_left
+from typing import Any, Callable, Dict, List, Sequence, Tuple
+from aiohttp import web
+
+logger = logging.getLogger(__name__)
+
+# Границы корзин гистограмм, секунды
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+DB_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.5)
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+def _escape(value: Any) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: Sequence[str], values: Sequence[Any]) -> str:
+    if not names:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in zip(names, values)) + "}"
+
+
+def _format_value(value: float) -> str:
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    """Счётчик с метками; inc() - одна операция со словарём"""
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values: Dict[Tuple, float] = {}
+
+    def inc(self, *labels: Any, amount: float = 1):
+        self._values[labels] = self._values.get(labels, 0) + amount
+
+    def collect(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} counter"]
+        for labels, value in list(self._values.items()):
+            lines.append(f"{self.name}{_format_labels(self.labelnames, labels)} {_format_value(value)}")
+        return lines
+
+
+class Histogram:
+    """
+    Гистограмма с метками. observe() считает только попадание в одну
+    корзину (bisect); накопительные суммы строятся при выдаче метрик.
+    """
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = LATENCY_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # метки -> [счётчики корзин (последняя - +Inf), сумма, количество]
+        self._series: Dict[Tuple, list] = {}
+
+    def observe(self, value: float, *labels: Any):
+        series = self._series.get(labels)
+        if series is None:
+            series = self._series[labels] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+        series[0][bisect_left(self.buckets, value)] += 1
+        series[1] += value
+        series[2] += 1
+
+    def collect(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        names = self.labelnames + ("le",)
+        for labels, (counts, total, count) in list(self._series.items()):
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (math.inf,), counts):
+                cumulative += bucket_count
+                lines.append(f"{self.name}_bucket{_format_labels(names, labels + (_format_value(bound),))} {cumulative}")
+            label_text = _format_labels(self.labelnames, labels)
+            lines.append(f"{self.name}_sum{label_text} {_format_value(total)}")
+            lines.append(f"{self.name}_count{label_text} {count}")
+        return lines
+
+
+_metrics: List[Any] = []
+
+# Имя -> функция, возвращающая словарь метрик (get_cache_stats, pool.metrics и т.п.)
+_collectors: Dict[str, Callable[[], Dict[str, Any]]] = {}
+
+
+def counter(name: str, documentation: str, labelnames: Sequence[str] = ()) -> Counter:
+    metric = Counter(name, documentation, labelnames)
+    _metrics.append(metric)
+    return metric
+
+
+def histogram(name: str, documentation: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = LATENCY_BUCKETS) -> Histogram:
+    metric = Histogram(name, documentation, labelnames, buckets)
+    _metrics.append(metric)
+    return metric
+
+
+def register_collector(name: str, collect: Callable[[], Dict[str, Any]]):
+    """
+    Отдавать числовые поля словаря как gauge flipcard_<name>_<поле>.
+    Вложенные словари становятся метками key="...". Вызывается только при
+    запросе /metrics, поэтому на горячий путь не влияет.
+    """
+    _collectors[name] = collect
+
+
+def _collect_dict(prefix: str, values: Dict[str, Any]) -> List[str]:
+    lines = []
+    for key, value in values.items():
+        name = f"{prefix}_{key}"
+        if isinstance(value, bool):
+            value = int(value)
+        if isinstance(value, (int, float)):
+            lines.append(f"# TYPE {name} gauge")
+            lines.append(f"{name} {_format_value(value)}")
+        elif isinstance(value, dict) and value and all(
+            isinstance(item, (int, float)) and not isinstance(item, bool) for item in value.values()
+        ):
+            lines.append(f"# TYPE {name} gauge")
+            for label, item in value.items():
+                lines.append(f'{name}{{key="{_escape(label)}"}} {_format_value(item)}')
+        elif isinstance(value, dict):
+            lines.extend(_collect_dict(name, value))
+    return lines
+
+
+def render_metrics() -> str:
+    """Все метрики в текстовом формате Prometheus"""
+    lines: List[str] = []
+    for metric in _metrics:
+        lines.extend(metric.collect())
+    for name, collect in list(_collectors.items()):
+        try:
+            lines.extend(_collect_dict(f"flipcard_{name}", collect()))
+        except Exception as e:
+            logger.warning(f"Metrics collector '{name}' failed: {e}")
+    return "\n".join(lines) + "\n"
+
+
+async def _handle_metrics(request: web.Request) -> web.Response:
+    return web.Response(body=render_metrics().encode(), headers={"Content-Type": CONTENT_TYPE})
+
+
+async def start_metrics_server(host: str, port: int) -> web.AppRunner:
+    """Поднять HTTP-сервер с /metrics; остановка - await runner.cleanup()"""
+    app = web.Application()
+    app.router.add_get("/metrics", _handle_metrics)
+    runner = web.AppRunner(app, access_log=None)
+    await runner.setup()
+    await web.TCPSite(runner, host, port).start()
+    logger.info(f"Metrics endpoint listening on {host}:{port}/metrics")
+    return runner
@@ -0,0 +1,285 @@
+import asyncio
+import cProfile
+import logging
+import os
+import pstats
+import sys
+import threading
+import time
+from collections import Counter
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional, Set, Tuple
+from bot.config import settings
+
+logger = logging.getLogger(__name__)
+
+MODE_SAMPLING = "sampling"
+MODE_CPROFILE = "cprofile"
+
+# Интервал снятия стека в режиме sampling
+SAMPLE_INTERVAL_SECONDS = 0.005
+
+# Интервал проверки задержки event loop
+LAG_INTERVAL_SECONDS = 0.05
+
+MAX_SECONDS = 300
+TOP_FUNCTIONS = 15
+
+_PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Стек, у которого сверху ожидание в селекторе, - простой event loop
+_IDLE_FILES = ("selectors.py",)
+
+
+def _label(filename: str, line: int, name: str) -> str:
+    """Имя функции для отчёта: name (путь:строка), путь - относительно проекта"""
+    if filename == "~":
+        # Встроенная функция в pstats
+        return name
+    if filename.startswith(_PROJECT_ROOT):
+        filename = os.path.relpath(filename, _PROJECT_ROOT)
+    else:
+        filename = os.path.basename(filename)
+    return f"{name} ({filename}:{line})"
+
+
+# code object -> имя (сэмплер встречает одни и те же функции тысячи раз)
+_code_labels: Dict[Any, str] = {}
+
+
+def _code_label(code) -> str:
+    label = _code_labels.get(code)
+    if label is None:
+        label = _code_labels[code] = _label(code.co_filename, code.co_firstlineno, getattr(code, "co_qualname", code.co_name))
+    return label
+
+
+def _describe_callback(callback) -> str:
+    """Что выполнял callback: корутина задачи или имя функции"""
+    owner = getattr(callback, "__self__", None)
+    if isinstance(owner, asyncio.Task):
+        coro = owner.get_coro()
+        return f"Task {getattr(coro, '__qualname__', coro)}"
+    return getattr(callback, "__qualname__", repr(callback))
+
+
+class ProfileSession:
+    """
+    Профилирование живого процесса на время seconds или до max_updates обновлений.
+    sampling - отдельный поток снимает стек потока event loop каждые 5 мс
+    (накладные расходы малы, результат - collapsed stacks для flamegraph);
+    cprofile - детерминированный cProfile потока event loop (точнее, но медленнее).
+    Одновременно замеряются задержка event loop и медленные callbacks.
+    Режим debug asyncio для этого не включается: он сохраняет стек при
+    создании каждой задачи и сам становится главной горячей точкой.
+    """
+
+    def __init__(self, mode: str, seconds: float, max_updates: Optional[int] = None):
+        self.mode = mode
+        self.seconds = min(seconds, MAX_SECONDS)
+        self.max_updates = max_updates
+        self.updates = 0
+        self.samples: Counter = Counter()
+        self.lags: List[float] = []
+        self.slow_callbacks: List[Tuple[float, str]] = []
+        self.started_at = 0.0
+        self.elapsed = 0.0
+        self.path: Optional[str] = None
+        self._done = asyncio.Event()
+        self._stop_sampler = threading.Event()
+        self._profile: Optional[cProfile.Profile] = None
+
+    def count_update(self):
+        self.updates += 1
+        if self.max_updates and self.updates >= self.max_updates:
+            self._done.set()
+
+    def _sample(self, thread_id: int):
+        """Поток-сэмплер: стек потока event loop в collapsed-виде"""
+        while not self._stop_sampler.wait(SAMPLE_INTERVAL_SECONDS):
+            frame = sys._current_frames().get(thread_id)
+            stack = []
+            while frame is not None:
+                # Обёртка Handle._run из этого модуля есть в каждом стеке - пропускаем
+                if frame.f_code.co_filename != __file__:
+                    stack.append(_code_label(frame.f_code))
+                frame = frame.f_back
+            if stack:
+                self.samples[";".join(reversed(stack))] += 1
+
+    async def _watch_lag(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            started = loop.time()
+            await asyncio.sleep(LAG_INTERVAL_SECONDS)
+            self.lags.append(max(0.0, loop.time() - started - LAG_INTERVAL_SECONDS))
+
+    def _hook_callbacks(self) -> Callable:
+        """Замер каждого callback event loop (Handle._run), как в debug-режиме asyncio"""
+        original = asyncio.events.Handle._run
+        threshold = settings.profile_slow_callback_ms / 1000
+        slow_callbacks = self.slow_callbacks
+
+        def timed_run(handle):
+            started = time.perf_counter()
+            try:
+                original(handle)
+            finally:
+                duration = time.perf_counter() - started
+                if duration >= threshold:
+                    slow_callbacks.append((duration, _describe_callback(handle._callback)))
+
+        asyncio.events.Handle._run = timed_run
+        return original
+
+    async def run(self) -> str:
+        """Профилировать и вернуть текстовый отчёт"""
+        original_run = self._hook_callbacks()
+        lag_task = asyncio.create_task(self._watch_lag())
+        sampler = None
+        self.started_at = time.perf_counter()
+        if self.mode == MODE_CPROFILE:
+            self._profile = cProfile.Profile()
+            self._profile.enable()
+        else:
+            sampler = threading.Thread(
+                target=self._sample, args=(threading.get_ident(),), name="profiler-sampler", daemon=True
+            )
+            sampler.start()
+
+        try:
+            await asyncio.wait_for(self._done.wait(), self.seconds)
+        except asyncio.TimeoutError:
+            pass
+        finally:
+            if self._profile is not None:
+                self._profile.disable()
+            if sampler is not None:
+                self._stop_sampler.set()
+                sampler.join()
+            self.elapsed = time.perf_counter() - self.started_at
+            lag_task.cancel()
+            asyncio.events.Handle._run = original_run
+
+        # Запись файла - в потоке, чтобы не блокировать event loop
+        self.path = await asyncio.to_thread(self._write)
+        return self.report()
+
+    def _write(self) -> str:
+        os.makedirs(settings.profile_dir, exist_ok=True)
+        stamp = datetime.now().strftime("%Y%m%d-%H%M%S")
+        if self._profile is not None:
+            path = os.path.join(settings.profile_dir, f"profile-{stamp}.prof")
+            self._profile.dump_stats(path)
+            return path
+        # Формат collapsed stacks: flamegraph.pl, speedscope, inferno
+        path = os.path.join(settings.profile_dir, f"profile-{stamp}.collapsed")
+        with open(path, "w", encoding="utf-8") as f:
+            for stack, count in self.samples.most_common():
+                f.write(f"{stack} {count}\n")
+        return path
+
+    def _top_sampled(self) -> Tuple[List[str], int, int]:
+        """Горячие функции по сэмплам: собственное время и вместе с вызванными"""
+        own: Counter = Counter()
+        inclusive: Counter = Counter()
+        busy = 0
+        total = sum(self.samples.values())
+        for stack, count in self.samples.items():
+            frames = stack.split(";")
+            if frames[-1].split(" (")[-1].startswith(_IDLE_FILES):
+                continue
+            busy += count
+            own[frames[-1]] += count
+            for frame in set(frames):
+                inclusive[frame] += count
+
+        lines = [f"{'own%':>5} {'total%':>6}  функция"]
+        for frame, count in own.most_common(TOP_FUNCTIONS):
+            lines.append(f"{count / busy * 100:5.1f} {inclusive[frame] / busy * 100:6.1f}  {frame}")
+
+        # Код проекта отдельно: обычно именно он интересен (handlers, from_row, render)
+        project = [
+            (frame, count) for frame, count in inclusive.most_common()
+            if frame.split(" (")[-1].startswith("bot")
+        ][:TOP_FUNCTIONS]
+        if project:
+            lines.append("")
+            lines.append("Код бота (total%):")
+            for frame, count in project:
+                lines.append(f"{count / busy * 100:5.1f}  {frame}")
+        return lines, busy, total
+
+    def _top_cprofile(self) -> List[str]:
+        stats = pstats.Stats(self._profile)
+        rows = []
+        for (filename, line, name), (_, calls, own, cumulative, _) in stats.stats.items():
+            rows.append((own, cumulative, calls, _label(filename, line, name)))
+        rows.sort(reverse=True)
+        lines = [f"{'own,ms':>8} {'cum,ms':>8} {'calls':>7}  функция"]
+        for own, cumulative, calls, label in rows[:TOP_FUNCTIONS]:
+            lines.append(f"{own * 1000:8.1f} {cumulative * 1000:8.1f} {calls:7d}  {label}")
+        return lines
+
+    def report(self) -> str:
+        lines = [
+            f"Профиль ({self.mode}): {self.elapsed:.1f} с, обновлений: {self.updates}",
+        ]
+        if self.lags:
+            ordered = sorted(self.lags)
+            p99 = ordered[min(len(ordered) - 1, int(len(ordered) * 0.99))]
+            lines.append(
+                f"Задержка event loop: средняя {sum(ordered) / len(ordered) * 1000:.1f} мс, "
+                f"p99 {p99 * 1000:.1f} мс, макс {ordered[-1] * 1000:.1f} мс"
+            )
+        lines.append(f"Медленных callbacks (> {settings.profile_slow_callback_ms} мс): {len(self.slow_callbacks)}")
+        for duration, callback in sorted(self.slow_callbacks, reverse=True)[:5]:
+            lines.append(f"  {duration * 1000:.0f} мс  {callback}")
+        lines.append("")
+
+        if self._profile is not None:
+            lines.extend(self._top_cprofile())
+        else:
+            top, busy, total = self._top_sampled()
+            if total:
+                lines.append(f"Сэмплов: {total}, loop занят в {busy / total * 100:.1f}%")
+            if busy:
+                lines.extend(top)
+        lines.append("")
+        lines.append(f"Файл: {self.path}")
+        return "\n".join(lines)
+
+
+# Текущий сеанс (одновременно только один)
+active: Optional[ProfileSession] = None
+_tasks: Set[asyncio.Task] = set()
+
+
+async def profile(mode: str, seconds: float, max_updates: Optional[int] = None) -> str:
+    """Запустить сеанс профилирования и вернуть отчёт"""
+    global active
+    if active is not None:
+        raise RuntimeError("Profiling is already running")
+    active = ProfileSession(mode, seconds, max_updates)
+    try:
+        return await active.run()
+    finally:
+        active = None
+
+
+def start_from_signal():
+    """Обработчик SIGUSR1: профиль на profile_signal_seconds, отчёт - в лог"""
+    if active is not None:
+        logger.warning("Profiling is already running")
+        return
+
+    async def run():
+        try:
+            report = await profile(MODE_SAMPLING, settings.profile_signal_seconds)
+            logger.warning(f"Profile report:\n{report}")
+        except Exception as e:
+            logger.error(f"Profiling failed: {e}", exc_info=True)
+
+    task = asyncio.create_task(run())
+    _tasks.add(task)
+    task.add_done_callback(_tasks.discard)
@@ -0,0 +1,334 @@
+import asyncio
+import heapq
+import logging
+import time
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional, Set, Tuple
+from aiogram import Bot
+from aiogram.exceptions import TelegramForbiddenError, TelegramRetryAfter
+from bot.config import settings
+from bot.db.database import get_db
+from bot.keyboards.inline import get_main_reply_keyboard
+
+logger = logging.getLogger(__name__)
+
+# Повтор после сетевой ошибки при отправке
+RETRY_DELAY = timedelta(minutes=10)
+
+REMINDER_TEXT = (
+    "🔔 Пора повторить слова! Ждут повторения: {count}\n\n"
+    "Нажми «📚 Повторить» или /review. Отключить напоминания: /reminders off"
+)
+
+
+def _parse(value: Optional[str]) -> Optional[datetime]:
+    return datetime.fromisoformat(value) if value else None
+
+
+def quiet_until(now: datetime) -> Optional[datetime]:
+    """Конец тихих часов, если now в них попадает, иначе None"""
+    start = settings.reminder_quiet_start % 24
+    end = settings.reminder_quiet_end % 24
+    if start == end:
+        return None
+    hour = now.hour
+    quiet = start <= hour < end if start < end else (hour >= start or hour < end)
+    if not quiet:
+        return None
+    until = now.replace(hour=end, minute=0, second=0, microsecond=0)
+    if until <= now:
+        until += timedelta(days=1)
+    return until
+
+
+class ReminderScheduler:
+    """
+    Напоминания о повторении без опроса всех пользователей.
+    В памяти - min-heap (время, user_id) с самым ранним next_review_at каждого
+    пользователя. create_review/apply_review сообщают новые даты через note_due():
+    запись добавляется, только если она раньше уже известной. Если дата слова
+    сдвинулась позже (слово повторили), в куче остаётся устаревшая ранняя запись;
+    при пробуждении пачку пользователей проверяет один запрос, и тех, кому
+    повторять пока нечего, переносит на настоящую дату.
+    Задача спит до ближайшей записи, а в тихие часы - до их конца.
+    """
+
+    def __init__(self):
+        self._heap: List[Tuple[datetime, int]] = []
+        # Актуальная запись кучи пользователя; остальные его записи устарели
+        self._next: Dict[int, datetime] = {}
+        self._sent_at: Dict[int, datetime] = {}
+        self._active_at: Dict[int, datetime] = {}
+        self._disabled: Set[int] = set()
+        self._wakeup = asyncio.Event()
+        self._wake_at: Optional[datetime] = None
+        self._bot: Optional[Bot] = None
+        self._task: Optional[asyncio.Task] = None
+
+        # Метрики
+        self.wakeups = 0
+        self.checked = 0
+        self.sent = 0
+        self.failures = 0
+        self.blocked = 0
+        self.rebuild_ms = 0.0
+
+    @property
+    def running(self) -> bool:
+        return self._bot is not None
+
+    async def start(self, bot: Bot):
+        if self._task is not None:
+            return
+        self._bot = bot
+        await self.rebuild()
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        self._bot = None
+
+    def _owns(self, user_id: int) -> bool:
+        return user_id % max(1, settings.reminder_shard_count) == settings.reminder_shard_index
+
+    async def rebuild(self):
+        """Заполнить кучу одним агрегирующим запросом (по индексу reviews(user_id, next_review_at))"""
+        started = time.perf_counter()
+        shard_sql = "WHERE user_id % :count = :index" if settings.reminder_shard_count > 1 else ""
+        async with get_db() as db:
+            cursor = await db.execute(f"""
+                SELECT due.user_id, due.next_at, reminders.sent_at, reminders.enabled
+                FROM (
+                    SELECT user_id, MIN(next_review_at) AS next_at
+                    FROM reviews
+                    {shard_sql}
+                    GROUP BY user_id
+                ) AS due
+                LEFT JOIN reminders ON reminders.user_id = due.user_id
+            """, {"count": settings.reminder_shard_count, "index": settings.reminder_shard_index})
+            rows = await cursor.fetchall()
+
+        now = datetime.now()
+        next_at: Dict[int, datetime] = {}
+        disabled = set()
+        for row in rows:
+            user_id = row["user_id"]
+            if row["enabled"] == 0:
+                disabled.add(user_id)
+                continue
+            sent_at = _parse(row["sent_at"])
+            if sent_at is not None:
+                self._sent_at[user_id] = sent_at
+            # NULL - слово к повторению сразу
+            next_at[user_id] = _parse(row["next_at"]) or now
+
+        self._next = next_at
+        self._disabled = disabled
+        self._heap = [(at, user_id) for user_id, at in next_at.items()]
+        heapq.heapify(self._heap)
+        self._wakeup.set()
+        self.rebuild_ms = (time.perf_counter() - started) * 1000
+        logger.info(f"Reminder heap rebuilt: {len(self._heap)} users in {self.rebuild_ms:.0f} ms")
+
+    def note_due(self, user_id: int, due_at: datetime, reviewed: bool = False):
+        """Новая дата повторения слова пользователя (reviewed - пользователь сейчас повторяет)"""
+        if not self.running or user_id in self._disabled or not self._owns(user_id):
+            return
+        if reviewed:
+            self._active_at[user_id] = datetime.now()
+        self._schedule(user_id, due_at)
+
+    def set_enabled(self, user_id: int, enabled: bool):
+        if enabled:
+            self._disabled.discard(user_id)
+            if self.running and self._owns(user_id):
+                # Есть ли что повторять, проверит запрос при пробуждении
+                self._schedule(user_id, datetime.now())
+        else:
+            self._disabled.add(user_id)
+            self._next.pop(user_id, None)
+
+    def _schedule(self, user_id: int, at: datetime):
+        """Запись в кучу, если она раньше текущей записи пользователя"""
+        current = self._next.get(user_id)
+        if current is not None and current <= at:
+            return
+        self._next[user_id] = at
+        heapq.heappush(self._heap, (at, user_id))
+        # Устаревшие записи копятся, пока не дойдут до вершины - иногда чистим
+        if len(self._heap) > 2 * len(self._next) + 1000:
+            self._heap = [(when, user) for user, when in self._next.items()]
+            heapq.heapify(self._heap)
+        if self._wake_at is None or at < self._wake_at:
+            self._wakeup.set()
+
+    def _peek(self) -> Optional[datetime]:
+        while self._heap and self._next.get(self._heap[0][1]) != self._heap[0][0]:
+            heapq.heappop(self._heap)
+        return self._heap[0][0] if self._heap else None
+
+    def _not_before(self, user_id: int) -> Optional[datetime]:
+        """Раньше этого времени пользователю не напоминаем"""
+        times = []
+        sent_at = self._sent_at.get(user_id)
+        if sent_at is not None:
+            times.append(sent_at + timedelta(hours=settings.reminder_interval_hours))
+        active_at = self._active_at.pop(user_id, None)
+        if active_at is not None:
+            times.append(active_at + timedelta(minutes=settings.reminder_idle_minutes))
+        return max(times, default=None)
+
+    async def _run(self):
+        while True:
+            self._wakeup.clear()
+            now = datetime.now()
+            wake_at = self._peek()
+            if wake_at is not None and wake_at <= now:
+                wake_at = quiet_until(now)
+                if wake_at is None:
+                    try:
+                        await self._process(now)
+                    except Exception as e:
+                        logger.error(f"Reminder batch failed: {e}", exc_info=True)
+                        await asyncio.sleep(RETRY_DELAY.total_seconds())
+                    continue
+
+            self._wake_at = wake_at
+            timeout = max(0.0, (wake_at - now).total_seconds()) if wake_at is not None else None
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+            self.wakeups += 1
+
+    async def _process(self, now: datetime):
+        """Снять с кучи пачку наступивших записей, проверить их одним запросом и разослать"""
+        users = []
+        while self._heap and self._heap[0][0] <= now and len(users) < settings.reminder_batch_size:
+            at, user_id = heapq.heappop(self._heap)
+            if self._next.get(user_id) != at:
+                continue
+            del self._next[user_id]
+            not_before = self._not_before(user_id)
+            if not_before is not None and not_before > now:
+                self._schedule(user_id, not_before)
+                continue
+            users.append(user_id)
+        if not users:
+            return
+
+        self.checked += len(users)
+        due = await self._load_due(users, now)
+        sent: List[int] = []
+        blocked: List[int] = []
+        for user_id in users:
+            count, next_at = due.get(user_id, (0, None))
+            if not count:
+                # Всё уже повторено: ждём настоящую ближайшую дату
+                if next_at is not None:
+                    self._schedule(user_id, next_at)
+                continue
+            if user_id in self._disabled:
+                continue
+            try:
+                await self._bot.send_message(user_id, REMINDER_TEXT.format(count=count), reply_markup=get_main_reply_keyboard())
+            except TelegramRetryAfter as e:
+                self._schedule(user_id, now + timedelta(seconds=e.retry_after))
+                await asyncio.sleep(e.retry_after)
+                continue
+            except TelegramForbiddenError:
+                # Пользователь заблокировал бота
+                self.blocked += 1
+                self._disabled.add(user_id)
+                blocked.append(user_id)
+                continue
+            except Exception as e:
+                self.failures += 1
+                logger.warning(f"Reminder for user {user_id} failed: {e}")
+                self._schedule(user_id, now + RETRY_DELAY)
+                continue
+            self.sent += 1
+            self._sent_at[user_id] = now
+            sent.append(user_id)
+            self._schedule(user_id, now + timedelta(hours=settings.reminder_interval_hours))
+            await asyncio.sleep(1 / settings.reminder_send_per_second)
+
+        await self._save(now, sent, blocked)
+
+    @staticmethod
+    async def _load_due(users: List[int], now: datetime) -> Dict[int, Tuple[int, Optional[datetime]]]:
+        """user_id -> (слов к повторению сейчас, ближайшая дата)"""
+        placeholders = ", ".join("?" * len(users))
+        async with get_db() as db:
+            cursor = await db.execute(f"""
+                SELECT user_id,
+                    SUM(next_review_at IS NULL OR next_review_at <= ?) AS due,
+                    MIN(next_review_at) AS next_at
+                FROM reviews
+                WHERE user_id IN ({placeholders})
+                GROUP BY user_id
+            """, (now.isoformat(), *users))
+            rows = await cursor.fetchall()
+        return {row["user_id"]: (row["due"], _parse(row["next_at"])) for row in rows}
+
+    @staticmethod
+    async def _save(now: datetime, sent: List[int], blocked: List[int]):
+        if not sent and not blocked:
+            return
+        async with get_db() as db:
+            await db.executemany("""
+                INSERT INTO reminders (user_id, sent_at) VALUES (?, ?)
+                ON CONFLICT(user_id) DO UPDATE SET sent_at = excluded.sent_at
+            """, [(user_id, now.isoformat()) for user_id in sent])
+            await db.executemany("""
+                INSERT INTO reminders (user_id, enabled) VALUES (?, 0)
+                ON CONFLICT(user_id) DO UPDATE SET enabled = 0
+            """, [(user_id,) for user_id in blocked])
+            await db.commit()
+
+    def metrics(self) -> Dict[str, Any]:
+        wake_at = self._wake_at
+        return {
+            "users": len(self._next),
+            "heap_size": len(self._heap),
+            "disabled": len(self._disabled),
+            "next_in_seconds": max(0.0, (wake_at - datetime.now()).total_seconds()) if wake_at else 0.0,
+            "wakeups": self.wakeups,
+            "checked": self.checked,
+            "sent": self.sent,
+            "failures": self.failures,
+            "blocked": self.blocked,
+            "rebuild_ms": self.rebuild_ms,
+        }
+
+
+reminder_scheduler = ReminderScheduler()
+
+
+def note_due(user_id: int, due_at: datetime, reviewed: bool = False):
+    """Сообщить планировщику новую дату повторения (ничего не делает, если он не запущен)"""
+    reminder_scheduler.note_due(user_id, due_at, reviewed)
+
+
+async def get_reminders_enabled(user_id: int) -> bool:
+    async with get_db() as db:
+        cursor = await db.execute("SELECT enabled FROM reminders WHERE user_id = ?", (user_id,))
+        row = await cursor.fetchone()
+    return row is None or bool(row["enabled"])
+
+
+async def set_reminders_enabled(user_id: int, enabled: bool):
+    """Включить или отключить напоминания пользователю (команда /reminders)"""
+    async with get_db() as db:
+        await db.execute("""
+            INSERT INTO reminders (user_id, enabled) VALUES (?, ?)
+            ON CONFLICT(user_id) DO UPDATE SET enabled = excluded.enabled
+        """, (user_id, int(enabled)))
+        await db.commit()
+    reminder_scheduler.set_enabled(user_id, enabled)
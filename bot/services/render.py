@@ -0,0 +1,172 @@
+import json
+from typing import Any, Dict, List, Optional
+from bot.config import settings
+from bot.db.cache import TTLLRUCache
+
+# Виды отображения карточки
+VIEW_PREVIEW = "preview"  # карточка нового слова перед добавлением
+VIEW_RECALL = "recall"    # вопрос Recall: перевод и определение без слова
+VIEW_QUIZ = "quiz"        # вопрос Quiz: только слово
+VIEW_ANSWER = "answer"    # ответ в повторении
+VIEW_DETAIL = "detail"    # карточка в списке "Мои слова"
+
+VIEWS = (VIEW_PREVIEW, VIEW_RECALL, VIEW_QUIZ, VIEW_ANSWER, VIEW_DETAIL)
+
+# Кэшируются только полные карточки: короткие виды дешевле отрисовать,
+# чем найти в кэше (см. python -m bot.tools.bench_render)
+CACHED_VIEWS = (VIEW_PREVIEW, VIEW_ANSWER, VIEW_DETAIL)
+
+# (word_id, вид) -> (версия слова, HTML)
+_rendered = TTLLRUCache(
+    max_size=settings.render_cache_size,
+    ttl_seconds=settings.render_cache_ttl_seconds
+)
+
+_stats = {
+    "hits": 0,
+    "misses": 0,
+}
+
+
+def _field(card: Any, name: str, default: Any = None) -> Any:
+    """Поле карточки: dict (черновик, сессия повторения) или Word"""
+    if isinstance(card, dict):
+        return card.get(name, default)
+    return getattr(card, name, default)
+
+
+def _json_list(value: Any) -> List[Any]:
+    """Список из JSON-строки (строка БД) или готового списка"""
+    if isinstance(value, str):
+        return json.loads(value or "[]")
+    return value or []
+
+
+def _pronunciation(card: Any) -> Optional[str]:
+    parts = []
+    if _field(card, "ipa"):
+        parts.append(_field(card, "ipa"))
+    if _field(card, "reading_ru"):
+        parts.append(f"<i>{_field(card, 'reading_ru')}</i>")
+    return " / ".join(parts) if parts else None
+
+
+def _meaning_lines(card: Any) -> List[str]:
+    lines = []
+    translations = _json_list(_field(card, "translations_ru"))
+    if translations:
+        lines.append(f"<b>Перевод:</b> {', '.join(translations)}")
+    if _field(card, "definition_en"):
+        lines.append(f"<b>Определение:</b> {_field(card, 'definition_en')}")
+    return lines
+
+
+def _example_lines(card: Any) -> List[str]:
+    examples = [example for example in _json_list(_field(card, "examples"))[:2] if isinstance(example, dict)]
+    if not examples:
+        return []
+    lines = ["", "<b>Примеры:</b>"]
+    for i, example in enumerate(examples, 1):
+        lines.append(f"{i}. {example.get('en', '')}")
+        lines.append(f"   {example.get('ru', '')}")
+    return lines
+
+
+def _render_full(card: Any) -> List[str]:
+    """Полная карточка: слово, часть речи, произношение, перевод, примеры"""
+    lines = [f"<b>{_field(card, 'term')}</b>", ""]
+    if _field(card, "pos"):
+        lines.append(f"<i>{_field(card, 'pos')}</i>")
+    pronunciation = _pronunciation(card)
+    if pronunciation:
+        lines.append(pronunciation)
+    lines.append("")
+    lines.extend(_meaning_lines(card))
+    lines.extend(_example_lines(card))
+    return lines
+
+
+def _render(card: Any, view: str) -> str:
+    if view == VIEW_PREVIEW:
+        return "\n".join(_render_full(card))
+
+    if view == VIEW_DETAIL:
+        lines = _render_full(card)
+        frequency = _field(card, "frequency", 1) or 1
+        if frequency > 1:
+            lines.append("")
+            lines.append(f"📊 Частота: {frequency} раз(а)")
+        return "\n".join(lines)
+
+    if view == VIEW_RECALL:
+        text = "<b>Вспомни слово:</b>\n\n"
+        translations = _json_list(_field(card, "translations_ru"))
+        if translations:
+            text += f"<b>Перевод:</b> {', '.join(translations)}\n"
+        if _field(card, "definition_en"):
+            text += f"<b>Определение:</b> {_field(card, 'definition_en')}"
+        return text
+
+    if view == VIEW_QUIZ:
+        return f"<b>Выбери правильный перевод:</b>\n\n<b>{_field(card, 'term')}</b>"
+
+    if view == VIEW_ANSWER:
+        lines = [f"<b>{_field(card, 'term')}</b>"]
+        if _field(card, "pos"):
+            lines.append(f"<i>{_field(card, 'pos')}</i>")
+        pronunciation = _pronunciation(card)
+        if pronunciation:
+            lines.append(pronunciation)
+        lines.append("")
+        lines.extend(_meaning_lines(card))
+        lines.extend(_example_lines(card))
+        return "\n".join(lines)
+
+    raise ValueError(f"Unknown card view: {view}")
+
+
+def render_card(card: Any, view: str) -> str:
+    """
+    HTML карточки для вида view.
+    Сохранённые слова (есть id и version) кэшируются по (id, вид) с проверкой
+    версии; черновики без id и короткие виды рендерятся каждый раз.
+    """
+    if view not in CACHED_VIEWS:
+        return _render(card, view)
+
+    word_id = _field(card, "id")
+    version = _field(card, "version")
+    if word_id is None or version is None:
+        return _render(card, view)
+
+    cached = _rendered.get((word_id, view))
+    if cached is not None and cached[0] == version:
+        _stats["hits"] += 1
+        return cached[1]
+
+    _stats["misses"] += 1
+    text = _render(card, view)
+    _rendered.set((word_id, view), (version, text))
+    return text
+
+
+def get_cached_render(word_id: int, version: int, view: str) -> Optional[str]:
+    """Готовый HTML без загрузки слова (None, если в кэше нет этой версии)"""
+    cached = _rendered.get((word_id, view))
+    if cached is not None and cached[0] == version:
+        _stats["hits"] += 1
+        return cached[1]
+    return None
+
+
+def invalidate_word(word_id: int):
+    """Сбросить все виды слова (слово изменено или удалено)"""
+    for view in CACHED_VIEWS:
+        _rendered.pop((word_id, view))
+
+
+def get_render_stats() -> Dict[str, Any]:
+    return {
+        **_stats,
+        "size": len(_rendered),
+    }
@@ -0,0 +1,124 @@
+import json
+import random
+from dataclasses import dataclass, field, asdict
+from typing import Optional, List, Dict, Any
+from bot.services.srs import get_words_for_review
+from bot.db.models import count_user_words
+from bot.db.distractor_index import sample_distractors
+from bot.services.review_writer import wait_for_user_writes
+
+# Сколько вариантов-отвлекателей нужно для Quiz
+QUIZ_DISTRACTORS = 3
+
+# Quiz возможен, только если в словаре хотя бы столько слов
+QUIZ_MIN_DECK_SIZE = 4
+
+
+@dataclass
+class ReviewSession:
+    """Сессия повторения: все карточки, размер словаря и варианты для Quiz загружены заранее"""
+    user_id: int
+    cards: List[Dict[str, Any]]
+    deck_size: int
+    distractors: Dict[int, List[str]] = field(default_factory=dict)
+    position: int = 0
+    test_type: str = "recall"
+    correct_translation: Optional[str] = None
+
+    @property
+    def current(self) -> Optional[Dict[str, Any]]:
+        if self.position < len(self.cards):
+            return self.cards[self.position]
+        return None
+
+    @property
+    def word_id(self) -> Optional[int]:
+        card = self.current
+        return card["id"] if card else None
+
+    def advance(self) -> Optional[Dict[str, Any]]:
+        """Перейти к следующей карточке (None, если карточки закончились)"""
+        self.position += 1
+        self.correct_translation = None
+        return self.current
+
+    def choose_test_type(self) -> str:
+        """Выбрать тип теста для текущей карточки"""
+        if self.deck_size >= QUIZ_MIN_DECK_SIZE:
+            # 50/50 между Recall и Quiz
+            self.test_type = random.choice(["recall", "quiz"])
+        else:
+            # Только Recall
+            self.test_type = "recall"
+        return self.test_type
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Сериализовать сессию для хранилища состояний"""
+        return asdict(self)
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "ReviewSession":
+        """Восстановить сессию из хранилища (ключи JSON-объекта - строки)"""
+        data = dict(data)
+        data["distractors"] = {int(k): v for k, v in data.get("distractors", {}).items()}
+        return cls(**data)
+
+    def get_distractors(self, word_id: int) -> List[str]:
+        """Неправильные варианты для Quiz (дополняются заглушками)"""
+        wrong_translations = list(self.distractors.get(word_id, []))[:QUIZ_DISTRACTORS]
+        while len(wrong_translations) < QUIZ_DISTRACTORS:
+            wrong_translations.append("...")
+        return wrong_translations
+
+
+def _decode_card(row: Dict[str, Any]) -> Dict[str, Any]:
+    """Преобразовать строку БД в word_data (JSON строки -> списки)"""
+    return {
+        "id": row["id"],
+        "term": row["term"],
+        "pos": row.get("pos"),
+        "ipa": row.get("ipa"),
+        "reading_ru": row.get("reading_ru"),
+        "translations_ru": json.loads(row.get("translations_ru") or "[]"),
+        "definition_en": row.get("definition_en"),
+        "examples": json.loads(row.get("examples") or "[]"),
+        "version": row.get("version"),
+    }
+
+
+async def _pick_distractors(user_id: int, cards: List[Dict[str, Any]], deck_size: int) -> Dict[int, List[str]]:
+    """Выбрать неправильные варианты для всех карточек сессии из индекса переводов"""
+    if deck_size < QUIZ_MIN_DECK_SIZE or not cards:
+        return {}
+
+    distractors = {}
+    for card in cards:
+        correct = card["translations_ru"][0] if card["translations_ru"] else None
+        distractors[card["id"]] = await sample_distractors(
+            user_id,
+            QUIZ_DISTRACTORS,
+            exclude_word_id=card["id"],
+            exclude_translation=correct,
+            pos=card.get("pos")
+        )
+    return distractors
+
+
+async def load_review_session(user_id: int, limit: int = 10) -> Optional[ReviewSession]:
+    """Загрузить карточки на повторение; None, если повторять нечего"""
+    # Оценки из прошлой сессии могут ещё стоять в очереди записи
+    await wait_for_user_writes(user_id)
+    rows = await get_words_for_review(user_id, limit=limit)
+    if not rows:
+        return None
+
+    cards = [_decode_card(row) for row in rows]
+    deck_size = await count_user_words(user_id)
+    distractors = await _pick_distractors(user_id, cards, deck_size)
+
+    return ReviewSession(
+        user_id=user_id,
+        cards=cards,
+        deck_size=deck_size,
+        distractors=distractors,
+    )
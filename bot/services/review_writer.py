@@ -0,0 +1,206 @@
+import asyncio
+import logging
+import time
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Dict, List, Optional
+from bot.config import settings
+from bot.db.database import get_db
+from bot.db.models import apply_word_learned
+from bot.services.srs import apply_review
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class _Operation:
+    kind: str  # "review" | "learned"
+    word_id: int
+    user_id: int
+    result: Optional[str]
+    created_at: datetime
+    # Результат: для "review" - False, если слово уже удалено
+    future: asyncio.Future = field(default=None)
+
+
+class ReviewWriter:
+    """
+    Фоновая запись результатов повторения группами.
+    Операции копятся в очереди и коммитятся одной транзакцией каждые
+    flush_ms миллисекунд или каждые batch_size операций.
+    Полная очередь блокирует отправителя (back-pressure).
+    """
+
+    def __init__(self, flush_ms: int, batch_size: int, queue_size: int):
+        self.flush_seconds = flush_ms / 1000
+        self.batch_size = batch_size
+        self._queue: asyncio.Queue = asyncio.Queue(maxsize=queue_size)
+        self._task: Optional[asyncio.Task] = None
+        # Незакоммиченные операции пользователя - для чтения своих же записей
+        self._pending: Dict[int, List[asyncio.Future]] = {}
+
+        # Метрики
+        self.batches = 0
+        self.operations = 0
+        self.failures = 0
+        self.max_batch = 0
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """Дописать всё, что осталось в очереди, и остановить задачу"""
+        if self._task is None:
+            return
+        await self._queue.join()
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None
+
+    async def submit(self, kind: str, word_id: int, user_id: int, result: Optional[str] = None) -> asyncio.Future:
+        """Поставить операцию в очередь; future завершится после коммита"""
+        op = _Operation(
+            kind=kind,
+            word_id=word_id,
+            user_id=user_id,
+            result=result,
+            created_at=datetime.now(),
+            future=asyncio.get_running_loop().create_future()
+        )
+        self._pending.setdefault(user_id, []).append(op.future)
+        op.future.add_done_callback(lambda f: self._forget(user_id, f))
+        await self._queue.put(op)
+        return op.future
+
+    def _forget(self, user_id: int, future: asyncio.Future):
+        futures = self._pending.get(user_id)
+        if futures is None:
+            return
+        if future in futures:
+            futures.remove(future)
+        if not futures:
+            del self._pending[user_id]
+        # Ошибку уже залогировал писатель; помечаем её полученной
+        if not future.cancelled():
+            future.exception()
+
+    async def wait_for_user(self, user_id: int):
+        """Дождаться коммита всех операций пользователя, поставленных ранее"""
+        futures = list(self._pending.get(user_id, []))
+        if futures:
+            await asyncio.gather(*futures, return_exceptions=True)
+
+    async def _run(self):
+        while True:
+            batch = [await self._queue.get()]
+            deadline = time.monotonic() + self.flush_seconds
+            while len(batch) < self.batch_size:
+                timeout = deadline - time.monotonic()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+
+            try:
+                await self._write(batch)
+            finally:
+                for _ in batch:
+                    self._queue.task_done()
+
+    @staticmethod
+    async def _apply(db, op: _Operation) -> Optional[bool]:
+        if op.kind == "review":
+            return await apply_review(db, op.word_id, op.user_id, op.result, op.created_at)
+        await apply_word_learned(db, op.word_id, op.user_id, op.created_at)
+        return None
+
+    async def _write(self, batch: List[_Operation]):
+        """Записать группу одной транзакцией; при ошибке - по одной операции"""
+        try:
+            async with get_db() as db:
+                results = [await self._apply(db, op) for op in batch]
+                await db.commit()
+        except Exception as e:
+            logger.warning(f"Group commit of {len(batch)} review ops failed, retrying one by one: {e}")
+            for op in batch:
+                try:
+                    async with get_db() as db:
+                        result = await self._apply(db, op)
+                        await db.commit()
+                except Exception as op_error:
+                    self.failures += 1
+                    logger.error(f"Review op {op.kind} for word {op.word_id} failed: {op_error}")
+                    if not op.future.done():
+                        op.future.set_exception(op_error)
+                else:
+                    if not op.future.done():
+                        op.future.set_result(result)
+        else:
+            for op, result in zip(batch, results):
+                if not op.future.done():
+                    op.future.set_result(result)
+
+        self.batches += 1
+        self.operations += len(batch)
+        self.max_batch = max(self.max_batch, len(batch))
+
+    def metrics(self) -> Dict[str, int]:
+        return {
+            "queue_size": self._queue.qsize(),
+            "pending_users": len(self._pending),
+            "batches": self.batches,
+            "operations": self.operations,
+            "failures": self.failures,
+            "max_batch": self.max_batch,
+        }
+
+
+writer = ReviewWriter(
+    flush_ms=settings.review_writer_flush_ms,
+    batch_size=settings.review_writer_batch_size,
+    queue_size=settings.review_writer_queue_size
+)
+
+
+async def enqueue_review(word_id: int, user_id: int, result: str) -> bool:
+    """
+    Записать оценку (групповым коммитом, если писатель запущен; ждёт коммита
+    группы, не дольше flush_ms). False - слово уже удалено, оценка не записана.
+    """
+    if writer.running:
+        future = await writer.submit("review", word_id, user_id, result)
+        try:
+            return await future
+        except Exception:
+            # Ошибку уже залогировал писатель; сессия повторения продолжается
+            return True
+    async with get_db() as db:
+        applied = await apply_review(db, word_id, user_id, result, datetime.now())
+        await db.commit()
+    return applied
+
+
+async def enqueue_word_learned(word_id: int, user_id: int):
+    """Отметить слово изученным (в фоне, если писатель запущен)"""
+    if writer.running:
+        await writer.submit("learned", word_id, user_id)
+    else:
+        async with get_db() as db:
+            await apply_word_learned(db, word_id, user_id, datetime.now())
+            await db.commit()
+
+
+async def wait_for_user_writes(user_id: int):
+    """Дождаться записи всех ранее поставленных операций пользователя"""
+    if writer.running:
+        await writer.wait_for_user(user_id)
@@ -0,0 +1,66 @@
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, Hashable
+
+
+class SingleFlight:
+    """
+    Объединение одновременных запросов с одинаковым ключом.
+    Первый вызов запускает задачу, остальные ждут её результат (или ошибку).
+    """
+
+    def __init__(self, max_waiters: int):
+        self.max_waiters = max_waiters
+        self._inflight: Dict[Hashable, asyncio.Task] = {}
+        self._waiters: Dict[Hashable, int] = {}
+
+        # Метрики
+        self.started = 0
+        self.coalesced = 0
+        self.rejected = 0
+
+    async def do(self, key: Hashable, fn: Callable[[], Awaitable[Any]]) -> Any:
+        """Выполнить fn() или присоединиться к уже идущему вызову с тем же ключом"""
+        task = self._inflight.get(key)
+
+        if task is None:
+            task = asyncio.ensure_future(fn())
+            self._inflight[key] = task
+            self._waiters[key] = 0
+            task.add_done_callback(lambda t: self._on_done(key, t))
+            self.started += 1
+        else:
+            if self._waiters[key] >= self.max_waiters:
+                self.rejected += 1
+                raise ValueError("Too many concurrent requests for the same term, try again later")
+            self.coalesced += 1
+
+        self._waiters[key] += 1
+        try:
+            # shield: отмена одного ожидающего не отменяет общий вызов
+            return await asyncio.shield(task)
+        finally:
+            if key in self._waiters and self._inflight.get(key) is task:
+                self._waiters[key] -= 1
+
+    def _on_done(self, key: Hashable, task: asyncio.Task):
+        if self._inflight.get(key) is task:
+            del self._inflight[key]
+            del self._waiters[key]
+        # Помечаем исключение как полученное, даже если все ожидающие отменились
+        if not task.cancelled():
+            task.exception()
+
+    def in_flight(self) -> int:
+        return len(self._inflight)
+
+    def running(self, key: Hashable) -> bool:
+        """Идёт ли сейчас вызов с этим ключом"""
+        return key in self._inflight
+
+    def metrics(self) -> Dict[str, int]:
+        return {
+            "in_flight": len(self._inflight),
+            "started": self.started,
+            "coalesced": self.coalesced,
+            "rejected": self.rejected,
+        }
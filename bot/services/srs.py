@@ -1,86 +1,162 @@
-from datetime import datetime, timedelta
-from typing import Optional
+from datetime import datetime, timedelta, date
+from typing import Optional, List
 import aiosqlite
 from bot.db.database import get_db
+from bot.services import reminders
 
 
 async def create_review(word_id: int, user_id: int):
     """Создать запись о повторении для нового слова"""
-    db = await get_db()
-    
     # Первое повторение через 1 день
     next_review = datetime.now() + timedelta(days=1)
     
-    try:
+    async with get_db() as db:
         await db.execute("""
-            INSERT INTO reviews (word_id, user_id, next_review_at, interval_days, ease)
+            INSERT OR IGNORE INTO reviews (word_id, user_id, next_review_at, interval_days, ease)
             VALUES (?, ?, ?, ?, ?)
         """, (word_id, user_id, next_review.isoformat(), 1.0, 2.5))
         await db.commit()
-    finally:
-        await db.close()
+    reminders.note_due(user_id, next_review)
+
+
+async def record_review_event(
+    db: aiosqlite.Connection,
+    word_id: int,
+    user_id: int,
+    result: str,
+    interval_days: float,
+    ease: float,
+    reviewed_at: datetime
+):
+    """
+    Записать повторение в журнал и обновить дневные счётчики.
+    Выполняется на соединении и в транзакции вызывающего кода.
+    """
+    await db.execute("""
+        INSERT INTO review_events (user_id, word_id, result, interval_days, ease, reviewed_at)
+        VALUES (?, ?, ?, ?, ?, ?)
+    """, (user_id, word_id, result, interval_days, ease, reviewed_at.isoformat()))
+    
+    today = reviewed_at.date()
+    yesterday = today - timedelta(days=1)
+    await db.execute("""
+        INSERT INTO review_daily (user_id, day, reviewed, know, hard, dontknow, streak)
+        VALUES (?, ?, 1, ?, ?, ?,
+            COALESCE((SELECT streak FROM review_daily WHERE user_id = ? AND day = ?), 0) + 1)
+        ON CONFLICT(user_id, day) DO UPDATE SET
+            reviewed = reviewed + 1,
+            know = know + excluded.know,
+            hard = hard + excluded.hard,
+            dontknow = dontknow + excluded.dontknow
+    """, (
+        user_id,
+        today.isoformat(),
+        int(result == "know"),
+        int(result == "hard"),
+        int(result == "dontknow"),
+        user_id,
+        yesterday.isoformat()
+    ))
+
+
+# Начальные значения для новой записи о повторении
+DEFAULT_INTERVAL = 1.0
+DEFAULT_EASE = 2.5
+
+
+def schedule(interval_days: float, ease: float, result: str) -> tuple[float, float]:
+    """
+    Новые (interval_days, ease) после оценки.
+    То же правило выполняется в SQL внутри apply_review (_SCHEDULE_SQL).
+    """
+    if result == "know":
+        new_ease = min(ease + 0.15, 2.5)  # Максимум 2.5
+        new_interval = interval_days * new_ease
+    elif result == "hard":
+        new_ease = max(ease - 0.15, 1.3)  # Минимум 1.3
+        new_interval = interval_days * 1.2
+    else:  # dontknow
+        new_ease = max(ease - 0.2, 1.3)
+        new_interval = 1.0  # Повторяем через день
+    
+    # Округляем до разумных значений
+    return round(new_interval, 1), new_ease
+
+
+# Правило schedule() для DO UPDATE: ease считается от старого значения reviews.ease,
+# поэтому в interval_days для "know" подставлено выражение нового ease
+_SCHEDULE_SQL = """
+    ease = CASE :result
+        WHEN 'know' THEN MIN(reviews.ease + 0.15, 2.5)
+        WHEN 'hard' THEN MAX(reviews.ease - 0.15, 1.3)
+        ELSE MAX(reviews.ease - 0.2, 1.3)
+    END,
+    interval_days = CASE :result
+        WHEN 'know' THEN py_round(reviews.interval_days * MIN(reviews.ease + 0.15, 2.5), 1)
+        WHEN 'hard' THEN py_round(reviews.interval_days * 1.2, 1)
+        ELSE 1.0
+    END,
+    next_review_at = strftime('%Y-%m-%dT%H:%M:%f', julianday(:now) + CASE :result
+        WHEN 'know' THEN py_round(reviews.interval_days * MIN(reviews.ease + 0.15, 2.5), 1)
+        WHEN 'hard' THEN py_round(reviews.interval_days * 1.2, 1)
+        ELSE 1.0
+    END),
+    last_result = :result
+"""
+
+
+async def apply_review(
+    db: aiosqlite.Connection,
+    word_id: int,
+    user_id: int,
+    result: str,
+    now: datetime
+) -> bool:
+    """
+    Применить оценку на соединении вызывающего кода (без commit).
+    Расписание пересчитывается одним UPSERT ... RETURNING: без предварительного
+    SELECT и без второго соединения, если записи о повторении ещё нет.
+    Строка для вставки берётся из words, поэтому для удалённого слова
+    (или чужого) ничего не пишется и возвращается False.
+    """
+    # Значения на случай, если записи нет: как будто она только что создана
+    insert_interval, insert_ease = schedule(DEFAULT_INTERVAL, DEFAULT_EASE, result)
+    
+    cursor = await db.execute(f"""
+        INSERT INTO reviews (word_id, user_id, next_review_at, interval_days, ease, last_result)
+        SELECT id, user_id, :insert_next, :insert_interval, :insert_ease, :result
+        FROM words
+        WHERE id = :word_id AND user_id = :user_id
+        ON CONFLICT(word_id) DO UPDATE SET {_SCHEDULE_SQL}
+        WHERE reviews.user_id = excluded.user_id
+        RETURNING interval_days, ease
+    """, {
+        "word_id": word_id,
+        "user_id": user_id,
+        "result": result,
+        "now": now.isoformat(),
+        "insert_next": (now + timedelta(days=insert_interval)).isoformat(),
+        "insert_interval": insert_interval,
+        "insert_ease": insert_ease
+    })
+    row = await cursor.fetchone()
+    if not row:
+        return False
+    
+    await record_review_event(db, word_id, user_id, result, row["interval_days"], row["ease"], now)
+    reminders.note_due(user_id, now + timedelta(days=row["interval_days"]), reviewed=True)
+    return True
 
 
 async def update_review(word_id: int, user_id: int, result: str):
     """
-    Обновить повторение после оценки.
+    Обновить повторение после оценки и сразу закоммитить.
     result: 'know' | 'hard' | 'dontknow'
+    Обработчики используют review_writer.enqueue_review (групповые коммиты).
     """
-    db = await get_db()
-    
-    try:
-        # Получаем текущие данные
-        cursor = await db.execute("""
-            SELECT interval_days, ease FROM reviews
-            WHERE word_id = ? AND user_id = ?
-        """, (word_id, user_id))
-        row = await cursor.fetchone()
-        
-        if not row:
-            # Если записи нет, создаём
-            await create_review(word_id, user_id)
-            cursor = await db.execute("""
-                SELECT interval_days, ease FROM reviews
-                WHERE word_id = ? AND user_id = ?
-            """, (word_id, user_id))
-            row = await cursor.fetchone()
-        
-        current_interval = row["interval_days"]
-        current_ease = row["ease"]
-        
-        # Обновляем ease и interval в зависимости от результата
-        if result == "know":
-            new_ease = min(current_ease + 0.15, 2.5)  # Максимум 2.5
-            new_interval = current_interval * new_ease
-        elif result == "hard":
-            new_ease = max(current_ease - 0.15, 1.3)  # Минимум 1.3
-            new_interval = current_interval * 1.2
-        else:  # dontknow
-            new_ease = max(current_ease - 0.2, 1.3)
-            new_interval = 1.0  # Повторяем через день
-        
-        # Округляем до разумных значений
-        new_interval = round(new_interval, 1)
-        
-        # Вычисляем следующее повторение
-        next_review = datetime.now() + timedelta(days=new_interval)
-        
-        # Обновляем запись
-        await db.execute("""
-            UPDATE reviews
-            SET next_review_at = ?, interval_days = ?, ease = ?, last_result = ?
-            WHERE word_id = ? AND user_id = ?
-        """, (
-            next_review.isoformat(),
-            new_interval,
-            new_ease,
-            result,
-            word_id,
-            user_id
-        ))
+    async with get_db() as db:
+        await apply_review(db, word_id, user_id, result, datetime.now())
         await db.commit()
-    finally:
-        await db.close()
 
 
 async def get_words_for_review(user_id: int, limit: int = 10) -> list:
@@ -88,14 +164,12 @@ async def get_words_for_review(user_id: int, limit: int = 10) -> list:
     Получить слова, готовые к повторению (next_review_at <= now)
     Возвращает список словарей с word_id и word данными
     """
-    db = await get_db()
-    
-    try:
+    async with get_db() as db:
         cursor = await db.execute("""
             SELECT w.*, r.id as review_id
             FROM words w
             INNER JOIN reviews r ON w.id = r.word_id
-            WHERE w.user_id = ? 
+            WHERE r.user_id = ? 
             AND (r.next_review_at IS NULL OR r.next_review_at <= ?)
             ORDER BY r.next_review_at ASC NULLS FIRST
             LIMIT ?
@@ -103,45 +177,56 @@ async def get_words_for_review(user_id: int, limit: int = 10) -> list:
         
         rows = await cursor.fetchall()
         return [dict(row) for row in rows]
-    finally:
-        await db.close()
 
 
 async def get_review_stats(user_id: int) -> dict:
-    """Получить статистику повторений"""
-    db = await get_db()
+    """Получить статистику повторений (один запрос, все части идут по индексам)"""
+    now = datetime.now()
+    today = now.date()
     
-    try:
-        # Всего слов
-        cursor = await db.execute("SELECT COUNT(*) as count FROM words WHERE user_id = ?", (user_id,))
-        total_words = (await cursor.fetchone())["count"]
-        
-        # Слов на повторение сегодня
-        cursor = await db.execute("""
-            SELECT COUNT(*) as count
-            FROM reviews r
-            INNER JOIN words w ON r.word_id = w.id
-            WHERE w.user_id = ? 
-            AND (r.next_review_at IS NULL OR r.next_review_at <= ?)
-        """, (user_id, datetime.now().isoformat()))
-        due_today = (await cursor.fetchone())["count"]
-        
-        # Повторов сегодня (слова, которые были повторены сегодня)
-        today_start = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
+    async with get_db() as db:
         cursor = await db.execute("""
-            SELECT COUNT(DISTINCT word_id) as count
-            FROM reviews
-            WHERE user_id = ?
-            AND last_result IS NOT NULL
-            AND datetime(next_review_at) >= ?
-        """, (user_id, today_start.isoformat()))
-        reviewed_today = (await cursor.fetchone())["count"]
+            SELECT
+                (SELECT COUNT(*) FROM words WHERE user_id = :user_id) AS total_words,
+                (SELECT COUNT(*) FROM reviews
+                    WHERE user_id = :user_id
+                    AND (next_review_at IS NULL OR next_review_at <= :now)) AS due_today,
+                (SELECT reviewed FROM review_daily
+                    WHERE user_id = :user_id AND day = :today) AS reviewed_today,
+                (SELECT MAX(streak) FROM review_daily
+                    WHERE user_id = :user_id AND day IN (:today, :yesterday)) AS streak
+        """, {
+            "user_id": user_id,
+            "now": now.isoformat(),
+            "today": today.isoformat(),
+            "yesterday": (today - timedelta(days=1)).isoformat()
+        })
+        row = await cursor.fetchone()
         
         return {
-            "total_words": total_words,
-            "due_today": due_today,
-            "reviewed_today": reviewed_today
+            "total_words": row["total_words"],
+            "due_today": row["due_today"],
+            "reviewed_today": row["reviewed_today"] or 0,
+            "streak": row["streak"] or 0
         }
-    finally:
-        await db.close()
 
+
+async def get_review_history(user_id: int, days: int = 30) -> List[dict]:
+    """Повторения по дням за последние days дней (дни без повторений - нули)"""
+    today = date.today()
+    first_day = today - timedelta(days=days - 1)
+    
+    async with get_db() as db:
+        cursor = await db.execute("""
+            SELECT day, reviewed, know, hard, dontknow
+            FROM review_daily
+            WHERE user_id = ? AND day >= ?
+            ORDER BY day
+        """, (user_id, first_day.isoformat()))
+        rows = {row["day"]: dict(row) for row in await cursor.fetchall()}
+    
+    history = []
+    for i in range(days):
+        day = (first_day + timedelta(days=i)).isoformat()
+        history.append(rows.get(day, {"day": day, "reviewed": 0, "know": 0, "hard": 0, "dontknow": 0}))
+    return history
@@ -0,0 +1,387 @@
+"""
+Пакетный пересчёт расписания повторений: "отметить всё изученным",
+смена параметров интервалов, сдвиг очереди после простоя.
+
+Записи reviews читаются кусками по id в массивы NumPy, пересчитываются
+векторно и пишутся обратно через executemany, одна транзакция на кусок.
+Без NumPy те же правила применяются построчно (медленнее, но результат тот же).
+
+    await srs_batch.mark_learned(user_id=42)
+    await srs_batch.shift_due(timedelta(days=2))
+"""
+import logging
+import time
+from abc import ABC, abstractmethod
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Tuple
+from bot.config import settings
+from bot.db.database import get_db
+from bot.services import reminders
+from bot.services.srs import DEFAULT_EASE, DEFAULT_INTERVAL, schedule
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+logger = logging.getLogger(__name__)
+
+# Как в apply_word_learned
+LEARNED_INTERVAL = 365.0
+LEARNED_EASE = 2.5
+
+# Не больше стольких word_id в одном IN (...): лимит параметров SQLite
+MAX_SQL_VARIABLES = 500
+
+MICROSECONDS_PER_DAY = 86_400_000_000
+
+_stats = {
+    "runs": 0,
+    "rows": 0,
+    "chunks": 0,
+    "seconds": 0.0,
+}
+
+
+@dataclass
+class ReviewBatch:
+    """
+    Кусок таблицы reviews. С NumPy interval/ease - float64, due - datetime64[us]
+    (NULL -> NaT); без NumPy - списки, due - datetime или None.
+    last_result всегда список строк.
+    """
+    ids: Any
+    word_ids: Any
+    user_ids: Any
+    interval: Any
+    ease: Any
+    due: Any
+    last_result: List[Optional[str]]
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+
+def _round1(values):
+    """
+    round(x, 1) как в Python. np.round умножает на 10 и на точных половинках
+    ошибается (598.15 хранится как 598.1499..., round() даёт 598.1, np.round - 598.2),
+    такие значения досчитываются через round().
+    """
+    rounded = np.round(values, 1)
+    scaled = values * 10
+    ties = np.nonzero(np.abs(scaled - np.trunc(scaled)) == 0.5)[0]
+    if ties.size:
+        rounded[ties] = [round(value, 1) for value in values[ties].tolist()]
+    return rounded
+
+
+def _days(days):
+    """Дни (float64) -> timedelta64[us]"""
+    return np.rint(days * MICROSECONDS_PER_DAY).astype("timedelta64[us]")
+
+
+class Transform(ABC):
+    """
+    Правило пересчёта. vectorized() меняет массивы ReviewBatch на месте,
+    row() - то же для одной записи: (interval, ease, due, last_result) -> новые значения.
+    """
+
+    # Оценка, которую правило записывает в журнал повторений (review_events,
+    # review_daily) как обычный ответ пользователя; None - не повторение
+    review_result: Optional[str] = None
+
+    @abstractmethod
+    def vectorized(self, batch: ReviewBatch, now: datetime):
+        ...
+
+    @abstractmethod
+    def row(self, interval: float, ease: float, due: Optional[datetime], last_result: Optional[str], now: datetime) -> tuple:
+        ...
+
+    def apply(self, batch: ReviewBatch, now: datetime):
+        if np is not None:
+            self.vectorized(batch, now)
+            return
+        rows = [
+            self.row(interval, ease, due, last_result, now)
+            for interval, ease, due, last_result in zip(batch.interval, batch.ease, batch.due, batch.last_result)
+        ]
+        batch.interval, batch.ease, batch.due, batch.last_result = (list(column) for column in zip(*rows))
+
+
+class Grade(Transform):
+    """
+    Оценка know/hard/dontknow для всех записей, как srs.schedule().
+    Каждая запись считается повторением: попадает в review_events и review_daily,
+    как оценка через бота, поэтому /stats и /history совпадают с расписанием.
+    """
+
+    def __init__(self, result: str):
+        if result not in ("know", "hard", "dontknow"):
+            raise ValueError(f"Unknown review result: {result}")
+        self.review_result = result
+
+    def vectorized(self, batch: ReviewBatch, now: datetime):
+        if self.review_result == "know":
+            batch.ease = np.minimum(batch.ease + 0.15, 2.5)
+            interval = batch.interval * batch.ease
+        elif self.review_result == "hard":
+            batch.ease = np.maximum(batch.ease - 0.15, 1.3)
+            interval = batch.interval * 1.2
+        else:
+            batch.ease = np.maximum(batch.ease - 0.2, 1.3)
+            interval = np.full_like(batch.interval, 1.0)
+        batch.interval = _round1(interval)
+        batch.due = np.datetime64(now, "us") + _days(batch.interval)
+        batch.last_result = [self.review_result] * len(batch)
+
+    def row(self, interval, ease, due, last_result, now):
+        interval, ease = schedule(interval, ease, self.review_result)
+        return interval, ease, now + timedelta(days=interval), self.review_result
+
+
+class Learned(Transform):
+    """Слово изучено: следующее повторение через год, как apply_word_learned"""
+
+    def vectorized(self, batch: ReviewBatch, now: datetime):
+        batch.interval = np.full_like(batch.interval, LEARNED_INTERVAL)
+        batch.ease = np.full_like(batch.ease, LEARNED_EASE)
+        batch.due = np.full(len(batch), np.datetime64(now + timedelta(days=LEARNED_INTERVAL), "us"))
+        batch.last_result = ["know"] * len(batch)
+
+    def row(self, interval, ease, due, last_result, now):
+        return LEARNED_INTERVAL, LEARNED_EASE, now + timedelta(days=LEARNED_INTERVAL), "know"
+
+
+class RescaleIntervals(Transform):
+    """
+    Умножить интервалы на factor (смена параметров алгоритма). Дата повторения
+    пересчитывается от прошлого повторения (due - старый интервал).
+    """
+
+    def __init__(self, factor: float):
+        if factor <= 0:
+            raise ValueError("factor must be positive")
+        self.factor = factor
+
+    def vectorized(self, batch: ReviewBatch, now: datetime):
+        interval = np.maximum(_round1(batch.interval * self.factor), DEFAULT_INTERVAL)
+        # NaT остаётся NaT: записи без даты и так к повторению
+        batch.due = batch.due + _days(interval - batch.interval)
+        batch.interval = interval
+
+    def row(self, interval, ease, due, last_result, now):
+        new_interval = max(round(interval * self.factor, 1), DEFAULT_INTERVAL)
+        if due is not None:
+            due = due + timedelta(days=new_interval - interval)
+        return new_interval, ease, due, last_result
+
+
+class ShiftDue(Transform):
+    """Сдвинуть даты повторения на delta (например, на длительность простоя)"""
+
+    def __init__(self, delta: timedelta):
+        self.delta = delta
+
+    def vectorized(self, batch: ReviewBatch, now: datetime):
+        batch.due = batch.due + np.timedelta64(self.delta, "us")
+
+    def row(self, interval, ease, due, last_result, now):
+        return interval, ease, (due + self.delta if due is not None else None), last_result
+
+
+def _to_batch(rows: Sequence) -> ReviewBatch:
+    """Строки (id, word_id, user_id, interval_days, ease, next_review_at, last_result)"""
+    ids, word_ids, user_ids, interval, ease, due, last_result = (list(column) for column in zip(*rows))
+    if np is None:
+        return ReviewBatch(
+            ids=ids,
+            word_ids=word_ids,
+            user_ids=user_ids,
+            interval=[DEFAULT_INTERVAL if value is None else value for value in interval],
+            ease=[DEFAULT_EASE if value is None else value for value in ease],
+            due=[datetime.fromisoformat(value) if value else None for value in due],
+            last_result=last_result
+        )
+    # None -> nan/NaT при построении массивов
+    interval = np.array(interval, dtype=np.float64)
+    ease = np.array(ease, dtype=np.float64)
+    interval[np.isnan(interval)] = DEFAULT_INTERVAL
+    ease[np.isnan(ease)] = DEFAULT_EASE
+    return ReviewBatch(
+        ids=ids,
+        word_ids=word_ids,
+        user_ids=user_ids,
+        interval=interval,
+        ease=ease,
+        due=np.array([value or None for value in due], dtype="datetime64[us]"),
+        last_result=last_result
+    )
+
+
+def _to_params(batch: ReviewBatch) -> List[tuple]:
+    """
+    Параметры UPDATE. Даты форматируются через datetime.isoformat(), как в
+    create_review: np.datetime_as_string всегда пишет микросекунды, а isoformat()
+    опускает нулевые, и строки в SQLite сравнивались бы по-разному.
+    """
+    if np is None:
+        due = [value.isoformat() if value is not None else None for value in batch.due]
+        return list(zip(batch.interval, batch.ease, due, batch.last_result, batch.ids))
+    # datetime64[us] -> datetime, NaT -> None
+    due = [value.isoformat() if value is not None else None for value in batch.due.astype(object).tolist()]
+    return list(zip(batch.interval.tolist(), batch.ease.tolist(), due, batch.last_result, batch.ids))
+
+
+async def _record_events(db, batch: ReviewBatch, result: str, now: datetime):
+    """
+    Журнал повторений для куска: как srs.record_review_event для каждой записи,
+    но одним executemany и одним UPSERT дневного счётчика на пользователя.
+    """
+    interval = batch.interval.tolist() if np is not None else batch.interval
+    ease = batch.ease.tolist() if np is not None else batch.ease
+    reviewed_at = now.isoformat()
+    await db.executemany("""
+        INSERT INTO review_events (user_id, word_id, result, interval_days, ease, reviewed_at)
+        VALUES (?, ?, ?, ?, ?, ?)
+    """, [
+        (user_id, word_id, result, word_interval, word_ease, reviewed_at)
+        for user_id, word_id, word_interval, word_ease in zip(batch.user_ids, batch.word_ids, interval, ease)
+    ])
+
+    per_user: Dict[int, int] = {}
+    for user_id in batch.user_ids:
+        per_user[user_id] = per_user.get(user_id, 0) + 1
+    today = now.date()
+    yesterday = today - timedelta(days=1)
+    await db.executemany("""
+        INSERT INTO review_daily (user_id, day, reviewed, know, hard, dontknow, streak)
+        VALUES (?, ?, ?, ?, ?, ?,
+            COALESCE((SELECT streak FROM review_daily WHERE user_id = ? AND day = ?), 0) + 1)
+        ON CONFLICT(user_id, day) DO UPDATE SET
+            reviewed = reviewed + excluded.reviewed,
+            know = know + excluded.know,
+            hard = hard + excluded.hard,
+            dontknow = dontknow + excluded.dontknow
+    """, [
+        (
+            user_id,
+            today.isoformat(),
+            count,
+            count if result == "know" else 0,
+            count if result == "hard" else 0,
+            count if result == "dontknow" else 0,
+            user_id,
+            yesterday.isoformat()
+        )
+        for user_id, count in per_user.items()
+    ])
+
+
+def _filters(user_id: Optional[int], word_ids: Optional[Sequence[int]]) -> Iterator[Tuple[str, list]]:
+    """Условия WHERE и параметры; длинный список word_ids делится на части"""
+    user_sql, user_params = ("AND user_id = ?", [user_id]) if user_id is not None else ("", [])
+    if word_ids is None:
+        yield user_sql, user_params
+        return
+    word_ids = list(word_ids)
+    for i in range(0, len(word_ids), MAX_SQL_VARIABLES):
+        part = word_ids[i:i + MAX_SQL_VARIABLES]
+        yield f"{user_sql} AND word_id IN ({','.join('?' * len(part))})", user_params + part
+
+
+async def run_transform(
+    transform: Transform,
+    user_id: Optional[int] = None,
+    word_ids: Optional[Sequence[int]] = None,
+    chunk_size: Optional[int] = None,
+    now: Optional[datetime] = None
+) -> int:
+    """
+    Применить transform к записям пользователя user_id (или всем) и,
+    если задано, только к word_ids. Возвращает число обновлённых записей.
+    """
+    now = now or datetime.now()
+    chunk_size = max(1, chunk_size or settings.srs_batch_chunk_size)
+    started = time.perf_counter()
+    updated = 0
+
+    for filter_sql, params in _filters(user_id, word_ids):
+        after = 0
+        while True:
+            async with get_db() as db:
+                # Чтение и запись куска - одна транзакция записи: оценка,
+                # записанная между SELECT и UPDATE, не будет затёрта
+                await db.execute("BEGIN IMMEDIATE")
+                cursor = await db.execute(f"""
+                    SELECT id, word_id, user_id, interval_days, ease, next_review_at, last_result
+                    FROM reviews
+                    WHERE id > ? {filter_sql}
+                    ORDER BY id
+                    LIMIT ?
+                """, (after, *params, chunk_size))
+                rows = await cursor.fetchall()
+                if rows:
+                    batch = _to_batch(rows)
+                    transform.apply(batch, now)
+                    await db.executemany("""
+                        UPDATE reviews
+                        SET interval_days = ?, ease = ?, next_review_at = ?, last_result = ?
+                        WHERE id = ?
+                    """, _to_params(batch))
+                    if transform.review_result is not None:
+                        await _record_events(db, batch, transform.review_result, now)
+                await db.commit()
+
+            if not rows:
+                break
+            updated += len(rows)
+            _stats["chunks"] += 1
+            after = rows[-1]["id"]
+            if len(rows) < chunk_size:
+                break
+
+    # Даты могли сдвинуться раньше известных планировщику напоминаний
+    if updated and reminders.reminder_scheduler.running:
+        await reminders.reminder_scheduler.rebuild()
+
+    elapsed = time.perf_counter() - started
+    _stats["runs"] += 1
+    _stats["rows"] += updated
+    _stats["seconds"] += elapsed
+    logger.info(
+        f"SRS batch {type(transform).__name__}: {updated} reviews in {elapsed:.2f}s "
+        f"({'numpy' if np is not None else 'per-row'})"
+    )
+    return updated
+
+
+async def reschedule(result: str, user_id: Optional[int] = None, word_ids: Optional[Sequence[int]] = None) -> int:
+    """Применить оценку know/hard/dontknow ко всем выбранным записям"""
+    return await run_transform(Grade(result), user_id, word_ids)
+
+
+async def mark_learned(user_id: Optional[int] = None, word_ids: Optional[Sequence[int]] = None) -> int:
+    """Отметить выбранные слова изученными"""
+    return await run_transform(Learned(), user_id, word_ids)
+
+
+async def rescale_intervals(factor: float, user_id: Optional[int] = None) -> int:
+    """Умножить интервалы на factor и пересчитать даты повторения"""
+    return await run_transform(RescaleIntervals(factor), user_id)
+
+
+async def shift_due(delta: timedelta, user_id: Optional[int] = None) -> int:
+    """Сдвинуть все даты повторения на delta"""
+    return await run_transform(ShiftDue(delta), user_id)
+
+
+def get_batch_stats() -> Dict[str, Any]:
+    seconds = _stats["seconds"]
+    return {
+        **_stats,
+        "rows_per_second": _stats["rows"] / seconds if seconds else 0.0,
+        "numpy": np is not None,
+    }
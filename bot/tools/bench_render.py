@@ -0,0 +1,88 @@
+"""
+Микро-бенчмарк отрисовки карточек: стоимость одной отрисовки без кэша
+и из кэша для каждого вида.
+
+    python -m bot.tools.bench_render --cards 2000 --repeat 5
+"""
+import argparse
+import json
+import time
+from bot.db.models import Word
+from bot.services import render
+
+
+def make_words(count: int) -> list:
+    """Синтетические слова, похожие на сгенерированные карточки"""
+    return [
+        Word(
+            id=i,
+            user_id=1,
+            term=f"word{i}",
+            pos="adjective",
+            ipa="/ɪmˈbærəst/",
+            reading_ru="им-БЭ-рэст",
+            translations_ru=["смущённый", "сконфуженный", "растерянный"],
+            definition_en="Feeling ashamed or shy in front of other people.",
+            examples=[
+                {"en": "She felt embarrassed about her mistake.", "ru": "Ей было неловко из-за ошибки."},
+                {"en": "Don't be embarrassed to ask.", "ru": "Не стесняйся спросить."},
+            ],
+            frequency=2,
+            version=1
+        )
+        for i in range(count)
+    ]
+
+
+def as_row(word: Word) -> dict:
+    """Слово в виде строки БД: JSON-поля ещё строками (как в сессии до разбора)"""
+    return {
+        "id": word.id,
+        "term": word.term,
+        "pos": word.pos,
+        "ipa": word.ipa,
+        "reading_ru": word.reading_ru,
+        "translations_ru": json.dumps(word.translations_ru, ensure_ascii=False),
+        "definition_en": word.definition_en,
+        "examples": json.dumps(word.examples, ensure_ascii=False),
+        "version": word.version,
+    }
+
+
+def bench(label: str, fn, cards: list, repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        started = time.perf_counter()
+        for card in cards:
+            fn(card)
+        best = min(best, time.perf_counter() - started)
+    per_render = best / len(cards) * 1e6
+    print(f"{label:<32} {per_render:8.2f} µs/render")
+    return per_render
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Бенчмарк отрисовки карточек")
+    parser.add_argument("--cards", type=int, default=2000)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    words = make_words(args.cards)
+    rows = [as_row(word) for word in words]
+
+    for view in render.VIEWS:
+        print(f"[{view}]")
+        cold = bench("  no cache", lambda card: render._render(card, view), words, args.repeat)
+        bench("  no cache, JSON strings", lambda card: render._render(card, view), rows, args.repeat)
+
+        render._rendered.clear()
+        for word in words:
+            render.render_card(word, view)
+        warm = bench("  cached", lambda card: render.render_card(card, view), words, args.repeat)
+        print(f"  speedup x{cold / warm:.1f}")
+
+    print(render.get_render_stats())
+
+
+if __name__ == "__main__":
+    main()
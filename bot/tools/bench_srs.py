@@ -0,0 +1,125 @@
+"""
+Бенчмарк пакетного пересчёта расписания (bot.services.srs_batch):
+строк в секунду для вычислений в памяти и для полного прохода по
+таблице reviews во временной БД, в сравнении с построчным update_review.
+
+    python -m bot.tools.bench_srs --rows 200000 --users 1000
+"""
+import argparse
+import asyncio
+import os
+import random
+import tempfile
+import time
+from datetime import datetime, timedelta
+from bot.config import settings
+from bot.services import srs_batch
+
+
+def make_rows(count: int, users: int, seed: int) -> list:
+    """Синтетические записи reviews: (id, word_id, user_id, interval, ease, due, last_result)"""
+    rng = random.Random(seed)
+    now = datetime.now()
+    rows = []
+    for i in range(1, count + 1):
+        interval = round(rng.choice((1.0, 1.2, 2.5, 6.3, 15.8, 39.4)) * rng.uniform(0.9, 1.1), 1)
+        due = now + timedelta(days=rng.uniform(-5, interval))
+        rows.append((i, i, i % users, interval, rng.choice((1.3, 1.7, 2.2, 2.5)), due.isoformat(), "know"))
+    return rows
+
+
+def bench_compute(rows: list, repeat: int):
+    """Только пересчёт в памяти: векторно (если есть NumPy) и построчно"""
+    now = datetime.now()
+    transform = srs_batch.Grade("know")
+    columns = rows
+
+    def per_row():
+        params = []
+        for review_id, _, _, interval, ease, due, last_result in columns:
+            interval, ease, due, last_result = transform.row(interval, ease, datetime.fromisoformat(due), last_result, now)
+            params.append((interval, ease, due.isoformat(), last_result, review_id))
+
+    def vectorized():
+        batch = srs_batch._to_batch(columns)
+        transform.apply(batch, now)
+        srs_batch._to_params(batch)
+
+    for label, fn in (("per-row schedule()", per_row), ("batch (load+apply+params)", vectorized)):
+        best = float("inf")
+        for _ in range(repeat):
+            started = time.perf_counter()
+            fn()
+            best = min(best, time.perf_counter() - started)
+        print(f"{label:<32} {len(rows) / best:12,.0f} rows/s")
+
+
+async def bench_db(rows: list, baseline: int):
+    from bot.db.database import init_db, open_pool, close_pool, get_db
+    from bot.services.srs import update_review
+
+    await open_pool()
+    try:
+        await init_db()
+        async with get_db() as db:
+            # apply_review пишет оценку только для существующего слова
+            await db.executemany(
+                "INSERT INTO words (id, user_id, term) VALUES (?, ?, ?)",
+                [(row[1], row[2], f"word{row[1]}") for row in rows]
+            )
+            await db.executemany("""
+                INSERT INTO reviews (id, word_id, user_id, interval_days, ease, next_review_at, last_result)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+            """, rows)
+            await db.commit()
+
+        transforms = (
+            ("grade know", srs_batch.Grade("know")),
+            ("mark learned", srs_batch.Learned()),
+            ("rescale x0.8", srs_batch.RescaleIntervals(0.8)),
+            ("shift +2 days", srs_batch.ShiftDue(timedelta(days=2))),
+        )
+        for label, transform in transforms:
+            started = time.perf_counter()
+            updated = await srs_batch.run_transform(transform)
+            elapsed = time.perf_counter() - started
+            print(f"{label:<32} {updated / elapsed:12,.0f} rows/s  ({updated} rows, {elapsed:.2f}s)")
+
+        # Для сравнения: то же через update_review, по коммиту на строку
+        sample = rows[:baseline]
+        started = time.perf_counter()
+        for row in sample:
+            await update_review(row[1], row[2], "know")
+        elapsed = time.perf_counter() - started
+        print(f"{'update_review per row':<32} {len(sample) / elapsed:12,.0f} rows/s  ({len(sample)} rows, {elapsed:.2f}s)")
+    finally:
+        await close_pool()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Бенчмарк пакетного пересчёта расписания")
+    parser.add_argument("--rows", type=int, default=200000)
+    parser.add_argument("--users", type=int, default=1000)
+    parser.add_argument("--chunk", type=int, default=settings.srs_batch_chunk_size, help="записей в транзакции")
+    parser.add_argument("--baseline", type=int, default=2000, help="строк для построчного update_review")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    print(f"NumPy: {'yes' if srs_batch.np is not None else 'no (per-row fallback)'}, rows: {args.rows}, chunk: {args.chunk}")
+    rows = make_rows(args.rows, args.users, args.seed)
+
+    print("[compute]")
+    bench_compute(rows, args.repeat)
+
+    print("[database]")
+    settings.srs_batch_chunk_size = args.chunk
+    with tempfile.TemporaryDirectory(prefix="flipcard-srs-") as tmp_dir:
+        settings.database_path = os.path.join(tmp_dir, "bench.db")
+        asyncio.run(bench_db(rows, args.baseline))
+
+    print(srs_batch.get_batch_stats())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,450 @@
+"""
+Нагрузочный прогон бота целиком: синтетические пользователи добавляют слова
+и проходят /review через настоящие роутеры из bot/handlers. Telegram
+заменён фейковой сессией Bot, OpenAI - локальным mock (bot.tools.mock_openai),
+БД - временный файл SQLite.
+
+    python -m bot.tools.load_test --users 1000 --words 5 --concurrency 200
+    python -m bot.tools.load_test --users 200 --openai-latency 1.5 --telegram-latency 0.05
+
+Выводит p50/p95/p99 времени обработки обновлений по видам, время в БД,
+пропускную способность и пиковый RSS. Результаты дописываются в
+benchmarks/results.jsonl вместе с коммитом и сравниваются с прошлым
+прогоном с теми же параметрами.
+"""
+import argparse
+import asyncio
+import datetime
+import itertools
+import json
+import logging
+import os
+import random
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from collections import defaultdict
+from typing import Any, Dict, List, Optional, Tuple
+from aiogram import Bot
+from aiogram.client.default import DefaultBotProperties
+from aiogram.client.session.base import BaseSession
+from aiogram.enums import ParseMode
+from aiogram.methods import TelegramMethod
+from aiogram.types import CallbackQuery, Chat, InlineKeyboardMarkup, Message, Update, User
+from bot.config import settings
+
+logger = logging.getLogger(__name__)
+
+BOT_USER = {"id": 1, "is_bot": True, "first_name": "FlipCardBot"}
+
+# Метрики, которые сравниваются с прошлым прогоном (больше - хуже, кроме throughput)
+COMPARED_METRICS = ("p50_ms", "p95_ms", "p99_ms", "throughput", "db_ms_per_update")
+
+
+class FakeTelegramSession(BaseSession):
+    """
+    Сессия Bot без сети: отвечает на методы Bot API правдоподобными
+    объектами и запоминает последнюю inline-клавиатуру в каждом чате,
+    чтобы синтетический пользователь мог "нажать" кнопку.
+    """
+
+    def __init__(self, latency: float = 0.0):
+        super().__init__()
+        self.latency = latency
+        self.calls: Dict[str, int] = defaultdict(int)
+        # chat_id -> (message_id, клавиатура)
+        self.keyboards: Dict[int, Tuple[int, InlineKeyboardMarkup]] = {}
+        self._message_ids = itertools.count(1)
+
+    async def make_request(self, bot: Bot, method: TelegramMethod, timeout: Optional[int] = None) -> Any:
+        name = type(method).__name__
+        self.calls[name] += 1
+        if self.latency:
+            await asyncio.sleep(self.latency)
+
+        chat_id = getattr(method, "chat_id", None)
+        if name.startswith("Send") or name.startswith("Edit"):
+            message_id = getattr(method, "message_id", None) or next(self._message_ids)
+            markup = getattr(method, "reply_markup", None)
+            if isinstance(markup, InlineKeyboardMarkup):
+                self.keyboards[chat_id] = (message_id, markup)
+            elif name.startswith("Edit") and self.keyboards.get(chat_id, (None,))[0] == message_id:
+                # Сообщение с клавиатурой отредактировано без неё
+                del self.keyboards[chat_id]
+            return Message.model_validate({
+                "message_id": message_id,
+                "date": datetime.datetime.now(),
+                "chat": {"id": chat_id, "type": "private"},
+                "from": BOT_USER,
+                "text": getattr(method, "text", None) or getattr(method, "caption", None),
+            }, context={"bot": bot})
+        return True
+
+    async def close(self):
+        pass
+
+    async def stream_content(self, *args, **kwargs):
+        yield b""
+
+
+class LatencyRecorder:
+    """Время обработки обновлений по видам и ошибки"""
+
+    def __init__(self):
+        self.samples: Dict[str, List[float]] = defaultdict(list)
+        self.errors = 0
+
+    def add(self, kind: str, seconds: float):
+        self.samples[kind].append(seconds)
+
+    @staticmethod
+    def percentiles(samples: List[float]) -> Dict[str, float]:
+        ordered = sorted(samples)
+
+        def pick(q: float) -> float:
+            return round(ordered[min(len(ordered) - 1, int(q * len(ordered)))] * 1000, 2)
+
+        return {"count": len(ordered), "p50_ms": pick(0.50), "p95_ms": pick(0.95), "p99_ms": pick(0.99)}
+
+    def summary(self) -> Dict[str, Any]:
+        result = {kind: self.percentiles(samples) for kind, samples in sorted(self.samples.items())}
+        every = [sample for samples in self.samples.values() for sample in samples]
+        if every:
+            result["all"] = self.percentiles(every)
+        return result
+
+
+class SyntheticUser:
+    """Пользователь бота: отправляет слова, добавляет их и проходит повторение"""
+
+    _update_ids = itertools.count(1)
+    _message_ids = itertools.count(10 ** 9)
+
+    def __init__(self, user_id: int, dp, bot: Bot, session: FakeTelegramSession, recorder: LatencyRecorder, rng: random.Random):
+        self.user = User(id=user_id, is_bot=False, first_name=f"user{user_id}")
+        self.chat = Chat(id=user_id, type="private")
+        self.dp = dp
+        self.bot = bot
+        self.session = session
+        self.recorder = recorder
+        self.rng = rng
+
+    def _message(self, text: str) -> Update:
+        return Update(update_id=next(self._update_ids), message=Message(
+            message_id=next(self._message_ids),
+            date=datetime.datetime.now(),
+            chat=self.chat,
+            from_user=self.user,
+            text=text
+        ))
+
+    def _callback(self, message_id: int, data: str) -> Update:
+        message = Message(
+            message_id=message_id,
+            date=datetime.datetime.now(),
+            chat=self.chat,
+            from_user=User(**BOT_USER),
+            text="..."
+        )
+        return Update(update_id=next(self._update_ids), callback_query=CallbackQuery(
+            id=str(next(self._update_ids)),
+            from_user=self.user,
+            chat_instance=str(self.chat.id),
+            message=message,
+            data=data
+        ))
+
+    async def _feed(self, kind: str, update: Update):
+        started = time.perf_counter()
+        try:
+            await self.dp.feed_update(self.bot, update)
+        except Exception as e:
+            self.recorder.errors += 1
+            logger.debug(f"Handler error ({kind}): {e}")
+        self.recorder.add(kind, time.perf_counter() - started)
+
+    def _buttons(self) -> Tuple[Optional[int], List[str]]:
+        keyboard = self.session.keyboards.get(self.chat.id)
+        if keyboard is None:
+            return None, []
+        message_id, markup = keyboard
+        return message_id, [button.callback_data for row in markup.inline_keyboard for button in row if button.callback_data]
+
+    async def add_words(self, terms: List[str]):
+        await self._feed("start", self._message("/start"))
+        for term in terms:
+            await self._feed("word_lookup", self._message(term))
+            message_id, buttons = self._buttons()
+            if "word_add" in buttons:
+                await self._feed("word_add", self._callback(message_id, "word_add"))
+
+    async def review(self, max_steps: int = 50):
+        await self._feed("review_start", self._message("/review"))
+        for _ in range(max_steps):
+            message_id, buttons = self._buttons()
+            if "review_reveal" in buttons:
+                await self._feed("review_reveal", self._callback(message_id, "review_reveal"))
+            elif "review_know" in buttons:
+                choice = self.rng.choice(["review_know", "review_know", "review_hard", "review_dontknow"])
+                await self._feed("review_rate", self._callback(message_id, choice))
+            elif any(button.startswith("quiz_") for button in buttons):
+                choice = self.rng.choice([button for button in buttons if button.startswith("quiz_")])
+                await self._feed("quiz_answer", self._callback(message_id, choice))
+            else:
+                return
+
+
+def make_vocabulary(size: int) -> List[str]:
+    return [f"word{i}" for i in range(size)]
+
+
+def pick_terms(vocabulary: List[str], count: int, rng: random.Random) -> List[str]:
+    """Частые слова выбираются чаще (распределение, близкое к Ципфу)"""
+    weights = [1 / (rank + 1) for rank in range(len(vocabulary))]
+    terms = []
+    while len(terms) < min(count, len(vocabulary)):
+        term = rng.choices(vocabulary, weights)[0]
+        if term not in terms:
+            terms.append(term)
+    return terms
+
+
+def peak_rss_mb() -> float:
+    # ru_maxrss: килобайты в Linux, байты в macOS
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return round(rss / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+
+def git_revision() -> Dict[str, Any]:
+    """Коммит, на котором сделан прогон (dirty - есть незакоммиченные изменения)"""
+    repo = os.path.dirname(os.path.abspath(__file__))
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=repo, capture_output=True, text=True, check=True
+        ).stdout.strip()
+        dirty = bool(subprocess.run(
+            ["git", "status", "--porcelain", "--untracked-files=no"], cwd=repo, capture_output=True, text=True
+        ).stdout.strip())
+    except (OSError, subprocess.CalledProcessError):
+        return {"commit": None, "dirty": None}
+    return {"commit": commit, "dirty": dirty}
+
+
+async def run_phase(name: str, users: List[SyntheticUser], action, concurrency: int) -> Dict[str, Any]:
+    """Выполнить action(user) для всех пользователей, не больше concurrency одновременно"""
+    from bot.db.database import get_pool_metrics
+
+    recorder = users[0].recorder
+    recorder.samples.clear()
+    recorder.errors = 0
+    pool_before = get_pool_metrics()
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def run_user(user: SyntheticUser):
+        async with semaphore:
+            await action(user)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(run_user(user) for user in users))
+    elapsed = time.perf_counter() - started
+
+    pool_after = get_pool_metrics()
+    db_ms = (
+        pool_after["checkout_avg_ms"] * pool_after["checkouts"]
+        - pool_before["checkout_avg_ms"] * pool_before["checkouts"]
+    )
+    latency = recorder.summary()
+    updates = latency.get("all", {}).get("count", 0)
+    result = {
+        "updates": updates,
+        "errors": recorder.errors,
+        "elapsed_s": round(elapsed, 2),
+        "throughput": round(updates / elapsed, 1) if elapsed else 0.0,
+        "db_ms_total": round(db_ms, 1),
+        "db_ms_per_update": round(db_ms / updates, 3) if updates else 0.0,
+        "db_checkouts": pool_after["checkouts"] - pool_before["checkouts"],
+        "latency": latency,
+    }
+    logger.info(
+        f"[{name}] {updates} updates in {elapsed:.1f}s ({result['throughput']} upd/s), "
+        f"errors {recorder.errors}, DB {result['db_ms_per_update']} ms/update"
+    )
+    for kind, stats in latency.items():
+        logger.info(f"[{name}]   {kind:<14} n={stats['count']:<6} p50={stats['p50_ms']}ms p95={stats['p95_ms']}ms p99={stats['p99_ms']}ms")
+    return result
+
+
+async def run(args: argparse.Namespace) -> Dict[str, Any]:
+    from bot.tools.mock_openai import MockOpenAI, start_mock_server
+
+    mock = MockOpenAI(args.openai_latency, args.openai_jitter)
+    mock_runner, settings.openai_base_url = await start_mock_server(mock)
+    # Модули бота читают настройки при импорте, поэтому импортируются после их изменения
+    from bot.db.database import init_db, open_pool, close_pool
+    from bot.db.fsm_storage import SQLiteStorage
+    from bot.main import create_dispatcher
+    from bot.services.ai_scheduler import scheduler
+    from bot.services.review_writer import writer as review_writer
+
+    await open_pool()
+    try:
+        await init_db()
+        review_writer.start()
+        storage = SQLiteStorage(
+            ttl_seconds=settings.fsm_state_ttl_seconds,
+            max_entries=settings.fsm_cache_max_entries,
+            max_bytes=settings.fsm_cache_max_bytes
+        )
+        dp = create_dispatcher(storage)
+        session = FakeTelegramSession(args.telegram_latency)
+        bot = Bot(token=settings.bot_token, session=session, default=DefaultBotProperties(parse_mode=ParseMode.HTML))
+
+        rng = random.Random(args.seed)
+        vocabulary = make_vocabulary(args.vocabulary)
+        recorder = LatencyRecorder()
+        users = [
+            SyntheticUser(100000 + i, dp, bot, session, recorder, random.Random(rng.random()))
+            for i in range(args.users)
+        ]
+        terms = {user.user.id: pick_terms(vocabulary, args.words, rng) for user in users}
+
+        phases = {}
+        phases["add_words"] = await run_phase(
+            "add_words", users, lambda user: user.add_words(terms[user.user.id]), args.concurrency
+        )
+
+        # Все добавленные слова становятся к повторению "сегодня"
+        await review_writer.stop()
+        from bot.db.database import get_db
+        async with get_db() as db:
+            await db.execute("UPDATE reviews SET next_review_at = ?", (datetime.datetime.now().isoformat(),))
+            await db.commit()
+        review_writer.start()
+
+        phases["review"] = await run_phase("review", users, lambda user: user.review(), args.concurrency)
+        await review_writer.stop()
+        await storage.close()
+
+        return {
+            "phases": phases,
+            "peak_rss_mb": peak_rss_mb(),
+            "telegram_calls": dict(session.calls),
+            "openai_requests": mock.requests,
+            "openai": scheduler.metrics(),
+            "review_writer": review_writer.metrics(),
+        }
+    finally:
+        await close_pool()
+        await mock_runner.cleanup()
+
+
+def load_previous(path: str, params: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """Последний сохранённый прогон с теми же параметрами"""
+    if not os.path.exists(path):
+        return None
+    previous = None
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                continue
+            if record.get("params") == params:
+                previous = record
+    return previous
+
+
+def compare(current: Dict[str, Any], previous: Dict[str, Any]):
+    """Изменение ключевых метрик относительно прошлого прогона"""
+    logger.info(f"Compared with {previous.get('commit')} ({previous.get('timestamp')}):")
+    for phase, result in current["phases"].items():
+        old = previous["results"]["phases"].get(phase)
+        if not old:
+            continue
+        for metric in COMPARED_METRICS:
+            if metric in ("p50_ms", "p95_ms", "p99_ms"):
+                new_value = result["latency"].get("all", {}).get(metric)
+                old_value = old["latency"].get("all", {}).get(metric)
+            else:
+                new_value, old_value = result.get(metric), old.get(metric)
+            if not new_value or not old_value:
+                continue
+            change = (new_value - old_value) / old_value * 100
+            logger.info(f"  {phase:<10} {metric:<17} {old_value:>10} -> {new_value:<10} ({change:+.1f}%)")
+    old_rss = previous["results"].get("peak_rss_mb")
+    if old_rss:
+        logger.info(f"  peak_rss_mb {old_rss} -> {current['peak_rss_mb']}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Нагрузочный прогон бота с фейковым Telegram и mock OpenAI")
+    parser.add_argument("--users", type=int, default=1000)
+    parser.add_argument("--words", type=int, default=5, help="слов на пользователя")
+    parser.add_argument("--vocabulary", type=int, default=2000, help="размер общего словаря")
+    parser.add_argument("--concurrency", type=int, default=200, help="одновременно активных пользователей")
+    parser.add_argument("--openai-latency", type=float, default=0.8, help="задержка mock OpenAI, секунды")
+    parser.add_argument("--openai-jitter", type=float, default=0.2)
+    parser.add_argument("--telegram-latency", type=float, default=0.03, help="задержка вызова Bot API, секунды")
+    parser.add_argument("--openai-rpm", type=int, default=100000, help="лимит очереди OpenAI на время прогона")
+    parser.add_argument("--openai-tpm", type=int, default=100000000)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--db", default=None, help="файл БД (по умолчанию временный)")
+    parser.add_argument("--results", default="benchmarks/results.jsonl", help="куда дописать результат")
+    parser.add_argument("--no-save", action="store_true", help="не сохранять результат")
+    args = parser.parse_args()
+
+    # INFO только от самого инструмента: лог на каждый запрос к API/mock заглушает отчёт
+    logging.basicConfig(
+        level=logging.WARNING,
+        format="%(asctime)s - %(name)s - %(levelname)s - %(message)s"
+    )
+    logger.setLevel(logging.INFO)
+
+    tmp_dir = None
+    if args.db is None:
+        tmp_dir = tempfile.TemporaryDirectory(prefix="flipcard-load-")
+        args.db = os.path.join(tmp_dir.name, "bench.db")
+    settings.database_path = args.db
+    settings.openai_rpm_limit = args.openai_rpm
+    settings.openai_tpm_limit = args.openai_tpm
+
+    params = {
+        "users": args.users,
+        "words": args.words,
+        "vocabulary": args.vocabulary,
+        "concurrency": args.concurrency,
+        "openai_latency": args.openai_latency,
+        "openai_jitter": args.openai_jitter,
+        "telegram_latency": args.telegram_latency,
+        "seed": args.seed,
+    }
+    try:
+        results = asyncio.run(run(args))
+    finally:
+        if tmp_dir is not None:
+            tmp_dir.cleanup()
+
+    logger.info(f"Peak RSS: {results['peak_rss_mb']} MB, OpenAI requests: {results['openai_requests']}")
+
+    previous = load_previous(args.results, params)
+    if previous:
+        compare(results, previous)
+
+    if not args.no_save:
+        record = {
+            **git_revision(),
+            "timestamp": datetime.datetime.now().isoformat(timespec="seconds"),
+            "python": sys.version.split()[0],
+            "params": params,
+            "results": results,
+        }
+        os.makedirs(os.path.dirname(args.results) or ".", exist_ok=True)
+        with open(args.results, "a", encoding="utf-8") as f:
+            f.write(json.dumps(record, ensure_ascii=False) + "\n")
+        logger.info(f"Results appended to {args.results}")
+
+
+if __name__ == "__main__":
+    main()
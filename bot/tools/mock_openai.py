@@ -0,0 +1,174 @@
+"""
+Локальный mock OpenAI Chat Completions для прогрева кэша и нагрузочных
+прогонов без расходов на API. Отвечает правдоподобными карточками для
+слов из промпта, поддерживает stream=True и задержку ответа.
+
+    python -m bot.tools.mock_openai --port 8765 --latency 0.8 --jitter 0.2
+    OPENAI_BASE_URL=http://127.0.0.1:8765/v1 python -m bot.main
+"""
+import argparse
+import asyncio
+import json
+import random
+import re
+import time
+from typing import Any, Dict, List, Tuple
+from aiohttp import web
+
+# Слово из промпта generate_word_card и список слов из generate_word_cards
+SINGLE_TERM_RE = re.compile(r'English word/phrase: "(.+?)"')
+TERM_LIST_RE = re.compile(r"words/phrases:\n((?:- .+\n?)+)")
+
+# Размер куска ответа в потоковом режиме (символов)
+STREAM_CHUNK_CHARS = 16
+
+
+def make_card(term: str) -> Dict[str, Any]:
+    return {
+        "term": term,
+        "pos": "noun",
+        "ipa": f"/{term}/",
+        "reading_ru": term,
+        "translations_ru": [f"{term} (перевод)"],
+        "definition_en": f"A mock definition of {term}.",
+        "examples": [
+            {"en": f"This is {term}.", "ru": f"Это {term}."},
+            {"en": f"I like {term}.", "ru": f"Мне нравится {term}."},
+        ],
+    }
+
+
+def make_content(messages: List[Dict[str, str]]) -> str:
+    prompt = messages[-1]["content"] if messages else ""
+    single = SINGLE_TERM_RE.search(prompt)
+    if single:
+        return json.dumps(make_card(single.group(1)), ensure_ascii=False)
+    term_list = TERM_LIST_RE.search(prompt)
+    terms = [line[2:] for line in term_list.group(1).splitlines()] if term_list else []
+    return json.dumps({"cards": [make_card(term) for term in terms]}, ensure_ascii=False)
+
+
+def make_usage(messages: List[Dict[str, str]], content: str) -> Dict[str, int]:
+    """Приблизительный usage: ~4 символа на токен"""
+    prompt_tokens = sum(len(message["content"]) for message in messages) // 4
+    completion_tokens = len(content) // 4
+    return {
+        "prompt_tokens": prompt_tokens,
+        "completion_tokens": completion_tokens,
+        "total_tokens": prompt_tokens + completion_tokens,
+    }
+
+
+class MockOpenAI:
+    """Обработчик /v1/chat/completions с настраиваемой задержкой"""
+
+    def __init__(self, latency: float = 0.0, jitter: float = 0.0, error_rate: float = 0.0):
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+
+        # Метрики
+        self.requests = 0
+        self.errors = 0
+
+    def _delay(self) -> float:
+        return max(0.0, self.latency + random.uniform(-self.jitter, self.jitter))
+
+    async def handle(self, request: web.Request) -> web.StreamResponse:
+        body = await request.json()
+        self.requests += 1
+
+        if self.error_rate and random.random() < self.error_rate:
+            # Как у OpenAI при превышении лимита: клиент повторит запрос
+            self.errors += 1
+            return web.json_response(
+                {"error": {"message": "Rate limit reached (mock)", "type": "rate_limit_error"}},
+                status=429,
+                headers={"retry-after-ms": "200"}
+            )
+
+        messages = body.get("messages", [])
+        content = make_content(messages)
+        usage = make_usage(messages, content)
+        completion_id = f"chatcmpl-mock-{self.requests}"
+        created = int(time.time())
+        delay = self._delay()
+
+        if not body.get("stream"):
+            await asyncio.sleep(delay)
+            return web.json_response({
+                "id": completion_id,
+                "object": "chat.completion",
+                "created": created,
+                "model": body.get("model", "mock"),
+                "choices": [{
+                    "index": 0,
+                    "message": {"role": "assistant", "content": content},
+                    "finish_reason": "stop",
+                }],
+                "usage": usage,
+            })
+
+        # Поток: задержка делится между первым куском и остальными
+        response = web.StreamResponse(headers={"Content-Type": "text/event-stream"})
+        await response.prepare(request)
+        chunks = [content[i:i + STREAM_CHUNK_CHARS] for i in range(0, len(content), STREAM_CHUNK_CHARS)]
+        await asyncio.sleep(delay / 2)
+        step = delay / 2 / max(1, len(chunks))
+
+        def event(delta: Dict[str, Any], finish_reason=None, usage_payload=None) -> bytes:
+            payload = {
+                "id": completion_id,
+                "object": "chat.completion.chunk",
+                "created": created,
+                "model": body.get("model", "mock"),
+                "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}] if delta is not None else [],
+                "usage": usage_payload,
+            }
+            return f"data: {json.dumps(payload, ensure_ascii=False)}\n\n".encode()
+
+        for chunk in chunks:
+            await response.write(event({"content": chunk}))
+            await asyncio.sleep(step)
+        await response.write(event({}, finish_reason="stop"))
+        if (body.get("stream_options") or {}).get("include_usage"):
+            await response.write(event(None, usage_payload=usage))
+        await response.write(b"data: [DONE]\n\n")
+        await response.write_eof()
+        return response
+
+
+def create_mock_app(mock: MockOpenAI) -> web.Application:
+    app = web.Application()
+    app.router.add_post("/v1/chat/completions", mock.handle)
+    return app
+
+
+async def start_mock_server(mock: MockOpenAI, host: str = "127.0.0.1", port: int = 0) -> Tuple[web.AppRunner, str]:
+    """
+    Поднять mock в текущем event loop.
+    Возвращает (runner, base_url); остановка - await runner.cleanup().
+    """
+    runner = web.AppRunner(create_mock_app(mock))
+    await runner.setup()
+    await web.TCPSite(runner, host, port).start()
+    # port=0: порт выбирает ОС
+    port = runner.addresses[0][1]
+    return runner, f"http://{host}:{port}/v1"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Mock OpenAI Chat Completions")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency", type=float, default=0.5, help="задержка ответа, секунды")
+    parser.add_argument("--jitter", type=float, default=0.0, help="разброс задержки, секунды")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="доля ответов 429")
+    args = parser.parse_args()
+
+    mock = MockOpenAI(args.latency, args.jitter, args.error_rate)
+    web.run_app(create_mock_app(mock), host=args.host, port=args.port)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,215 @@
+"""
+Прогрев постоянного кэша карточек по частотному списку слов.
+Карточки генерируются тем же путём, что и в боте (generate_word_card через
+общую очередь OpenAI с низким приоритетом). Слова, которые уже есть в кэше,
+пропускаются, поэтому прерванный прогон можно просто запустить заново.
+
+    python -m bot.tools.warm_cache words.txt --limit 5000 --concurrency 8
+    python -m bot.tools.warm_cache words.txt --mock --mock-latency 0.3
+    python -m bot.tools.warm_cache words.txt --mock --self-check
+
+Формат списка: одно слово на строку, самые частые сверху; всё после
+табуляции или запятой (например, частота) и строки с # игнорируются.
+
+--self-check прогоняет список дважды на временной БД и завершается с кодом 1,
+если второй прогон сгенерировал хоть одну карточку (пропуск кэшированных слов сломан).
+"""
+import argparse
+import asyncio
+import logging
+import os
+import sys
+import tempfile
+import time
+from typing import List, Optional
+from bot.config import settings
+from bot.db.database import init_db, open_pool, close_pool
+from bot.services.ai_scheduler import scheduler
+from bot.services.card_cache import get_cached_terms, normalize_term, warm_word_card
+
+logger = logging.getLogger(__name__)
+
+# Цены gpt-4o-mini, USD за 1M токенов
+DEFAULT_INPUT_PRICE = 0.15
+DEFAULT_OUTPUT_PRICE = 0.60
+
+PROGRESS_INTERVAL_SECONDS = 5.0
+
+
+def read_word_list(path: str, limit: Optional[int] = None) -> List[str]:
+    """Слова из файла в исходном порядке, без повторов"""
+    terms = []
+    seen = set()
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if not line or line.startswith("#"):
+                continue
+            term = line.split("\t")[0].split(",")[0].strip()
+            key = normalize_term(term)
+            if not key or key in seen:
+                continue
+            seen.add(key)
+            terms.append(term)
+            if limit and len(terms) >= limit:
+                break
+    return terms
+
+
+class WarmUpReport:
+    """Счётчики прогона и оценка стоимости по фактическому usage"""
+
+    def __init__(self, total: int, input_price: float, output_price: float):
+        self.total = total
+        self.input_price = input_price
+        self.output_price = output_price
+        self.started_at = time.monotonic()
+        self.done = 0
+        self.failed: List[str] = []
+        self._prompt_tokens = scheduler.prompt_tokens
+        self._completion_tokens = scheduler.completion_tokens
+
+    @property
+    def prompt_tokens(self) -> int:
+        return scheduler.prompt_tokens - self._prompt_tokens
+
+    @property
+    def completion_tokens(self) -> int:
+        return scheduler.completion_tokens - self._completion_tokens
+
+    @property
+    def cost(self) -> float:
+        return (self.prompt_tokens * self.input_price + self.completion_tokens * self.output_price) / 1_000_000
+
+    def summary(self) -> str:
+        elapsed = time.monotonic() - self.started_at
+        rate = self.done / elapsed if elapsed else 0.0
+        remaining = self.total - self.done - len(self.failed)
+        per_card = self.cost / self.done if self.done else 0.0
+        eta = remaining / rate if rate else 0.0
+        return (
+            f"{self.done}/{self.total} cards, {len(self.failed)} failed, "
+            f"{rate:.2f} cards/s, {elapsed:.0f}s elapsed, ETA {eta:.0f}s | "
+            f"tokens {self.prompt_tokens} in / {self.completion_tokens} out, "
+            f"cost ${self.cost:.4f} (${per_card * 1000:.3f} per 1000 cards, "
+            f"~${self.cost + per_card * remaining:.2f} for the whole list)"
+        )
+
+
+async def warm_cache(terms: List[str], concurrency: int, report: WarmUpReport):
+    """Генерировать карточки в concurrency потоков; ошибки не прерывают прогон"""
+    queue: asyncio.Queue = asyncio.Queue()
+    for term in terms:
+        queue.put_nowait(term)
+
+    async def worker():
+        while True:
+            try:
+                term = queue.get_nowait()
+            except asyncio.QueueEmpty:
+                return
+            try:
+                await warm_word_card(term)
+                report.done += 1
+            except Exception as e:
+                report.failed.append(term)
+                logger.warning(f"Failed to warm '{term}': {e}")
+
+    async def progress():
+        while True:
+            await asyncio.sleep(PROGRESS_INTERVAL_SECONDS)
+            logger.info(report.summary())
+
+    progress_task = asyncio.create_task(progress())
+    try:
+        await asyncio.gather(*(worker() for _ in range(max(1, concurrency))))
+    finally:
+        progress_task.cancel()
+
+
+async def warm_up(args: argparse.Namespace) -> WarmUpReport:
+    """Один прогон по списку: сгенерировать карточки слов, которых нет в кэше"""
+    terms = read_word_list(args.words, args.limit)
+    cached = await get_cached_terms()
+    missing = [term for term in terms if normalize_term(term) not in cached]
+    logger.info(f"Word list: {len(terms)} terms, {len(terms) - len(missing)} already cached, {len(missing)} to generate")
+
+    report = WarmUpReport(len(missing), args.input_price, args.output_price)
+    try:
+        await warm_cache(missing, args.concurrency, report)
+    finally:
+        logger.info(f"Warm-up finished: {report.summary()}")
+        logger.info(f"OpenAI scheduler: {scheduler.metrics()}")
+        if report.failed:
+            logger.warning(f"Failed terms (will be retried on the next run): {', '.join(report.failed[:20])}")
+    return report
+
+
+async def run(args: argparse.Namespace) -> int:
+    mock_runner = None
+    if args.mock:
+        from bot.tools.mock_openai import MockOpenAI, start_mock_server
+        mock_runner, settings.openai_base_url = await start_mock_server(MockOpenAI(args.mock_latency))
+    elif args.openai_base_url:
+        settings.openai_base_url = args.openai_base_url
+
+    tmp_dir = None
+    if args.self_check:
+        # Проверка не трогает настоящий кэш
+        tmp_dir = tempfile.TemporaryDirectory(prefix="flipcard-warm-")
+        settings.database_path = os.path.join(tmp_dir.name, "warm.db")
+
+    await open_pool()
+    try:
+        await init_db()
+        report = await warm_up(args)
+        if report.failed:
+            return 1
+        if args.self_check:
+            again = await warm_up(args)
+            if again.total:
+                logger.error(f"Self-check failed: second run generated {again.total} cards instead of 0")
+                return 1
+            logger.info(f"Self-check passed: {report.done} cards on the first run, 0 on the second")
+        return 0
+    finally:
+        await close_pool()
+        if mock_runner is not None:
+            await mock_runner.cleanup()
+        if tmp_dir is not None:
+            tmp_dir.cleanup()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Прогрев кэша карточек по списку слов")
+    parser.add_argument("words", help="файл со списком слов (самые частые сверху)")
+    parser.add_argument("--limit", type=int, default=None, help="взять только первые N слов")
+    parser.add_argument("--concurrency", type=int, default=settings.openai_max_concurrency)
+    parser.add_argument("--input-price", type=float, default=DEFAULT_INPUT_PRICE, help="USD за 1M входных токенов")
+    parser.add_argument("--output-price", type=float, default=DEFAULT_OUTPUT_PRICE, help="USD за 1M выходных токенов")
+    parser.add_argument("--openai-base-url", default="", help="другой адрес API (например, локальный mock)")
+    parser.add_argument("--mock", action="store_true", help="поднять встроенный mock OpenAI")
+    parser.add_argument("--mock-latency", type=float, default=0.3, help="задержка ответа mock, секунды")
+    parser.add_argument(
+        "--self-check", action="store_true",
+        help="прогнать список дважды на временной БД: второй прогон должен сгенерировать 0 карточек"
+    )
+    args = parser.parse_args()
+    if args.self_check and not (args.mock or args.openai_base_url):
+        parser.error("--self-check генерирует карточки заново, используй его с --mock или --openai-base-url")
+
+    # INFO только от самого инструмента: лог на каждый запрос к API/mock заглушает отчёт
+    logging.basicConfig(
+        level=logging.WARNING,
+        format="%(asctime)s - %(name)s - %(levelname)s - %(message)s"
+    )
+    logger.setLevel(logging.INFO)
+    try:
+        sys.exit(asyncio.run(run(args)))
+    except KeyboardInterrupt:
+        # Готовые карточки уже сохранены, повторный запуск продолжит с оставшихся
+        sys.exit(130)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,155 @@
+import asyncio
+import hmac
+import logging
+from typing import Any, Dict, Optional, Set
+from aiohttp import web
+from aiogram import Bot, Dispatcher
+from aiogram.types import Update
+from bot.config import settings
+
+logger = logging.getLogger(__name__)
+
+# Заголовок, в котором Telegram передаёт secret_token из setWebhook
+SECRET_HEADER = "X-Telegram-Bot-Api-Secret-Token"
+
+
+def extract_user_id(update: Dict[str, Any]) -> Optional[int]:
+    """id пользователя из сырого обновления (без разбора в pydantic-модели)"""
+    for key, event in update.items():
+        if key == "update_id" or not isinstance(event, dict):
+            continue
+        user = event.get("from") or event.get("user")
+        if user:
+            return user["id"]
+        chat = event.get("chat")
+        if chat:
+            return chat["id"]
+        return None
+    return None
+
+
+class WebhookServer:
+    """
+    Приём обновлений через webhook на aiohttp.
+    Ответ 200 отдаётся сразу после разбора обновления, обработка идёт
+    в фоне. Обновления одного пользователя обрабатываются по очереди в порядке
+    получения, разных пользователей - параллельно. Принято в обработку
+    не больше max_in_flight обновлений: если слотов нет, ответ задерживается,
+    и Telegram притормаживает отправку.
+    """
+
+    def __init__(self, dp: Dispatcher, bot: Bot, secret: Optional[str], max_in_flight: int):
+        self.dp = dp
+        self.bot = bot
+        self.secret = secret
+        self._slots = asyncio.Semaphore(max_in_flight)
+        self._tasks: Set[asyncio.Task] = set()
+        # Последняя задача каждого пользователя: следующая ждёт её завершения
+        self._last_task: Dict[int, asyncio.Task] = {}
+
+        # Метрики
+        self.in_flight = 0
+        self.received = 0
+        self.rejected = 0
+        self.errors = 0
+        self.max_in_flight = 0
+
+    def _check_secret(self, request: web.Request) -> bool:
+        if not self.secret:
+            return True
+        token = request.headers.get(SECRET_HEADER, "")
+        return hmac.compare_digest(token, self.secret)
+
+    async def handle(self, request: web.Request) -> web.Response:
+        """POST от Telegram: проверить секрет, разобрать и поставить в обработку"""
+        if not self._check_secret(request):
+            self.rejected += 1
+            return web.Response(status=401)
+
+        try:
+            data = await request.json()
+            update = Update.model_validate(data, context={"bot": self.bot})
+            user_id = extract_user_id(data)
+        except Exception as e:
+            # 200, чтобы Telegram не повторял заведомо битое обновление
+            self.rejected += 1
+            logger.warning(f"Malformed webhook update: {e}")
+            return web.Response()
+
+        await self._slots.acquire()
+        self.received += 1
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        previous = self._last_task.get(user_id) if user_id is not None else None
+        task = asyncio.create_task(self._process(update, previous))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        if user_id is not None:
+            self._last_task[user_id] = task
+            task.add_done_callback(lambda done: self._forget(user_id, done))
+        return web.Response()
+
+    def _forget(self, user_id: int, task: asyncio.Task):
+        if self._last_task.get(user_id) is task:
+            del self._last_task[user_id]
+
+    async def _process(self, update: Update, previous: Optional[asyncio.Task]):
+        try:
+            if previous is not None:
+                # Предыдущее обновление пользователя ещё обрабатывается
+                await asyncio.wait((previous,))
+            await self.dp.feed_update(self.bot, update)
+        except Exception as e:
+            self.errors += 1
+            logger.error(f"Error while handling update {update.update_id}: {e}", exc_info=True)
+        finally:
+            self.in_flight -= 1
+            self._slots.release()
+
+    async def drain(self):
+        """Дождаться обработки уже принятых обновлений"""
+        if self._tasks:
+            await asyncio.gather(*self._tasks, return_exceptions=True)
+
+    def metrics(self) -> Dict[str, Any]:
+        return {
+            "in_flight": self.in_flight,
+            "received": self.received,
+            "rejected": self.rejected,
+            "errors": self.errors,
+            "max_in_flight": self.max_in_flight,
+        }
+
+
+def create_webhook_app(server: WebhookServer, path: str) -> web.Application:
+    """aiohttp-приложение с одним маршрутом (удобно поднимать в тестах)"""
+    app = web.Application()
+    app.router.add_post(path, server.handle)
+    return app
+
+
+async def serve_webhook(server: WebhookServer):
+    """Зарегистрировать webhook в Telegram и обслуживать его до отмены задачи"""
+    dp, bot = server.dp, server.bot
+    app = create_webhook_app(server, settings.webhook_path)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, settings.webhook_host, settings.webhook_port)
+
+    await dp.emit_startup(bot=bot, dispatcher=dp)
+    try:
+        await site.start()
+        if settings.webhook_url:
+            await bot.set_webhook(
+                url=settings.webhook_url.rstrip("/") + settings.webhook_path,
+                secret_token=server.secret,
+                allowed_updates=dp.resolve_used_update_types(),
+                max_connections=min(100, settings.webhook_max_in_flight)
+            )
+        logger.info(f"Webhook server listening on {settings.webhook_host}:{settings.webhook_port}{settings.webhook_path}")
+        await asyncio.Event().wait()
+    finally:
+        # Новые запросы больше не принимаем, принятые - дорабатываем
+        await runner.cleanup()
+        await server.drain()
+        await dp.emit_shutdown(bot=bot, dispatcher=dp)
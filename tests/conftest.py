@@ -0,0 +1,5 @@
+import os
+
+# bot.config читает обязательные настройки при импорте
+os.environ.setdefault("BOT_TOKEN", "42:TEST")
+os.environ.setdefault("OPENAI_API_KEY", "test")
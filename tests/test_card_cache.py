@@ -0,0 +1,38 @@
+import asyncio
+from bot.config import settings
+from bot.db.database import init_db
+from bot.services import card_cache
+from bot.services.ai_scheduler import PRIORITY_BULK, PRIORITY_INTERACTIVE
+
+
+def test_user_lookup_does_not_wait_behind_warm_up(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "database_path", str(tmp_path / "bot.db"))
+    calls = []
+
+    async def fake_generate(term, priority, on_partial=None):
+        calls.append((term, priority))
+        # Прогрев стоит в очереди с низким приоритетом дольше
+        await asyncio.sleep(0.5 if priority == PRIORITY_BULK else 0.01)
+        return {"term": term, "priority": priority}
+
+    monkeypatch.setattr(card_cache, "generate_word_card", fake_generate)
+
+    async def scenario():
+        await init_db()
+        warm = asyncio.create_task(card_cache.warm_word_card("Apple"))
+        await asyncio.sleep(0)
+        card = await asyncio.wait_for(card_cache.get_word_card("apple"), 0.3)
+        await warm
+
+        # Прогрев того же слова во время пользовательской генерации её ждёт
+        lookup = asyncio.create_task(card_cache.get_word_card("pear"))
+        while not card_cache._generations.running("pear"):
+            await asyncio.sleep(0.001)
+        pear = await card_cache.warm_word_card("pear")
+        await lookup
+        return card, pear
+
+    card, pear = asyncio.run(scenario())
+    assert card["priority"] == PRIORITY_INTERACTIVE
+    assert pear["priority"] == PRIORITY_INTERACTIVE
+    assert calls.count(("pear", PRIORITY_BULK)) == 0
@@ -0,0 +1,46 @@
+import asyncio
+from aiohttp import web
+from aiohttp.test_utils import TestServer
+from bot import cluster
+from bot.cluster import WORKER_PATH, ClusterFront, extract_user_id
+
+
+def test_extract_user_id():
+    assert extract_user_id({"update_id": 1, "message": {"from": {"id": 5}, "chat": {"id": 9}}}) == 5
+    assert extract_user_id({"update_id": 1, "my_chat_member": {"chat": {"id": 9}}}) == 9
+    assert extract_user_id({"update_id": 1}) is None
+
+
+def test_forwarding_retries_after_timeout(monkeypatch):
+    monkeypatch.setattr(cluster, "FORWARD_TIMEOUT_SECONDS", 0.2)
+    monkeypatch.setattr(cluster, "FORWARD_RETRY_DELAYS", (0.01,))
+    received = []
+
+    async def handle(request: web.Request) -> web.Response:
+        update = await request.json()
+        received.append(update["update_id"])
+        if len(received) == 1:
+            # Первый ответ не успевает за таймаут
+            await asyncio.sleep(1)
+        return web.Response()
+
+    async def scenario():
+        app = web.Application()
+        app.router.add_post(WORKER_PATH, handle)
+        server = TestServer(app)
+        await server.start_server()
+        front = ClusterFront([server.port], "secret")
+        await front.start()
+        try:
+            await front.route({"update_id": 1, "message": {"from": {"id": 7}}})
+            await front.route({"update_id": 2, "message": {"from": {"id": 7}}})
+            await asyncio.wait_for(front._queues[0].join(), 5)
+            return front.metrics()
+        finally:
+            await front.stop()
+            await server.close()
+
+    stats = asyncio.run(scenario())
+    # Пересыльщик пережил таймаут и доставил оба обновления
+    assert stats["forwarded"] == [2]
+    assert received[-1] == 2
@@ -0,0 +1,44 @@
+import asyncio
+from bot.config import settings
+from bot.db.database import get_db, init_db
+from bot.db.models import add_word, delete_word
+from bot.services.review_writer import enqueue_review, writer
+
+
+async def _count(sql: str, *params) -> int:
+    async with get_db() as db:
+        cursor = await db.execute(sql, params)
+        return (await cursor.fetchone())[0]
+
+
+def test_rating_deleted_word_writes_nothing(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "database_path", str(tmp_path / "bot.db"))
+
+    async def scenario():
+        await init_db()
+        kept, _ = await add_word(7, "apple", translations_ru=["яблоко"])
+        deleted, _ = await add_word(7, "pear", translations_ru=["груша"])
+        await delete_word(deleted, 7)
+
+        writer.start()
+        try:
+            applied = await enqueue_review(kept, 7, "know")
+            # Слово удалено во время сессии повторения
+            orphan = await enqueue_review(deleted, 7, "know")
+            # Чужое слово
+            foreign = await enqueue_review(kept, 8, "know")
+        finally:
+            await writer.stop()
+
+        return (
+            applied, orphan, foreign,
+            await _count("SELECT COUNT(*) FROM reviews WHERE word_id = ?", deleted),
+            await _count("SELECT COUNT(*) FROM review_events WHERE word_id = ?", deleted),
+            await _count("SELECT COUNT(*) FROM review_events WHERE word_id = ?", kept),
+        )
+
+    applied, orphan, foreign, orphan_reviews, orphan_events, events = asyncio.run(scenario())
+    assert applied is True
+    assert orphan is False and foreign is False
+    assert orphan_reviews == 0 and orphan_events == 0
+    assert events == 1
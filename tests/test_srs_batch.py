@@ -0,0 +1,95 @@
+import asyncio
+from datetime import datetime, timedelta
+import pytest
+from bot.config import settings
+from bot.db.database import get_db, init_db
+from bot.services import srs_batch
+from bot.services.srs import apply_review
+
+NOW = datetime(2026, 3, 1, 12, 30)
+
+
+async def _fill(words: int):
+    """Слова и записи reviews двух пользователей, часть - без даты и с нулевыми микросекундами"""
+    async with get_db() as db:
+        for word_id in range(1, words + 1):
+            user_id = 1 + word_id % 2
+            await db.execute("INSERT INTO words (id, user_id, term) VALUES (?, ?, ?)", (word_id, user_id, f"w{word_id}"))
+            due = None if word_id % 5 == 0 else (NOW - timedelta(days=word_id, microseconds=word_id % 3)).isoformat()
+            await db.execute("""
+                INSERT INTO reviews (word_id, user_id, next_review_at, interval_days, ease)
+                VALUES (?, ?, ?, ?, ?)
+            """, (word_id, user_id, due, 1.0 + word_id * 1.5, 1.3 + (word_id % 4) * 0.4))
+        await db.commit()
+
+
+async def _dump():
+    async with get_db() as db:
+        tables = {}
+        for table, order in (
+            ("reviews", "word_id"),
+            ("review_events", "word_id"),
+            ("review_daily", "user_id, day"),
+        ):
+            cursor = await db.execute(f"SELECT * FROM {table} ORDER BY {order}")
+            tables[table] = [
+                {key: row[key] for key in row.keys() if key not in ("id", "created_at")}
+                for row in await cursor.fetchall()
+            ]
+        # apply_review пишет дату через strftime с миллисекундами: сравниваем моменты, а не строки
+        for row in tables["reviews"]:
+            row["next_review_at"] = datetime.fromisoformat(row["next_review_at"]) if row["next_review_at"] else None
+        return tables
+
+
+@pytest.mark.parametrize("vectorized", [True, False])
+def test_grade_matches_per_review_path(tmp_path, monkeypatch, vectorized):
+    if vectorized and srs_batch.np is None:
+        pytest.skip("NumPy не установлен")
+    if not vectorized:
+        monkeypatch.setattr(srs_batch, "np", None)
+
+    async def run(path, batch: bool):
+        monkeypatch.setattr(settings, "database_path", str(path))
+        await init_db()
+        await _fill(30)
+        if batch:
+            await srs_batch.run_transform(srs_batch.Grade("hard"), chunk_size=7, now=NOW)
+        else:
+            async with get_db() as db:
+                for word_id in range(1, 31):
+                    await apply_review(db, word_id, 1 + word_id % 2, "hard", NOW)
+                await db.commit()
+        return await _dump()
+
+    batch = asyncio.run(run(tmp_path / "batch.db", True))
+    single = asyncio.run(run(tmp_path / "single.db", False))
+    assert batch == single
+    assert len(batch["review_events"]) == 30
+    assert [row["reviewed"] for row in batch["review_daily"]] == [15, 15]
+
+
+@pytest.mark.parametrize("vectorized", [True, False])
+def test_dates_are_written_like_isoformat(tmp_path, monkeypatch, vectorized):
+    if vectorized and srs_batch.np is None:
+        pytest.skip("NumPy не установлен")
+    if not vectorized:
+        monkeypatch.setattr(srs_batch, "np", None)
+    monkeypatch.setattr(settings, "database_path", str(tmp_path / "bot.db"))
+
+    async def scenario():
+        await init_db()
+        await _fill(30)
+        async with get_db() as db:
+            cursor = await db.execute("SELECT word_id, next_review_at FROM reviews")
+            before = {row["word_id"]: row["next_review_at"] for row in await cursor.fetchall()}
+        await srs_batch.shift_due(timedelta(days=2))
+        async with get_db() as db:
+            cursor = await db.execute("SELECT word_id, next_review_at FROM reviews")
+            after = {row["word_id"]: row["next_review_at"] for row in await cursor.fetchall()}
+        return before, after
+
+    before, after = asyncio.run(scenario())
+    for word_id, due in before.items():
+        expected = (datetime.fromisoformat(due) + timedelta(days=2)).isoformat() if due else None
+        assert after[word_id] == expected
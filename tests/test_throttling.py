@@ -0,0 +1,51 @@
+import asyncio
+from aiogram import Bot
+from bot.middlewares.throttling import OutboundThrottleMiddleware
+from bot.tools.load_test import FakeTelegramSession
+
+
+class RecordingSession(FakeTelegramSession):
+    """Фейковая сессия, запоминающая порядок отправленных запросов"""
+
+    def __init__(self):
+        super().__init__()
+        self.sent = []
+
+    async def make_request(self, bot, method, timeout=None):
+        self.sent.append((type(method).__name__, getattr(method, "text", None)))
+        return await super().make_request(bot, method, timeout)
+
+
+def _bot():
+    session = RecordingSession()
+    bot = Bot("42:TEST", session=session)
+    throttle = OutboundThrottleMiddleware(global_rate=1000, chat_rate=1000, chat_burst=10, max_retries=1)
+    bot.session.middleware(throttle)
+    return bot, session, throttle
+
+
+def test_chat_queue_is_fifo():
+    async def scenario():
+        bot, session, _ = _bot()
+        await asyncio.gather(*(bot.send_message(1, f"m{i}") for i in range(5)))
+        return session.sent
+
+    assert asyncio.run(scenario()) == [("SendMessage", f"m{i}") for i in range(5)]
+
+
+def test_coalesced_edit_keeps_its_place_in_queue():
+    async def scenario():
+        bot, session, throttle = _bot()
+        results = await asyncio.gather(
+            bot.edit_message_text("edit 1", chat_id=1, message_id=10),
+            bot.send_message(1, "message"),
+            bot.edit_message_text("edit 2", chat_id=1, message_id=10),
+        )
+        return session.sent, results, throttle.metrics()
+
+    sent, results, stats = asyncio.run(scenario())
+    # Правка ушла одна, с последним текстом и раньше сообщения, поставленного после первой правки
+    assert sent == [("EditMessageText", "edit 2"), ("SendMessage", "message")]
+    assert results[0].text == results[2].text == "edit 2"
+    assert stats["coalesced"] == 1
+    assert stats["queued"] == 0
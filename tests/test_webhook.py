@@ -0,0 +1,161 @@
+import asyncio
+import contextlib
+import socket
+import aiohttp
+from aiogram import Bot, Dispatcher
+from aiogram.types import Message
+from aiohttp.test_utils import TestClient, TestServer
+from bot.config import settings
+from bot.tools.load_test import FakeTelegramSession
+from bot.webhook import SECRET_HEADER, WebhookServer, create_webhook_app, serve_webhook
+
+PATH = "/webhook"
+
+
+def _message_update(update_id: int, user_id: int, text: str) -> dict:
+    return {
+        "update_id": update_id,
+        "message": {
+            "message_id": update_id,
+            "date": 0,
+            "chat": {"id": user_id, "type": "private"},
+            "from": {"id": user_id, "is_bot": False, "first_name": "User"},
+            "text": text,
+        },
+    }
+
+
+async def _run(handler, scenario, secret=None, max_in_flight=10):
+    """Поднять WebhookServer с одним handler сообщений и выполнить scenario(client, server)"""
+    dp = Dispatcher()
+    dp.message.register(handler)
+    bot = Bot("42:TEST", session=FakeTelegramSession())
+    server = WebhookServer(dp, bot, secret, max_in_flight)
+    client = TestClient(TestServer(create_webhook_app(server, PATH)))
+    await client.start_server()
+    try:
+        return await scenario(client, server)
+    finally:
+        await client.close()
+
+
+def test_updates_of_one_user_are_handled_in_order():
+    handled = []
+
+    async def handler(message: Message):
+        # Первое обновление обрабатывается дольше следующих
+        await asyncio.sleep(0.05 if message.text == "1" else 0)
+        handled.append((message.from_user.id, message.text))
+
+    async def scenario(client, server):
+        for update_id, text in enumerate(("1", "2", "3"), start=1):
+            response = await client.post(PATH, json=_message_update(update_id, 7, text))
+            assert response.status == 200
+        response = await client.post(PATH, json=_message_update(4, 8, "other"))
+        assert response.status == 200
+        await server.drain()
+
+    asyncio.run(_run(handler, scenario))
+    assert [text for user_id, text in handled if user_id == 7] == ["1", "2", "3"]
+    # Другой пользователь не ждёт медленное обновление первого
+    assert handled[0] == (8, "other")
+
+
+def test_wrong_secret_is_rejected():
+    handled = []
+
+    async def handler(message: Message):
+        handled.append(message.text)
+
+    async def scenario(client, server):
+        update = _message_update(1, 7, "hi")
+        missing = await client.post(PATH, json=update)
+        wrong = await client.post(PATH, json=update, headers={SECRET_HEADER: "wrong"})
+        right = await client.post(PATH, json=update, headers={SECRET_HEADER: "secret"})
+        await server.drain()
+        return missing.status, wrong.status, right.status
+
+    assert asyncio.run(_run(handler, scenario, secret="secret")) == (401, 401, 200)
+    assert handled == ["hi"]
+
+
+def test_malformed_update_gets_200():
+    async def handler(message: Message):
+        pass
+
+    async def scenario(client, server):
+        not_json = await client.post(PATH, data=b"{not json")
+        not_update = await client.post(PATH, json={"message": "text"})
+        return not_json.status, not_update.status, server.metrics()
+
+    not_json, not_update, stats = asyncio.run(_run(handler, scenario))
+    # Telegram не должен повторять заведомо битое обновление
+    assert (not_json, not_update) == (200, 200)
+    assert stats["rejected"] == 2
+    assert stats["received"] == 0
+
+
+def test_response_waits_for_free_slot():
+    release = asyncio.Event()
+
+    async def handler(message: Message):
+        await release.wait()
+
+    async def scenario(client, server):
+        for update_id in (1, 2):
+            response = await client.post(PATH, json=_message_update(update_id, update_id, "slow"))
+            assert response.status == 200
+        third = asyncio.create_task(client.post(PATH, json=_message_update(3, 3, "slow")))
+        await asyncio.sleep(0.1)
+        # Оба слота заняты: ответ на третье обновление задерживается
+        assert not third.done()
+        assert server.in_flight == 2
+        release.set()
+        response = await third
+        assert response.status == 200
+        await server.drain()
+        return server.metrics()
+
+    stats = asyncio.run(_run(handler, scenario, max_in_flight=2))
+    assert stats["max_in_flight"] == 2
+    assert stats["received"] == 3
+    assert stats["in_flight"] == 0
+
+
+def test_shutdown_drains_accepted_updates(monkeypatch):
+    handled = []
+
+    async def handler(message: Message):
+        await asyncio.sleep(0.2)
+        handled.append(message.text)
+
+    async def scenario():
+        dp = Dispatcher()
+        dp.message.register(handler)
+        bot = Bot("42:TEST", session=FakeTelegramSession())
+        server = WebhookServer(dp, bot, None, 10)
+        with socket.socket() as sock:
+            sock.bind(("127.0.0.1", 0))
+            port = sock.getsockname()[1]
+        monkeypatch.setattr(settings, "webhook_url", "")
+        monkeypatch.setattr(settings, "webhook_host", "127.0.0.1")
+        monkeypatch.setattr(settings, "webhook_port", port)
+        monkeypatch.setattr(settings, "webhook_path", PATH)
+
+        serving = asyncio.create_task(serve_webhook(server))
+        async with aiohttp.ClientSession() as session:
+            for _ in range(50):
+                try:
+                    async with session.post(f"http://127.0.0.1:{port}{PATH}", json=_message_update(1, 7, "accepted")) as response:
+                        assert response.status == 200
+                    break
+                except aiohttp.ClientConnectionError:
+                    await asyncio.sleep(0.05)
+        # Обновление принято, но ещё обрабатывается
+        assert handled == []
+        serving.cancel()
+        with contextlib.suppress(asyncio.CancelledError):
+            await serving
+
+    asyncio.run(scenario())
+    assert handled == ["accepted"]